@@ -0,0 +1,713 @@
+"""
+Super Squadron Character Module
+
+This module holds the character generation rules that were previously only
+available in the Character Generator notebook: how many powers a character
+receives, which powers are rolled from the origin tables in data/powers.csv,
+which of those powers are devices, the statistic effects and derived values
+from data/characteristics.csv, and the physical and job details.
+
+generate_character() runs the whole pipeline and returns a Character
+dictionary in the same layout as character_test.json.
+
+"Roll again twice" on an origin table is resolved by rolling twice on the
+origin's Secondary column, or on the same column for origins without one.
+"""
+
+import zlib
+
+import numpy as np
+
+from super_squadron import origins
+from super_squadron.formulas import parse_cell, roll_column
+from super_squadron.powers import normal_round, power_classes
+from super_squadron.roll import (current_generator, keyed_generator, roll_ap, roll_effects, roll_effects_batch,
+                                 roll_luck, roll_main_statistics, roll_statistic, select_stream, set_generator)
+from super_squadron.tables import registry
+
+__all__ = [
+    'ROLL_AGAIN',
+    'OTHER_JOBS',
+    'powers_table',
+    'characteristics_table',
+    'new_statistics',
+    'secondary_column',
+    'roll_power_number',
+    'roll_powers',
+    'roll_powers_batch',
+    'assign_devices',
+    'roll_statistic_effects',
+    'roll_statistic_effect',
+    'derive_statistics',
+    'roll_physical',
+    'roll_physical_batch',
+    'roll_job',
+    'roll_job_batch',
+    'roll_other_skill',
+    'apply_powers',
+    'LazyDetail',
+    'EAGER_POWERS',
+    'defer_powers',
+    'GENERATION_STAGES',
+    'generate_character'
+]
+
+ROLL_AGAIN = 'Roll again twice'
+
+# Jobs rolled on 1d6 when the job table gives "Other"
+OTHER_JOBS = ['Supergroup', 'Mercenary', 'Spy', 'Millionaire', 'Alien Scout or God', 'Supernatural Investigator']
+
+# Statistic effect columns in characteristics.csv, and whether their cells can hold dice
+STATISTIC_EFFECTS = {
+    'Strength': [('Description', 'Strength', False), ('HT', 'Strength_HT', True), ('DD', 'Strength_DD', True)],
+    'Agility': [('Description', 'Agility', False), ('Move', 'Agility_Move', False),
+                ('Accuracy', 'Agility_Accuracy', False), ('HT', 'Agility_HT', False), ('DD', 'Agility_DD', False)],
+    'Charisma': [('ReactionHero', 'Charisma_ReactionHero', False),
+                 ('ReactionVillain', 'Charisma_ReactionVillain', False)],
+    'Intelligence': [('Accuracy', 'Intelligence_Accuracy', False), ('HT', 'Intelligence_HT', False),
+                     ('DD', 'Intelligence_DD', False), ('DetectEntrances', 'Intelligence_DetectEntrances', True),
+                     ('DetectTraps', 'Intelligence_DetectTraps', True)],
+    'Ego': [('Description', 'Ego', False), ('CompulsoryRetreat', 'Ego_CompulsoryRetreat', False),
+            ('WillingRetreat', 'Ego_WillingRetreat', False), ('HP', 'Ego_HP', False)],
+    'PublicStanding': [('ReactionDM', 'PublicStanding_ReactionDM', False)]
+}
+
+def _compile_samplers(characteristics):
+    """
+    Compile the physical and job columns of characteristics.csv for row sampling.
+
+    Rows are equally likely, so each sampler is the column as an array indexed by
+    a 1d<rows> roll, with dice cells classified once by formulas.parse_cell().
+    """
+    pay_base = []
+    pay_dice = []
+    for pay in characteristics['Pay'].tolist():
+        if 'd' in pay:
+            base, dice = pay.split('+')
+            pay_base.append(int(base))
+            pay_dice.append(parse_cell(dice))
+        else:
+            pay_base.append(0)
+            pay_dice.append(None)
+    jobs = characteristics['Job'].tolist()
+    return {
+        'Rows': len(characteristics),
+        'Height': characteristics['Height'].to_numpy(dtype=np.float64),
+        'WeightDM': [parse_cell(value) for value in characteristics['Height_WeightDM'].tolist()],
+        'Weight': characteristics['Weight'].to_numpy(dtype=np.int64),
+        'Job': np.array(jobs, dtype=object),
+        'Other': np.array(['Other' in job for job in jobs]),
+        'NPC': np.array(['NPC' in job for job in jobs]),
+        'Pay': characteristics['Pay'].tolist(),
+        'PayBase': np.array(pay_base, dtype=np.int64),
+        'PayDice': pay_dice,
+        'PatrolDM': [parse_cell(value) for value in characteristics['PatrolDM'].tolist()],
+        'JobNPCLow': np.array(characteristics['JobNPCLow'].tolist(), dtype=object),
+        'JobNPCHigh': np.array(characteristics['JobNPCHigh'].tolist(), dtype=object)
+    }
+
+def _load_tables(tables):
+    """Module globals from a version of the data tables, with an empty _effect_column() cache."""
+    return {'powers_table': tables['powers'], 'characteristics_table': tables['characteristics'],
+            '_effect_columns': {}, '_samplers': _compile_samplers(tables['characteristics'])}
+
+# Load origin power tables, and statistic effects, physical and job tables, and
+# rebind them whenever the tables are reloaded
+registry.subscribe(globals(), _load_tables)
+
+
+def secondary_column(origin):
+    """
+    Get the column used to resolve "Roll again twice" for an origin.
+
+    Args:
+        origin (str): Origin name, e.g. "Mutant".
+
+    Returns:
+        str: The origin's Secondary column, or the origin column itself if there is none.
+    """
+    secondary = origin + ' Secondary'
+    if secondary in powers_table.columns:
+        return secondary
+    return origin
+
+def roll_power_number(luck):
+    """
+    Roll the number of powers for a character.
+
+    The base number comes from the Powers column of powers.csv. Luck can add
+    extra powers: Luck 10 always adds one with a 25% chance of another, Luck 7-9
+    has a 75% chance of one more, Luck 4-6 50% and Luck 1-3 25%.
+
+    Args:
+        luck (int): Character Luck statistic.
+
+    Returns:
+        int: Number of powers.
+    """
+    number = int(powers_table['Powers'].iloc[roll_effects(1, 100) - 1])
+    if luck == 10:
+        number = number + 1
+        if roll_effects(1, 100) <= 25:
+            number = number + 1
+    elif 7 <= luck <= 9:
+        if roll_effects(1, 100) <= 75:
+            number = number + 1
+    elif 4 <= luck <= 6:
+        if roll_effects(1, 100) <= 50:
+            number = number + 1
+    elif 1 <= luck <= 3:
+        if roll_effects(1, 100) <= 25:
+            number = number + 1
+    return number
+
+def _roll_column(column, powers_list):
+    """Roll once on an origin table column, resolving "Roll again twice"."""
+    power = powers_table[column].iloc[roll_effects(1, 100) - 1]
+    if power == ROLL_AGAIN:
+        again = secondary_column(column)
+        _roll_column(again, powers_list)
+        _roll_column(again, powers_list)
+    else:
+        powers_list.append(power)
+
+def roll_powers(origin, number):
+    """
+    Roll powers from an origin table.
+
+    Args:
+        origin (str): Origin name, e.g. "Mutant".
+        number (int): Number of rolls on the origin table.
+
+    Returns:
+        list: Power names. "Roll again twice" can make this longer than number,
+              and the same power can appear more than once.
+    """
+    powers_list = []
+    for power in range(number):
+        _roll_column(origin, powers_list)
+    return powers_list
+
+def roll_powers_batch(origin, number, count):
+    """
+    Roll many power lists from an origin table at once.
+
+    The first roll of every list is drawn in one numpy batch; "Roll again twice"
+    is then resolved list by list, as roll_powers() does. The lists follow the
+    same rules as count roll_powers() calls, but the draws differ.
+
+    Args:
+        origin (str): Origin name, e.g. "Mutant".
+        number (int): Number of rolls on the origin table for each list.
+        count (int): Number of lists.
+
+    Returns:
+        list: count power lists.
+    """
+    entries = powers_table[origin].to_numpy(dtype=object)
+    rows = entries[roll_effects_batch(1, 100, count * number).reshape(count, number) - 1]
+    again = secondary_column(origin)
+    power_lists = []
+    for row in rows.tolist():
+        powers_list = []
+        for power in row:
+            if power == ROLL_AGAIN:
+                _roll_column(again, powers_list)
+                _roll_column(again, powers_list)
+            else:
+                powers_list.append(power)
+        power_lists.append(powers_list)
+    return power_lists
+
+def assign_devices(Character):
+    """
+    Mark the character's powers that are devices for their origin, under the
+    device rules in data/origins.csv.
+
+    Args:
+        Character (dict): Character with 'Origin', 'Statistics' and 'Powers' populated.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    rules = origins.rules
+    origin_id = rules.ids.get(Character['Origin']['Origin'])
+    if origin_id is None:
+        return Character
+    device_powers = rules.devices[origin_id]
+    for power in Character['Powers']['List']:
+        if power not in device_powers:
+            continue
+        if rules.device_roll[origin_id]:
+            device_roll = roll_effects(1, 100)
+            if device_roll + Character['Statistics']['Luck'] > rules.device_target[origin_id]:
+                continue
+        Character['Powers']['Detail'][power]['Device'] = {}
+    return Character
+
+def _cell(value):
+    """Convert a table cell to a plain Python value."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _effect_column(column):
+    """Values of a characteristics.csv column as a list of plain Python values."""
+    if column not in _effect_columns:
+        _effect_columns[column] = [_cell(value) for value in characteristics_table[column]]
+    return _effect_columns[column]
+
+def _statistic_row(value):
+    """Clamp a statistic to the rows available in characteristics.csv."""
+    return min(max(int(value), 0), len(characteristics_table) - 1)
+
+def roll_statistic_effects(Character):
+    """
+    Look up the effects of each statistic in characteristics.csv.
+
+    Dice-valued cells such as Strength HT "1d10+7" or DetectTraps "5d4" are rolled.
+    Every statistic gets a '<Statistic>_Effects' entry, empty if the statistic has no effects.
+
+    Args:
+        Character (dict): Character with 'Statistics' populated.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    for stat in Character['Statistics'].keys():
+        roll_statistic_effect(Character, stat)
+    return Character
+
+def roll_statistic_effect(Character, stat):
+    """
+    Look up the effects of one statistic in characteristics.csv, rolling any dice cells.
+
+    Args:
+        Character (dict): Character with 'Statistics' populated.
+        stat (str): Statistic name, e.g. "Strength".
+
+    Returns:
+        dict: The new '<Statistic>_Effects' entry.
+    """
+    Character[stat + '_Effects'] = {}
+    if stat in STATISTIC_EFFECTS:
+        row = _statistic_row(Character['Statistics'][stat])
+        for effect, column, dice in STATISTIC_EFFECTS[stat]:
+            value = _effect_column(column)[row]
+            if dice:
+                value = roll_ap(value)
+            Character[stat + '_Effects'][effect] = value
+    return Character[stat + '_Effects']
+
+def derive_statistics(Character):
+    """
+    Calculate HitPoints, ActionPotential and DirectDamage.
+
+    Args:
+        Character (dict): Character with statistic effects rolled.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    Statistics = Character['Statistics']
+
+    HitPoints = int(normal_round(float(Statistics['Stamina'])/2))
+    HitPoints = HitPoints + roll_effects(1, 10)
+    HitPoints = HitPoints + Statistics['Luck']
+    HitPoints = HitPoints + int(Character['Strength_Effects']['HT'])
+    HitPoints = HitPoints + int(Character['Agility_Effects']['HT'])
+    HitPoints = HitPoints + int(Character['Intelligence_Effects']['HT'])
+    Character['HitPoints'] = HitPoints
+
+    ActionPotential = Statistics['Strength']
+    ActionPotential = ActionPotential + int(normal_round(float(Statistics['Intelligence'])/2))
+    ActionPotential = ActionPotential + Statistics['Stamina']
+    ActionPotential = ActionPotential + int(normal_round(float(Statistics['Agility'])/2))
+    ActionPotential = ActionPotential + int(normal_round(float(Statistics['Ego'])/2))
+    ActionPotential = ActionPotential + Statistics['Luck']
+    Character['ActionPotential'] = ActionPotential
+
+    DirectDamage = int(Character['Strength_Effects']['DD'])
+    DirectDamage = DirectDamage + int(Character['Agility_Effects']['DD'])
+    DirectDamage = DirectDamage + int(Character['Intelligence_Effects']['DD'])
+    Character['DirectDamage'] = DirectDamage
+    return Character
+
+def roll_physical(Character):
+    """
+    Roll sex, height and weight.
+
+    Females are 5d4 cm shorter than the height table. The height row's weight DM
+    is subtracted for characters under 190 cm and added otherwise.
+
+    Args:
+        Character (dict): Character dictionary.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    samplers = _samplers
+    if roll_effects(1, 100) <= 50:
+        Character['Sex'] = 'Female'
+        height_mod = roll_effects(5, 4) * -1
+    else:
+        Character['Sex'] = 'Male'
+        height_mod = 0
+
+    height_row = roll_effects(1, samplers['Rows']) - 1
+    height = samplers['Height'][height_row].item() + height_mod
+    weight_mod = samplers['WeightDM'][height_row].roll()
+    if height < 190:
+        weight_mod = weight_mod * -1
+    weight = samplers['Weight'][roll_effects(1, samplers['Rows']) - 1].item()
+
+    Character['Height'] = height
+    Character['Weight'] = int(weight) + weight_mod
+    return Character
+
+def roll_physical_batch(count):
+    """
+    Roll sex, height and weight for many characters at once with numpy.
+
+    Args:
+        count (int): Number of characters.
+
+    Returns:
+        dict: 'Sex', 'Height' and 'Weight' lists with count values each, as
+              roll_physical() would set them.
+    """
+    samplers = _samplers
+    female = roll_effects_batch(1, 100, count) <= 50
+    height_mod = np.zeros(count, dtype=np.int64)
+    height_mod[female] = -roll_effects_batch(5, 4, int(female.sum()))
+    height_rows = roll_effects_batch(1, samplers['Rows'], count) - 1
+    height = samplers['Height'][height_rows] + height_mod
+    weight_mod = np.array(roll_column(samplers['WeightDM'], height_rows), dtype=np.int64)
+    weight_mod = np.where(height < 190, -weight_mod, weight_mod)
+    weight = samplers['Weight'][roll_effects_batch(1, samplers['Rows'], count) - 1] + weight_mod
+    return {'Sex': np.where(female, 'Female', 'Male').tolist(), 'Height': height.tolist(), 'Weight': weight.tolist()}
+
+def roll_job(Character):
+    """
+    Roll job, pay and patrol DM.
+
+    "Other" jobs are re-rolled on OTHER_JOBS and "NPC Professions" on the low
+    (1-3 on 1d6) or high (4-6) NPC job columns.
+
+    Args:
+        Character (dict): Character dictionary.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    samplers = _samplers
+    job_row = roll_effects(1, samplers['Rows']) - 1
+    job = samplers['Job'][job_row]
+    pay = samplers['Pay'][job_row]
+    if samplers['PayDice'][job_row] is not None:
+        pay = samplers['PayDice'][job_row].roll() + samplers['PayBase'][job_row].item()
+    Character['Pay'] = pay
+    Character['PatrolDM'] = samplers['PatrolDM'][job_row].roll()
+
+    if samplers['Other'][job_row]:
+        job = OTHER_JOBS[roll_effects(1, 6) - 1]
+    elif samplers['NPC'][job_row]:
+        if roll_effects(1, 6) <= 3:
+            column = 'JobNPCLow'
+        else:
+            column = 'JobNPCHigh'
+        job = samplers[column][roll_effects(1, samplers['Rows']) - 1]
+    Character['Job'] = job
+    return Character
+
+def roll_job_batch(count):
+    """
+    Roll job, pay and patrol DM for many characters at once with numpy.
+
+    Args:
+        count (int): Number of characters.
+
+    Returns:
+        dict: 'Job', 'Pay' and 'PatrolDM' lists with count values each, as
+              roll_job() would set them.
+    """
+    samplers = _samplers
+    rows = roll_effects_batch(1, samplers['Rows'], count) - 1
+    jobs = samplers['Job'][rows]
+
+    pay = [samplers['Pay'][row] for row in rows.tolist()]
+    has_dice = np.array([samplers['PayDice'][row] is not None for row in rows.tolist()], dtype=bool)
+    if has_dice.any():
+        dice_rows = rows[has_dice]
+        rolled = np.array(roll_column(samplers['PayDice'], dice_rows), dtype=np.int64) + samplers['PayBase'][dice_rows]
+        for position, value in zip(np.flatnonzero(has_dice).tolist(), rolled.tolist()):
+            pay[position] = value
+    patrol = roll_column(samplers['PatrolDM'], rows)
+
+    other = samplers['Other'][rows]
+    if other.any():
+        jobs[other] = np.array(OTHER_JOBS, dtype=object)[roll_effects_batch(1, 6, int(other.sum())) - 1]
+    npc = samplers['NPC'][rows]
+    if npc.any():
+        low = roll_effects_batch(1, 6, int(npc.sum())) <= 3
+        npc_rows = roll_effects_batch(1, samplers['Rows'], int(npc.sum())) - 1
+        jobs[npc] = np.where(low, samplers['JobNPCLow'][npc_rows], samplers['JobNPCHigh'][npc_rows])
+    return {'Job': jobs.tolist(), 'Pay': pay, 'PatrolDM': patrol}
+
+def roll_other_skill(Character):
+    """
+    Roll whether the character has another skill: d100 under Age + Luck.
+
+    Args:
+        Character (dict): Character with 'Origin' and 'Statistics' populated.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    skill_roll = roll_effects(1, 100)
+    if skill_roll < (int(Character['Origin']['Age']) + int(Character['Statistics']['Luck'])):
+        Character['OtherSkill'] = "Yes"
+    else:
+        Character['OtherSkill'] = "No"
+    return Character
+
+def _power_stream(power):
+    """Sub-stream of a power's details in seeded generation."""
+    return zlib.crc32(f'PowerDetails/{power}'.encode())
+
+def apply_powers(Character):
+    """
+    Roll the details of each of the character's powers.
+
+    Powers without a class in powers.power_classes keep their empty detail.
+    During seeded generation each power draws from its own sub-stream, so
+    its details do not depend on the powers rolled before it.
+
+    Args:
+        Character (dict): Character with 'Powers' populated.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    generator = current_generator()
+    for power in dict.fromkeys(Character['Powers']['List']):
+        power_class = power_classes.get(power)
+        if power_class is not None:
+            if generator is not None:
+                select_stream(generator, _power_stream(power))
+            power_class(Character)
+    return Character
+
+
+# Placeholder key of a LazyDetail that has not been rolled
+_PENDING = object()
+
+
+class LazyDetail(dict):
+    """
+    A power detail dictionary that is rolled on first read.
+
+    Until then it holds only the power, the (seed, index) key of its character
+    and the character as the power class would have seen it. Any dictionary
+    operation rolls the details on that power's sub-stream, exactly as eager
+    seeded generation does, and keeps them.
+
+    Attributes:
+        power (str): Power name.
+        key (tuple): (seed, index) of the character.
+    """
+
+    def __init__(self, power, key, view):
+        # A placeholder entry, as the json encoder writes an empty dict as {}
+        # without calling items()
+        super().__init__({_PENDING: None})
+        self.power = power
+        self.key = key
+        self._initial = dict(view['Powers']['Detail'][power])
+        # The character as apply_powers() would pass it when reaching this
+        # power, shared by the powers that see the same statistics
+        self._view = view
+        self._pending = True
+
+    @property
+    def pending(self):
+        """Whether the details have not been rolled yet."""
+        return self._pending
+
+    def materialize(self):
+        """Roll the details now, if they have not been rolled."""
+        if not self._pending:
+            return
+        detail = self._initial
+        view = dict(self._view, Powers=dict(self._view['Powers'], Detail={self.power: detail}))
+        generator = keyed_generator(*self.key)
+        select_stream(generator, _power_stream(self.power))
+        previous = set_generator(generator)
+        try:
+            power_classes[self.power](view)
+        finally:
+            set_generator(previous)
+        self._pending = False
+        self._initial = self._view = None
+        dict.clear(self)
+        dict.update(self, detail)
+
+    def __reduce__(self):
+        # Pickle and copy as a plain dictionary of the rolled details
+        self.materialize()
+        return dict, (dict(dict.items(self)),)
+
+
+def _materializing(name):
+    """Wrap a dict method so it rolls a LazyDetail's details first."""
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        if self._pending:
+            self.materialize()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for _name in ['__getitem__', '__setitem__', '__delitem__', '__contains__', '__iter__', '__reversed__', '__len__',
+              '__repr__', '__eq__', '__ne__', '__or__', '__ior__', 'keys', 'items', 'values', 'get', 'copy', 'pop',
+              'popitem', 'setdefault', 'update', 'clear']:
+    setattr(LazyDetail, _name, _materializing(_name))
+
+# Powers whose classes change more than their own details (statistics, age or
+# another detail entry), so deferring them would change the character
+EAGER_POWERS = frozenset(['Enhanced Agility', 'Enhanced Charisma', 'Enhanced Intelligence', 'Enhanced Stamina',
+                          'Enhanced Strength', 'Immortality', 'Energy Absorption'])
+
+def defer_powers(Character, key=None):
+    """
+    Replace the details of each of the character's powers with a LazyDetail.
+
+    Powers in EAGER_POWERS are rolled straight away, in list order, as
+    apply_powers() does. Must run inside seeded generation.
+
+    Args:
+        Character (dict): Character with 'Powers' populated.
+        key (tuple): (seed, index) of the character. Read from the seeded
+                     generator if None.
+
+    Returns:
+        dict: Updated character dictionary.
+    """
+    generator = current_generator()
+    if generator is None:
+        raise ValueError("Lazy power details need seeded generation, e.g. generate_character(seed, index, lazy=True)")
+    if key is None:
+        index, seed = (int(value) for value in generator.bit_generator.state['state']['key'])
+        key = (seed, index)
+    details = Character['Powers']['Detail']
+    view = dict(Character, Statistics=dict(Character['Statistics']))
+    for power in dict.fromkeys(Character['Powers']['List']):
+        power_class = power_classes.get(power)
+        if power_class is None:
+            continue
+        if power in EAGER_POWERS:
+            select_stream(generator, _power_stream(power))
+            power_class(Character)
+            # Later powers see the statistics as changed by this one
+            view = dict(Character, Statistics=dict(Character['Statistics']))
+        else:
+            details[power] = LazyDetail(power, key, view)
+    return Character
+
+def new_statistics():
+    """Return a Statistics dictionary with the default values before rolling."""
+    return {"Strength": 10, "Agility": 10, "Charisma": 10, "Intelligence": 10, "Stamina": 10,
+            "PublicStanding": 11, "Ego": 11, "Luck": 0}
+
+def _stage_statistics(Character):
+    """Roll the main statistics, Ego and Luck."""
+    Statistics = roll_main_statistics(new_statistics())
+    Statistics['Ego'] = roll_statistic()
+    Statistics['Luck'] = roll_luck()
+    Character['Statistics'] = Statistics
+
+def _stage_origin(Character):
+    """Roll origin, age, lifespan and artifact."""
+    Origin = origins.roll_origin()
+    Origin['Age'] = int(Origin['Age'])
+    if Origin['Lifespan'] != 'Human':
+        Origin['Lifespan'] = int(Origin['Lifespan'])
+    Character['Origin'] = Origin
+
+def _stage_powers(Character):
+    """Roll the power list and decide which powers are devices."""
+    powers_list = roll_powers(Character['Origin']['Origin'], roll_power_number(Character['Statistics']['Luck']))
+    Character['Powers'] = {'Number': len(powers_list), 'List': powers_list, 'Detail': {}}
+    for power in powers_list:
+        Character['Powers']['Detail'][power] = {}
+    assign_devices(Character)
+
+def _stage_effects(Character):
+    """Look up statistic effects and derive HitPoints, ActionPotential and DirectDamage."""
+    roll_statistic_effects(Character)
+    derive_statistics(Character)
+
+def _stage_physical(Character):
+    """Roll sex, height, weight, job and other skill."""
+    roll_physical(Character)
+    roll_job(Character)
+    roll_other_skill(Character)
+
+# Named steps of generate_character(), in order, each taking the Character
+# dictionary built so far. Profilers such as the memory module run them one by one.
+GENERATION_STAGES = [
+    ('Statistics', _stage_statistics),
+    ('Origin', _stage_origin),
+    ('Powers', _stage_powers),
+    ('Effects', _stage_effects),
+    ('Physical', _stage_physical),
+    ('PowerDetails', apply_powers)
+]
+
+# Sub-stream of each stage for seeded generation, from the stage name so that
+# adding or reordering stages leaves the others' draws unchanged
+_STAGE_STREAMS = {stage: zlib.crc32(stage.encode()) for stage, function in GENERATION_STAGES}
+
+@registry.reading()
+def generate_character(seed=None, index=0, lazy=False):
+    """
+    Generate a complete character.
+
+    With a seed, the character depends only on (seed, index): each stage draws
+    from its own sub-stream of a Philox generator keyed on them, so character
+    734211 of a roster is generated directly, without the ones before it, and
+    any shard of a roster can be regenerated on its own.
+
+    Args:
+        seed (int): Roster or campaign seed. If None, dice come from numpy's
+                    global random state as usual.
+        index (int): Character index within the seeded roster.
+        lazy (bool): Leave each power's details as a LazyDetail, rolled when first
+                     read. The character is the same as without lazy. Needs a seed.
+
+    Returns:
+        dict: Character dictionary with Statistics, Origin, Powers, statistic effects,
+              derived values, physical details, job and powers applied.
+    """
+    Character = {}
+    if seed is None:
+        if lazy:
+            raise ValueError("Lazy power details need a seed")
+        for stage, function in GENERATION_STAGES:
+            function(Character)
+        return Character
+    generator = keyed_generator(seed, index)
+    previous = set_generator(generator)
+    try:
+        for stage, function in GENERATION_STAGES:
+            select_stream(generator, _STAGE_STREAMS[stage])
+            if lazy and function is apply_powers:
+                defer_powers(Character, (seed, index))
+            else:
+                function(Character)
+    finally:
+        set_generator(previous)
+    return Character
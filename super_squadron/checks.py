@@ -0,0 +1,420 @@
+"""
+Super Squadron Checks Module
+
+This module resolves d100 checks for many characters at once, e.g. an
+OtherSkill roll for a whole roster, or the saves of everyone a power hits.
+
+A check is an expression such as "< Age + Luck" or "<= ST + SA + LK + Exp": an
+optional comparison ("<=" when left out) of the d100 roll with a target. The
+target is a sum of integers, dice such as "1d4", and character values: the
+statistics by name or as ST, AG, SA, LK, EG, IQ, CH and PS, Age, HitPoints,
+ActionPotential, DirectDamage, and the numeric statistic effects as
+"<Statistic>_<Effect>" (DetectEntrances and DetectTraps also by their own
+names). Terms can be multiplied with "x" or "*", divided by an integer with "/"
+(halves rounded up, as powers.normal_round() does), negated and grouped in
+brackets, so the detail texts "80 - (LK + EXP)" and "SA x 2" are checks too.
+Exp is the character's experience, 0 unless given in the values.
+
+compile_check() parses an expression once into a Check. Check.resolve() rolls
+every character's d100 and dice in one batch and returns numpy arrays of
+successes and margins, and Check.probability() gives each character's exact
+chance of success, summing over the outcomes of any dice in the target.
+STANDARD_CHECKS holds the checks of the rules:
+
+    resolve_check(STANDARD_CHECKS['OtherSkill'], characters)['Success']
+"""
+
+import itertools
+import re
+
+import numpy as np
+
+from super_squadron.character import STATISTIC_EFFECTS
+from super_squadron.formulas import STATISTICS
+from super_squadron.roll import roll_effects_batch
+
+__all__ = [
+    'COMPARISONS',
+    'ABBREVIATIONS',
+    'EXTERNAL_VALUES',
+    'STANDARD_CHECKS',
+    'Check',
+    'compile_check',
+    'resolve_check',
+    'check_probability'
+]
+
+COMPARISONS = ['<', '<=', '>', '>=']
+
+# Statistic abbreviations used in the power detail texts
+ABBREVIATIONS = {'ST': 'Strength', 'AG': 'Agility', 'SA': 'Stamina', 'LK': 'Luck', 'EG': 'Ego',
+                 'IQ': 'Intelligence', 'CH': 'Charisma', 'PS': 'PublicStanding'}
+
+# Values that are not on the character, and their defaults when not given
+EXTERNAL_VALUES = {'Exp': 0}
+
+# Checks of the rules, by what they decide
+STANDARD_CHECKS = {
+    'OtherSkill': '< Age + Luck',
+    'DetectEntrances': '<= DetectEntrances',
+    'DetectTraps': '<= DetectTraps',
+    'InherentPowerSave': '<= ST + SA + LK',
+    'DeathTouchSave': '<= ST + SA + LK + Exp',
+    'EmotionControlSave': '<= EG + LK + Exp',
+    'BodyAugmentationPower': '<= 5',
+    'InvisibilityPermanent': '>= 91'
+}
+
+# Most joint dice outcomes summed over by Check.probability()
+_MAX_OUTCOMES = 1000000
+
+_TOKENS = re.compile(r'\s*(?:(\d+)d(\d+)|(\d+)|([A-Za-z_]+)|(<=|>=|[-+*/()<>]))')
+
+
+def _variables():
+    """Character value name to its column name and its path in a Character dictionary."""
+    variables = {stat: (stat, ('Statistics', stat)) for stat in STATISTICS}
+    for stat, effects in STATISTIC_EFFECTS.items():
+        for effect, column, dice in effects:
+            if effect != 'Description':
+                variables[column] = (column, (stat + '_Effects', effect))
+    variables['DetectEntrances'] = variables['Intelligence_DetectEntrances']
+    variables['DetectTraps'] = variables['Intelligence_DetectTraps']
+    variables['Age'] = ('Age', ('Origin', 'Age'))
+    for name in ('HitPoints', 'ActionPotential', 'DirectDamage'):
+        variables[name] = (name, (name,))
+    return variables
+
+_VARIABLES = _variables()
+
+# Compiled checks by expression
+_compiled = {}
+
+
+def _to_int(value):
+    """Convert a character value to int, treating missing or non-numeric values as 0."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def _tokenize(expression):
+    """Split an expression into ('dice', (number, sides)), ('number', n), ('name', s) and ('op', s) tokens."""
+    tokens = []
+    position = 0
+    text = expression.rstrip()
+    while position < len(text):
+        match = _TOKENS.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Cannot parse check {expression!r} at {text[position:]!r}")
+        number, sides, integer, name, operator = match.groups()
+        if number is not None:
+            tokens.append(('dice', (int(number), int(sides))))
+        elif integer is not None:
+            tokens.append(('number', int(integer)))
+        elif name in ('x', 'X'):
+            tokens.append(('op', '*'))
+        elif name is not None:
+            tokens.append(('name', name))
+        else:
+            tokens.append(('op', operator))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser from check tokens to a target expression tree."""
+
+    def __init__(self, expression, tokens):
+        self.expression = expression
+        self.tokens = tokens
+        self.position = 0
+        self.names = []
+        self.dice = []
+
+    def _error(self, message):
+        return ValueError(f"{message} in check {self.expression!r}")
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def sum(self):
+        node = self.product()
+        while self._peek() in (('op', '+'), ('op', '-')):
+            operator = self._take()[1]
+            node = ('add' if operator == '+' else 'sub', node, self.product())
+        return node
+
+    def product(self):
+        node = self.factor()
+        while self._peek() in (('op', '*'), ('op', '/')):
+            operator = self._take()[1]
+            if operator == '*':
+                node = ('mul', node, self.factor())
+                continue
+            kind, divisor = self._take()
+            if kind != 'number' or divisor == 0:
+                raise self._error("Divisors must be non-zero integers")
+            node = ('div', node, divisor)
+        return node
+
+    def factor(self):
+        kind, value = self._take()
+        if kind == 'number':
+            return ('const', value)
+        if kind == 'dice':
+            if value[0] < 1 or value[1] < 1:
+                raise self._error(f"Bad dice {value[0]}d{value[1]}")
+            self.dice.append(value)
+            return ('dice', len(self.dice) - 1)
+        if kind == 'name':
+            name = ABBREVIATIONS.get(value, value)
+            if name.lower() == 'exp':
+                name = 'Exp'
+            if name not in _VARIABLES and name not in EXTERNAL_VALUES:
+                raise self._error(f"Unknown value {value!r}")
+            if name not in self.names:
+                self.names.append(name)
+            return ('value', name)
+        if (kind, value) == ('op', '-'):
+            return ('neg', self.factor())
+        if (kind, value) == ('op', '('):
+            node = self.sum()
+            if self._take() != ('op', ')'):
+                raise self._error("Unclosed bracket")
+            return node
+        raise self._error("Expected a number, dice or value" if kind is None else f"Unexpected {value!r}")
+
+
+def _evaluate(node, values, dice):
+    """Evaluate a target expression tree over value arrays and dice results."""
+    kind = node[0]
+    if kind == 'const':
+        return np.int64(node[1])
+    if kind == 'value':
+        return values[node[1]]
+    if kind == 'dice':
+        return dice[node[1]]
+    if kind == 'neg':
+        return -_evaluate(node[1], values, dice)
+    if kind == 'div':
+        return np.floor(_evaluate(node[1], values, dice) / node[2] + 0.5).astype(np.int64)
+    left, right = _evaluate(node[1], values, dice), _evaluate(node[2], values, dice)
+    if kind == 'add':
+        return left + right
+    if kind == 'sub':
+        return left - right
+    return left * right
+
+def _dice_distribution(number, sides):
+    """Sums of number dice of the given sides and their probabilities."""
+    probabilities = np.ones(1)
+    face = np.full(sides, 1.0 / sides)
+    for die in range(number):
+        probabilities = np.convolve(probabilities, face)
+    return np.arange(number, number * sides + 1, dtype=np.int64), probabilities
+
+
+class Check:
+    """
+    A compiled d100 check.
+
+    Attributes:
+        expression (str): The expression it was compiled from.
+        comparison (str): One of COMPARISONS; the roll is compared with the target.
+        names (tuple): Character and external values the target uses.
+        dice (tuple): (number, sides) of each dice term in the target.
+    """
+
+    def __init__(self, expression):
+        """
+        Args:
+            expression (str): Check expression, e.g. "< Age + Luck".
+        """
+        tokens = _tokenize(expression)
+        comparison = '<='
+        if tokens and tokens[0][0] == 'op' and tokens[0][1] in COMPARISONS:
+            comparison = tokens.pop(0)[1]
+        parser = _Parser(expression, tokens)
+        self._tree = parser.sum()
+        if parser.position < len(tokens):
+            raise parser._error(f"Unexpected {tokens[parser.position][1]!r}")
+        self.expression = expression
+        self.comparison = comparison
+        self.names = tuple(parser.names)
+        self.dice = tuple(parser.dice)
+
+    def __repr__(self):
+        return f'Check({self.expression!r})'
+
+    def _values(self, characters, values):
+        """Arrays of the values the target uses, and the number of characters."""
+        values = {'Exp' if name.lower() == 'exp' else name: value for name, value in (values or {}).items()}
+        columnar = isinstance(characters, dict)
+        if columnar:
+            count = len(next(iter(characters.values()))) if characters else 0
+        else:
+            count = len(characters)
+        arrays = {}
+        for name in self.names:
+            if name in values:
+                array = np.broadcast_to(np.asarray(values[name], dtype=np.int64), (count,))
+            elif name in EXTERNAL_VALUES:
+                array = np.full(count, EXTERNAL_VALUES[name], dtype=np.int64)
+            elif columnar:
+                column = _VARIABLES[name][0]
+                if column not in characters:
+                    raise ValueError(f"Check {self.expression!r} needs a {column!r} column")
+                array = np.asarray(characters[column], dtype=np.int64)
+            else:
+                path = _VARIABLES[name][1]
+                column = []
+                for Character in characters:
+                    value = Character
+                    for key in path:
+                        value = value.get(key, 0) if isinstance(value, dict) else 0
+                    column.append(_to_int(value))
+                array = np.array(column, dtype=np.int64)
+            arrays[name] = array
+        return arrays, count
+
+    def _succeeds(self, rolls, targets):
+        """Whether each roll passes its target."""
+        if self.comparison == '<':
+            return rolls < targets
+        if self.comparison == '<=':
+            return rolls <= targets
+        if self.comparison == '>':
+            return rolls > targets
+        return rolls >= targets
+
+    def _chances(self, targets):
+        """Chance of a d100 roll passing each target."""
+        if self.comparison == '<':
+            passing = targets - 1
+        elif self.comparison == '<=':
+            passing = targets
+        elif self.comparison == '>':
+            passing = 100 - targets
+        else:
+            passing = 101 - targets
+        return np.clip(passing, 0, 100) / 100
+
+    def targets(self, characters, values=None, dice=None):
+        """
+        Get each character's target.
+
+        Args:
+            characters (list or dict): Character dictionaries, or a columnar
+                                       roster with a column for each value used.
+            values (dict): External values such as 'Exp', or overrides of
+                           character values, as scalars or per-character arrays.
+            dice (list): Result of each dice term, as scalars or arrays. The
+                         dice are rolled if None.
+
+        Returns:
+            numpy.ndarray: int64 target of each character.
+        """
+        arrays, count = self._values(characters, values)
+        if dice is None:
+            dice = [roll_effects_batch(number, sides, count).astype(np.int64) for number, sides in self.dice]
+        return np.broadcast_to(np.asarray(_evaluate(self._tree, arrays, dice), dtype=np.int64), (count,)).copy()
+
+    def resolve(self, characters, values=None, rolls=None):
+        """
+        Resolve the check for every character in one pass.
+
+        Args:
+            characters (list or dict): Character dictionaries or a columnar roster.
+            values (dict): External values and overrides, as for targets().
+            rolls (sequence): d100 roll of each character, rolled if None.
+
+        Returns:
+            dict: 'Success' (bool array), 'Margin' (int64 array: target minus
+                  roll for "<" and "<=" checks, roll minus target for ">" and
+                  ">=", so more is better), 'Rolls' and 'Targets'.
+        """
+        targets = self.targets(characters, values)
+        if rolls is None:
+            rolls = roll_effects_batch(1, 100, len(targets))
+        rolls = np.asarray(rolls, dtype=np.int64)
+        margins = targets - rolls if self.comparison in ('<', '<=') else rolls - targets
+        return {'Success': self._succeeds(rolls, targets), 'Margin': margins, 'Rolls': rolls, 'Targets': targets}
+
+    def probability(self, characters, values=None):
+        """
+        Get each character's exact chance of passing the check.
+
+        Args:
+            characters (list or dict): Character dictionaries or a columnar roster.
+            values (dict): External values and overrides, as for targets().
+
+        Returns:
+            numpy.ndarray: float64 probability of success of each character.
+        """
+        arrays, count = self._values(characters, values)
+        distributions = [_dice_distribution(number, sides) for number, sides in self.dice]
+        outcomes = 1
+        for sums, probabilities in distributions:
+            outcomes = outcomes * len(sums)
+        if outcomes > _MAX_OUTCOMES:
+            raise ValueError(f"Check {self.expression!r} has {outcomes} dice outcomes, more than {_MAX_OUTCOMES}")
+        chances = np.zeros(count)
+        for outcome in itertools.product(*[range(len(sums)) for sums, probabilities in distributions]):
+            dice = [sums[index] for (sums, probabilities), index in zip(distributions, outcome)]
+            weight = 1.0
+            for (sums, probabilities), index in zip(distributions, outcome):
+                weight = weight * probabilities[index]
+            targets = np.broadcast_to(_evaluate(self._tree, arrays, dice), (count,))
+            chances = chances + weight * self._chances(targets)
+        return chances
+
+
+def compile_check(expression):
+    """
+    Compile a check expression, once per expression.
+
+    Args:
+        expression (str): Check expression, e.g. "<= ST + SA + LK".
+
+    Returns:
+        Check: The compiled check.
+    """
+    check = _compiled.get(expression)
+    if check is None:
+        check = _compiled[expression] = Check(expression)
+    return check
+
+def resolve_check(expression, characters, values=None, rolls=None):
+    """
+    Resolve a check for every character.
+
+    Args:
+        expression (str): Check expression, e.g. STANDARD_CHECKS['OtherSkill'].
+        characters (list or dict): Character dictionaries or a columnar roster.
+        values (dict): External values such as {'Exp': 3}.
+        rolls (sequence): d100 rolls, rolled if None.
+
+    Returns:
+        dict: Check.resolve() arrays.
+    """
+    return compile_check(expression).resolve(characters, values, rolls)
+
+def check_probability(expression, characters, values=None):
+    """
+    Get every character's exact chance of passing a check.
+
+    Args:
+        expression (str): Check expression.
+        characters (list or dict): Character dictionaries or a columnar roster.
+        values (dict): External values such as {'Exp': 3}.
+
+    Returns:
+        numpy.ndarray: Probability of success of each character.
+    """
+    return compile_check(expression).probability(characters, values)
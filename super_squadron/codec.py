@@ -0,0 +1,414 @@
+"""
+Super Squadron Codec Module
+
+This module encodes single characters as compact bytes, for keeping them in
+caches and files instead of JSON text or pickles.
+
+An encoded character is, in FORMAT_VERSION 2:
+
+- a prefix: the magic b'SQ', the format version, the fingerprint of the data
+  tables and the layout (LAYOUT or PLAIN)
+- for the LAYOUT layout, a fixed header of the eight statistics (int16, in
+  formulas.STATISTICS order), the origin (its origins.csv OriginID), Age
+  (int32) and HitPoints, ActionPotential and DirectDamage (int16), then a
+  marshalled tuple of the rest of the character in CHARACTER_FIELDS order:
+  the power list as bytes of power_details.csv rows, each power's detail as
+  its row, its field names as bytes of DETAIL_FIELDS indices, a mask of the
+  values equal to the power's power_details.csv cell and the other values,
+  and the statistic effects as one tuple of their values
+- for the PLAIN layout, the marshalled character dictionary. Characters that
+  do not fit the header or the fixed key layout, such as an unknown origin or
+  a statistic outside int16, are written this way
+
+DETAIL_FIELDS is part of the format: changing it needs a new FORMAT_VERSION.
+The fingerprint is a CRC-32 of DETAIL_FIELDS, the power and origin names and
+the power cells, so a payload decoded by a process with different tables
+raises ValueError instead of giving wrong values. Decoded characters compare
+equal to the encoded ones; numpy scalars and the values the header holds come
+back as Python numbers. Like marshal itself, decode() is meant for payloads
+from trusted caches and files.
+
+Generated characters encode to about a third of their JSON size and half of
+their pickle size. encode() and decode() each take about four fifths as long
+as json.dumps() and json.loads(). pickle, being written in C, encodes about
+twice as fast and decodes about a third faster, so for passing characters
+between processes of the same build pickle is the quicker choice; the codec is
+for caches and files, where size and the version and table checks
+matter. compare_formats() measures all three on a roster:
+
+    python -m super_squadron.codec --characters 5000    # compare with JSON and pickle
+"""
+
+import json
+import marshal
+import pickle
+import struct
+import time
+import zlib
+from itertools import chain, compress
+from operator import eq, itemgetter, not_
+
+import numpy as np
+
+from super_squadron import character
+from super_squadron.formulas import STATISTICS
+from super_squadron.tables import registry
+
+__all__ = [
+    'FORMAT_VERSION',
+    'MAGIC',
+    'LAYOUT',
+    'PLAIN',
+    'DERIVED_FIELDS',
+    'CHARACTER_FIELDS',
+    'DETAIL_FIELDS',
+    'encode',
+    'decode',
+    'compare_formats'
+]
+
+FORMAT_VERSION = 2
+MAGIC = b'SQ'
+
+# Layouts of an encoded character
+LAYOUT = 0
+PLAIN = 1
+
+DERIVED_FIELDS = ['HitPoints', 'ActionPotential', 'DirectDamage']
+
+# Keys of a generated character, in order
+CHARACTER_FIELDS = (['Statistics', 'Origin', 'Powers'] + [stat + '_Effects' for stat in STATISTICS] + DERIVED_FIELDS
+                    + ['Sex', 'Height', 'Weight', 'Pay', 'PatrolDM', 'Job', 'OtherSkill'])
+
+# Field names of power details, written as their index
+DETAIL_FIELDS = (
+    'StrDetails', 'APCost', 'MaxAP', 'AreaEffect', 'DeviceAP', 'DamageAP', 'Duration',
+    'DurationUnit', 'Range', 'DeviceRange', 'Choices', '1AP', '2AP', '3AP', '4AP', '5AP',
+    'AgilityEffect', 'AP', 'APCostB', 'APCostFlight', 'ArrivalTime', 'AttackDM', 'AttackEffects',
+    'Augmentations', 'Blast', 'Casual', 'CreateVortex', 'Damage', 'DamageLiving',
+    'DamageNonLiving', 'DamageReduction', 'DD', 'Defense', 'DefenseBonus', 'DefenseBonusAttacking',
+    'DefensivePowerModifierA', 'DefensivePowerModifierB', 'DefensivePowerModifierPermanentDamage',
+    'DefensivePowerModifierSaveA', 'DefensivePowerModifierSaveB', 'DensityLevel', 'Device', 'DM',
+    'DurationRoll', 'Entangle', 'ExtraAbilities', 'ExtraAction', 'ExtraArea', 'FailA', 'FailB',
+    'Flight', 'FreezeSave', 'Gimmicks', 'Gravity', 'HP', 'HTH', 'Hyperspace', 'Immunity',
+    'InventNew', 'LightSpeed', 'Loyalty', 'MaxWeight', 'MishapChance', 'MishapDamage', 'Morale',
+    'Move', 'Name', 'Number', 'Other', 'Overload', 'Oxygen', 'Penalty', 'Powers', 'PowersInAstral',
+    'Rate', 'RunFrictionless', 'Save', 'SaveA', 'SaveAPermanentDamage', 'SaveB',
+    'ScientistInventNew', 'Special', 'Speed', 'SpeedHyperspace', 'SpeedUnit', 'SpellsInAstral',
+    'Statistics', 'Store', 'StoreBlast', 'StoreMax', 'StoreMiss', 'Storm', 'Stretching', 'Studied',
+    'TargetFamiliarity', 'Temperature', 'Type', 'Unknown', 'Volume'
+)
+
+# Magic, version, fingerprint and layout, then statistics, origin, Age and derived values
+_PREFIX = struct.Struct('<2sBIB')
+_HEADER = struct.Struct('<8hBi3h')
+# marshal version 2 writes no back-references, which is faster for payloads this small
+_MARSHAL_VERSION = 2
+
+_ORIGIN_FIELDS = ('Artifact', 'Lifespan', 'Origin', 'Age')
+_POWERS_FIELDS = ('Number', 'List', 'Detail')
+_DERIVED_START = 3 + len(STATISTICS)
+_REST_START = _DERIVED_START + len(DERIVED_FIELDS)
+_EFFECT_SHAPES = [(stat + '_Effects', tuple(effect for effect, column, dice in character.STATISTIC_EFFECTS.get(stat, ())))
+                  for stat in STATISTICS]
+_EFFECT_KEYS = tuple(key for name, shape in _EFFECT_SHAPES for key in shape)
+
+_character_values = itemgetter(*CHARACTER_FIELDS)
+_statistic_values = itemgetter(*STATISTICS)
+_origin_values = itemgetter(*_ORIGIN_FIELDS)
+_powers_values = itemgetter(*_POWERS_FIELDS)
+
+_FIELD_IDS = {field: field_id for field_id, field in enumerate(DETAIL_FIELDS)}
+_NO_CELLS = {}
+# Types that marshal writes as themselves; it writes other objects with a
+# buffer, such as numpy scalars, as bytes
+_PLAIN_TYPES = {str, int, float, bool, bytes, type(None)}
+_NESTED_TYPES = _PLAIN_TYPES | {dict, list, tuple}
+
+# Most detail layouts, masks per layout and decoded details cached
+_CACHED_LAYOUTS = 1 << 16
+_CACHED_MASKS = 1 << 10
+_CACHED_DETAILS = 1 << 16
+
+
+def _load_tables(tables):
+    """Build the power and origin names, power cells and fingerprint from a version of the data tables."""
+    details = tables['power_details']
+    power_names = [str(name) for name in details['Power'].tolist()]
+    cells = {}
+    for row in details.to_dict('records'):
+        cells[str(row['Power'])] = {column: value for column, value in row.items()
+                                    if column != 'Power' and type(value) is str}
+    origin_names = [str(name) for name in tables['origins']['Origin'].tolist()]
+    text = json.dumps([DETAIL_FIELDS, power_names, origin_names,
+                       sorted((power, sorted(row.items())) for power, row in cells.items())])
+    return {'_power_names': power_names,
+            '_power_ids': {name: power_id for power_id, name in enumerate(power_names)},
+            '_power_cells': cells,
+            '_origin_names': origin_names,
+            '_origin_ids': {name: origin_id for origin_id, name in enumerate(origin_names)},
+            '_fingerprint': zlib.crc32(text.encode()),
+            '_encode_layouts': {},
+            '_decode_layouts': {},
+            '_decoded_details': {}}
+
+# Build the names, cells and fingerprint, and rebuild them whenever the tables are reloaded
+registry.subscribe(globals(), _load_tables)
+
+
+def _encode_layout(power, keys):
+    """
+    Get the codes of a power and its detail's field names, the power's cells
+    for those fields and a cache of masks of the values equal to their cell.
+
+    A power not in power_details.csv is written as a 1-tuple of its name, and
+    field names not all in DETAIL_FIELDS as a tuple of the names. The masks
+    are keyed by a detail's values; values that compare equal, such as 1 and
+    True, have the same mask, as neither is equal to a cell's string.
+    """
+    try:
+        key_code = bytes(map(_FIELD_IDS.__getitem__, keys))
+    except (KeyError, TypeError):
+        key_code = keys
+    power_id = _power_ids.get(power) if type(power) is str else None
+    layout = ((power,) if power_id is None else power_id, key_code,
+              tuple(map(_power_cells.get(power, _NO_CELLS).get, keys)), {})
+    if len(_encode_layouts) < _CACHED_LAYOUTS:
+        _encode_layouts[power, keys] = layout
+    return layout
+
+def _decode_layout(power_code, key_code):
+    """Get the power, field names and cells of a detail written by encode()."""
+    power = _power_names[power_code] if type(power_code) is int else power_code[0]
+    keys = tuple(map(DETAIL_FIELDS.__getitem__, key_code)) if type(key_code) is bytes else key_code
+    layout = (power, keys, tuple(map(_power_cells.get(power, _NO_CELLS).get, keys)))
+    if len(_decode_layouts) < _CACHED_LAYOUTS:
+        _decode_layouts[power_code, key_code] = layout
+    return layout
+
+def _check_plain(values):
+    """Raise TypeError unless a tuple's values, and the keys and items of dictionaries, lists and tuples among them, have _PLAIN_TYPES."""
+    if _PLAIN_TYPES.issuperset(map(type, values)):
+        return
+    types = set(map(type, values))
+    if not _NESTED_TYPES.issuperset(types):
+        raise TypeError(f"Cannot write {types - _NESTED_TYPES} in the LAYOUT layout")
+    for value in values:
+        kind = type(value)
+        if kind is dict:
+            _check_plain(tuple(value))
+            _check_plain(tuple(value.values()))
+        elif kind is list or kind is tuple:
+            _check_plain(value)
+
+def _plain(value):
+    """A copy of a value with numpy scalars and subclasses of built-in types made into the built-in types."""
+    kind = type(value)
+    if kind in _PLAIN_TYPES:
+        return value
+    if isinstance(value, dict):
+        return {_plain(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, tuple):
+        return tuple(map(_plain, value))
+    if isinstance(value, list):
+        return list(map(_plain, value))
+    for base in (str, int, float, bytes):
+        if isinstance(value, base):
+            return base(value)
+    raise TypeError(f"Cannot encode {kind.__name__} value {value!r}")
+
+def _encode_layout_form(Character):
+    """Encode a character in the LAYOUT layout, raising KeyError, TypeError or ValueError if it does not fit."""
+    values = _character_values(Character)
+    Statistics, Origin, Powers = values[:3]
+    if (len(Character) != len(CHARACTER_FIELDS) or len(Statistics) != len(STATISTICS)
+            or len(Origin) != len(_ORIGIN_FIELDS) or len(Powers) != len(_POWERS_FIELDS)):
+        raise KeyError('layout')
+    artifact, lifespan, origin, age = _origin_values(Origin)
+    number, power_list, details = _powers_values(Powers)
+    header = _HEADER.pack(*_statistic_values(Statistics), _origin_ids[origin], age,
+                          *values[_DERIVED_START:_REST_START])
+    if type(power_list) is list:
+        try:
+            power_list = bytes(map(_power_ids.__getitem__, power_list))
+        except (KeyError, TypeError, ValueError):
+            power_list = (power_list,)
+    else:
+        power_list = (power_list,)
+    # Values to check for types marshal does not write as themselves
+    checked = [(artifact, lifespan, number), values[_REST_START:]]
+    if type(power_list) is tuple:
+        checked.append(power_list)
+    entries = []
+    for power, detail in details.items():
+        keys = tuple(detail)
+        layout = _encode_layouts.get((power, keys))
+        if layout is None:
+            layout = _encode_layout(power, keys)
+        detail_values = tuple(detail.values())
+        try:
+            same = layout[3].get(detail_values)
+        except TypeError:
+            same = bytes(map(eq, detail_values, layout[2]))
+        if same is None:
+            same = bytes(map(eq, detail_values, layout[2]))
+            if len(layout[3]) < _CACHED_MASKS:
+                layout[3][detail_values] = same
+        others = tuple(compress(detail_values, map(not_, same)))
+        checked.append(others)
+        entries.append((layout[0], layout[1], same, others))
+    effects = values[3:_DERIVED_START]
+    if tuple(chain.from_iterable(effects)) == _EFFECT_KEYS:
+        effects = tuple(chain.from_iterable(map(dict.values, effects)))
+    else:
+        effects = list(effects)
+    checked.append(effects)
+    _check_plain(tuple(chain.from_iterable(checked)))
+    body = (artifact, lifespan, number, power_list, entries, effects, values[_REST_START:])
+    return (_PREFIX.pack(MAGIC, FORMAT_VERSION, _fingerprint, LAYOUT) + header
+            + marshal.dumps(body, _MARSHAL_VERSION))
+
+def encode(Character):
+    """
+    Encode a character as bytes.
+
+    Args:
+        Character (dict): Character dictionary. Values must be dictionaries,
+                          lists, tuples, strings, numbers, booleans or None.
+
+    Returns:
+        bytes: The encoded character, for decode().
+    """
+    if not isinstance(Character, dict):
+        raise TypeError(f"Cannot encode a {type(Character).__name__} as a character")
+    try:
+        return _encode_layout_form(Character)
+    except (KeyError, TypeError, ValueError, AttributeError, struct.error):
+        pass
+    return (_PREFIX.pack(MAGIC, FORMAT_VERSION, _fingerprint, PLAIN)
+            + marshal.dumps(_plain(Character), _MARSHAL_VERSION))
+
+
+def _decode_layout_form(data):
+    """Decode the header and marshalled tuple of a character in the LAYOUT layout."""
+    header = _HEADER.unpack_from(data, _PREFIX.size)
+    artifact, lifespan, number, power_list, entries, effects, rest = marshal.loads(data[_PREFIX.size + _HEADER.size:])
+    details = {}
+    for entry in entries:
+        # The value types keep 1, 1.0 and True apart
+        key = (entry, tuple(map(type, entry[3])))
+        try:
+            decoded = _decoded_details.get(key)
+        except TypeError:
+            decoded = key = None
+        if decoded is None:
+            power_code, key_code, same, others = entry
+            layout = _decode_layouts.get((power_code, key_code))
+            if layout is None:
+                layout = _decode_layout(power_code, key_code)
+            power, keys, cells = layout
+            detail = dict(zip(keys, cells))
+            detail.update(zip(compress(keys, map(not_, same)), others))
+            decoded = (power, detail)
+            if key is not None and len(_decoded_details) < _CACHED_DETAILS:
+                _decoded_details[key] = decoded
+        details[decoded[0]] = decoded[1].copy()
+    Character = {'Statistics': dict(zip(STATISTICS, header[:8])),
+                 'Origin': {'Artifact': artifact, 'Lifespan': lifespan, 'Origin': _origin_names[header[8]],
+                            'Age': header[9]},
+                 'Powers': {'Number': number,
+                            'List': (list(map(_power_names.__getitem__, power_list)) if type(power_list) is bytes
+                                     else power_list[0]),
+                            'Detail': details}}
+    if type(effects) is tuple:
+        effect_values = iter(effects)
+        for name, shape in _EFFECT_SHAPES:
+            Character[name] = dict(zip(shape, effect_values))
+    else:
+        Character.update(zip(CHARACTER_FIELDS[3:_DERIVED_START], effects))
+    Character.update(zip(DERIVED_FIELDS, header[10:]))
+    Character.update(zip(CHARACTER_FIELDS[_REST_START:], rest))
+    return Character
+
+def decode(data):
+    """
+    Decode a character encoded by encode().
+
+    Args:
+        data (bytes): The encoded character.
+
+    Returns:
+        dict: Character dictionary equal to the encoded one.
+    """
+    if len(data) < _PREFIX.size:
+        raise ValueError(f"{len(data)} bytes is too short for an encoded character")
+    magic, version, fingerprint, layout = _PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not an encoded character: starts with {bytes(magic)!r}")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Encoded character has format version {version}, this is version {FORMAT_VERSION}")
+    if fingerprint != _fingerprint:
+        raise ValueError("Encoded character was written with different data tables")
+    try:
+        if layout == LAYOUT:
+            return _decode_layout_form(data)
+        if layout == PLAIN:
+            Character = marshal.loads(data[_PREFIX.size:])
+            if isinstance(Character, dict):
+                return Character
+    except (EOFError, IndexError, KeyError, TypeError, ValueError, struct.error) as error:
+        raise ValueError(f"Encoded character is truncated or corrupt: {error!r}") from None
+    raise ValueError(f"Encoded character has unknown layout {layout}")
+
+def compare_formats(characters, repeats=5):
+    """
+    Time encode() and decode() against json and pickle on a roster.
+
+    Each pass runs every format once, in turn, and the median pass of each is
+    kept, so all three see the same machine load.
+
+    Args:
+        characters (list): Character dictionaries.
+        repeats (int): Passes over the roster.
+
+    Returns:
+        dict: 'Characters', 'EncodeSeconds', 'DecodeSeconds' and the same
+              timings for 'Json' and 'Pickle' (e.g. 'JsonEncodeSeconds') per
+              character, 'Bytes', 'JsonBytes' and 'PickleBytes' per character,
+              and 'RoundTrip' (whether every character decoded equal to itself).
+    """
+    formats = [('', encode, decode), ('Json', json.dumps, json.loads), ('Pickle', pickle.dumps, pickle.loads)]
+    timings = {f'{name}{stage}Seconds': [] for name, dump, load in formats for stage in ('Encode', 'Decode')}
+    payloads = {}
+    for repeat in range(repeats):
+        for name, dump, load in formats:
+            start = time.perf_counter()
+            payloads[name] = [dump(Character) for Character in characters]
+            timings[f'{name}EncodeSeconds'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for payload in payloads[name]:
+                load(payload)
+            timings[f'{name}DecodeSeconds'].append(time.perf_counter() - start)
+    count = max(len(characters), 1)
+    timings = {key: float(np.median(times)) / count for key, times in timings.items()}
+    sizes = {f'{name}Bytes': sum(len(payload) for payload in payloads[name]) / count for name in payloads}
+    return dict({'Characters': len(characters)}, **timings, **sizes,
+                RoundTrip=all(decode(payload) == Character for payload, Character in zip(payloads[''], characters)))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the binary character codec with JSON and pickle")
+    parser.add_argument('--characters', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    roster = [character.generate_character() for index in range(args.characters)]
+    summary = compare_formats(roster, args.repeats)
+    print(f"{summary['Characters']} characters, round trip {'ok' if summary['RoundTrip'] else 'FAILED'}")
+    for name, label in [('', 'codec'), ('Json', 'JSON'), ('Pickle', 'pickle')]:
+        print(f"{label}: encode {summary[f'{name}EncodeSeconds'] * 1e6:.1f} us, "
+              f"decode {summary[f'{name}DecodeSeconds'] * 1e6:.1f} us, {summary[f'{name}Bytes']:.0f} bytes")
@@ -0,0 +1,85 @@
+"""
+Super Squadron Combat Module
+
+This module provides a vectorized battle kernel for comparing characters.
+
+The kernel resolves a straight fight between two characters: each side deals
+its DirectDamage (minimum 1) per round until the other side's HitPoints are
+exhausted. The side that needs fewer rounds wins. When both need the same
+number of rounds the higher ActionPotential strikes first, then the higher
+Agility. Anything still level is a draw.
+
+The kernel is deterministic, so results from a sweep can be split across
+processes and resumed without changing the outcome.
+"""
+
+import numpy as np
+
+from super_squadron.roster import ROSTER_COLUMNS
+
+__all__ = [
+    'WIN',
+    'DRAW',
+    'LOSS',
+    'battle_block',
+    'battle'
+]
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+_HP = ROSTER_COLUMNS.index('HitPoints')
+_DD = ROSTER_COLUMNS.index('DirectDamage')
+_AP = ROSTER_COLUMNS.index('ActionPotential')
+_AG = ROSTER_COLUMNS.index('Agility')
+
+
+def battle_block(stacked, rows, cols):
+    """
+    Resolve every pairing between two groups of characters.
+
+    Args:
+        stacked (numpy.ndarray): Roster array from roster.stack_columns().
+        rows (numpy.ndarray or slice): Character indices for the first side.
+        cols (numpy.ndarray or slice): Character indices for the second side.
+
+    Returns:
+        numpy.ndarray: int8 matrix of shape (len(rows), len(cols)) holding WIN,
+        DRAW or LOSS from the point of view of the row character.
+    """
+    hp = np.maximum(stacked[_HP], 1).astype(np.int64)
+    dd = np.maximum(stacked[_DD], 1).astype(np.int64)
+
+    row_hp = hp[rows][:, None]
+    row_dd = dd[rows][:, None]
+    col_hp = hp[cols][None, :]
+    col_dd = dd[cols][None, :]
+
+    # Rounds each side needs to bring the other to zero HitPoints
+    row_rounds = -(-col_hp // row_dd)
+    col_rounds = -(-row_hp // col_dd)
+
+    result = np.sign(col_rounds - row_rounds).astype(np.int8)
+    level = result == DRAW
+    if level.any():
+        initiative = np.sign(stacked[_AP][rows][:, None] - stacked[_AP][cols][None, :])
+        agility = np.sign(stacked[_AG][rows][:, None] - stacked[_AG][cols][None, :])
+        tiebreak = np.where(initiative != 0, initiative, agility).astype(np.int8)
+        result[level] = tiebreak[level]
+    return result
+
+def battle(columns, first, second):
+    """
+    Resolve a single fight between two characters in a columnar roster.
+
+    Args:
+        columns (dict): Columnar roster from roster.to_columns().
+        first (int): Index of the first character.
+        second (int): Index of the second character.
+
+    Returns:
+        int: WIN, DRAW or LOSS for the first character.
+    """
+    stacked = np.stack([columns[name] for name in ROSTER_COLUMNS])
+    return int(battle_block(stacked, np.array([first]), np.array([second]))[0, 0])
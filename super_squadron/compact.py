@@ -0,0 +1,299 @@
+"""
+Super Squadron Compact Module
+
+This module stores large in-memory rosters compactly and decodes characters
+back to Character dictionaries only when they are serialized or read.
+
+A CompactRoster keeps:
+
+- numeric fields (statistics, derived values, Age, Height, Weight, Pay and
+  PatrolDM) in numpy columns
+- categorical fields (Origin, Lifespan, Artifact, Sex, Job and OtherSkill) as
+  small integer codes into a Vocabulary per field
+- everything else (statistic effects and powers) as a marshalled tuple, with
+  every string replaced by a code into one shared Vocabulary and each dictionary's
+  keys replaced by a code into a table of shapes
+
+Strings are interned as they enter a Vocabulary, so decoded characters share
+one copy of "NotApplicable", "Instantaneous", "Strength of two men" and so on.
+"""
+
+import json
+import marshal
+import sys
+
+import numpy as np
+
+__all__ = [
+    'NUMERIC_FIELDS',
+    'CATEGORICAL_FIELDS',
+    'Vocabulary',
+    'CompactRoster'
+]
+
+# Column name to (path in the Character dictionary, numpy dtype)
+NUMERIC_FIELDS = {
+    'Strength': (('Statistics', 'Strength'), np.int32),
+    'Agility': (('Statistics', 'Agility'), np.int32),
+    'Charisma': (('Statistics', 'Charisma'), np.int32),
+    'Intelligence': (('Statistics', 'Intelligence'), np.int32),
+    'Stamina': (('Statistics', 'Stamina'), np.int32),
+    'PublicStanding': (('Statistics', 'PublicStanding'), np.int32),
+    'Ego': (('Statistics', 'Ego'), np.int32),
+    'Luck': (('Statistics', 'Luck'), np.int32),
+    'Age': (('Origin', 'Age'), np.int32),
+    'HitPoints': (('HitPoints',), np.int32),
+    'ActionPotential': (('ActionPotential',), np.int32),
+    'DirectDamage': (('DirectDamage',), np.int32),
+    'Height': (('Height',), np.float64),
+    'Weight': (('Weight',), np.int32),
+    'Pay': (('Pay',), np.int32),
+    'PatrolDM': (('PatrolDM',), np.int32)
+}
+
+# Column name to (path in the Character dictionary, code dtype)
+CATEGORICAL_FIELDS = {
+    'Origin': (('Origin', 'Origin'), np.uint8),
+    'Lifespan': (('Origin', 'Lifespan'), np.uint16),
+    'Artifact': (('Origin', 'Artifact'), np.uint8),
+    'Sex': (('Sex',), np.uint8),
+    'Job': (('Job',), np.uint16),
+    'OtherSkill': (('OtherSkill',), np.uint16)
+}
+
+# Value kinds in a shape
+_COLUMN = 'c'
+_DICT = 'd'
+_LIST = 'l'
+_STRING = 's'
+_VALUE = 'v'
+
+
+class Vocabulary:
+    """
+    A two-way table between values and small integer codes.
+
+    Attributes:
+        values (list): Value of each code, with strings interned.
+    """
+
+    def __init__(self, values=()):
+        self.values = []
+        self._codes = {}
+        for value in values:
+            self.code(value)
+
+    def __repr__(self):
+        return f'Vocabulary({len(self.values)} values)'
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value):
+        """
+        Get the code of a value, adding it if it is new.
+
+        Args:
+            value: A hashable value, usually a string.
+
+        Returns:
+            int: The code.
+        """
+        code = self._codes.get(value)
+        if code is None:
+            if type(value) is str:
+                value = sys.intern(value)
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def value(self, code):
+        """Value of a code."""
+        return self.values[code]
+
+
+class CompactRoster:
+    """
+    A growable roster of characters in compact form.
+
+    Attributes:
+        strings (Vocabulary): Strings in statistic effects and powers.
+        shapes (Vocabulary): Dictionary key and value-kind layouts.
+        categories (dict): Categorical field name to its Vocabulary.
+    """
+
+    def __init__(self, characters=(), capacity=1024):
+        self._size = 0
+        self._capacity = max(int(capacity), 1)
+        self._columns = {name: np.zeros(self._capacity, dtype=dtype) for name, (path, dtype) in NUMERIC_FIELDS.items()}
+        self._columns.update({name: np.zeros(self._capacity, dtype=dtype)
+                              for name, (path, dtype) in CATEGORICAL_FIELDS.items()})
+        self._fields = {path: name for name, (path, dtype) in NUMERIC_FIELDS.items()}
+        self._fields.update({path: name for name, (path, dtype) in CATEGORICAL_FIELDS.items()})
+        self._records = []
+        self.strings = Vocabulary()
+        self.shapes = Vocabulary()
+        self.categories = {name: Vocabulary() for name in CATEGORICAL_FIELDS}
+        self.extend(characters)
+
+    def __repr__(self):
+        return f'CompactRoster({self._size} characters, {len(self.strings)} strings, {len(self.shapes)} shapes)'
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(f"Character {index} is outside a roster of {self._size}")
+        return self._decode(marshal.loads(self._records[index]), (), index)
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    def _grow(self):
+        """Double the column capacity."""
+        self._capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(self._capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _store(self, name, value, index):
+        """Store a field value in its column, returning False if it does not fit the column."""
+        column = self._columns[name]
+        if name in CATEGORICAL_FIELDS:
+            if type(value) not in (str, int):
+                return False
+            code = self.categories[name].code(value)
+            if code > np.iinfo(column.dtype).max:
+                return False
+            column[index] = code
+            return True
+        if column.dtype.kind == 'f':
+            if type(value) is not float:
+                return False
+        elif type(value) is not int or not -2 ** 31 <= value < 2 ** 31:
+            return False
+        column[index] = value
+        return True
+
+    def _encode(self, value, path, index):
+        """Encode a dictionary or list as a tuple of its shape code and values."""
+        if isinstance(value, dict):
+            keys = value.items()
+        else:
+            keys = enumerate(value)
+        shape = []
+        values = []
+        for key, item in keys:
+            item_path = path + (key,)
+            if item_path in self._fields and self._store(self._fields[item_path], item, index):
+                kind = _COLUMN
+            elif isinstance(item, (dict, list)):
+                kind = _DICT if isinstance(item, dict) else _LIST
+                values.append(self._encode(item, item_path, index))
+            elif type(item) is str:
+                kind = _STRING
+                values.append(self.strings.code(item))
+            else:
+                kind = _VALUE
+                values.append(item.item() if isinstance(item, np.generic) else item)
+            shape.append((key, kind) if isinstance(value, dict) else kind)
+        prefix = () if isinstance(value, dict) else (_LIST,)
+        return (self.shapes.code(prefix + tuple(shape)),) + tuple(values)
+
+    def _decode(self, encoded, path, index):
+        """Rebuild a dictionary or list from _encode() output."""
+        shape = self.shapes.values[encoded[0]]
+        values = iter(encoded[1:])
+        is_list = shape[:1] == (_LIST,)
+        entries = enumerate(shape[1:]) if is_list else shape
+        result = [] if is_list else {}
+        for key, kind in entries:
+            if kind == _COLUMN:
+                name = self._fields[path + (key,)]
+                if name in CATEGORICAL_FIELDS:
+                    item = self.categories[name].values[self._columns[name][index]]
+                else:
+                    item = self._columns[name][index].item()
+            elif kind == _STRING:
+                item = self.strings.values[next(values)]
+            elif kind == _VALUE:
+                item = next(values)
+            else:
+                item = self._decode(next(values), path + (key,), index)
+            if is_list:
+                result.append(item)
+            else:
+                result[key] = item
+        return result
+
+    def append(self, Character):
+        """
+        Add a character.
+
+        Args:
+            Character (dict): Character dictionary. Values must be dictionaries,
+                              lists, strings, numbers, booleans or None.
+
+        Returns:
+            int: Index of the character.
+        """
+        if self._size == self._capacity:
+            self._grow()
+        index = self._size
+        self._records.append(marshal.dumps(self._encode(Character, (), index)))
+        self._size += 1
+        return index
+
+    def extend(self, characters):
+        """Add several characters."""
+        for Character in characters:
+            self.append(Character)
+
+    def column(self, name):
+        """
+        Get a numeric column, or the codes of a categorical one.
+
+        Args:
+            name (str): Field name from NUMERIC_FIELDS or CATEGORICAL_FIELDS.
+
+        Returns:
+            numpy.ndarray: One value per character. Characters without the field hold 0.
+        """
+        return self._columns[name][:self._size]
+
+    def decode_column(self, name):
+        """
+        Get a categorical column's values.
+
+        Args:
+            name (str): Field name from CATEGORICAL_FIELDS.
+
+        Returns:
+            list: One value per character.
+        """
+        values = self.categories[name].values
+        return [values[code] for code in self.column(name).tolist()]
+
+    def nbytes(self):
+        """Approximate memory used by the columns and records, in bytes."""
+        return (sum(column.nbytes for column in self._columns.values())
+                + sum(sys.getsizeof(record) for record in self._records) + sys.getsizeof(self._records))
+
+    def dump(self, f):
+        """
+        Write the roster as a JSON list, decoding one character at a time.
+
+        Args:
+            f: Text file object.
+        """
+        f.write('[')
+        for index in range(self._size):
+            if index:
+                f.write(', ')
+            json.dump(self[index], f)
+        f.write(']')
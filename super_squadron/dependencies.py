@@ -0,0 +1,303 @@
+"""
+Super Squadron Dependencies Module
+
+This module keeps a dependency graph from each statistic to the fields that
+are calculated from it, so a statistic change (Enhanced Strength, an injury, an
+Ego shift) only recalculates the affected values.
+
+Three kinds of field depend on statistics:
+
+- '<Statistic>_Effects', looked up in data/characteristics.csv
+- HitPoints, ActionPotential and DirectDamage, which are sums of per-statistic terms
+- Power detail fields such as Force Beam's Range or Gimmick's InventNew
+
+Derived values are updated by the change in the terms of the statistics that
+changed, so the rolled 1d10 in HitPoints and any damage already taken are kept,
+and power fields with a die in their formula, such as Emotion Control's
+Duration, reuse the roll kept in the power detail.
+"""
+
+from super_squadron import powers
+from super_squadron.character import roll_statistic_effect
+from super_squadron.powers import normal_round
+
+__all__ = [
+    'DERIVED_TERMS',
+    'POWER_FIELDS',
+    'DEPENDENTS',
+    'PowerField',
+    'affected',
+    'update_statistics',
+    'refresh_powers'
+]
+
+
+def _half(stat):
+    """Term for a statistic halved with normal_round."""
+    return lambda Character: int(normal_round(float(Character['Statistics'][stat]) / 2))
+
+def _value(stat):
+    """Term for a statistic added as it is."""
+    return lambda Character: int(Character['Statistics'][stat])
+
+def _effect(stat, effect):
+    """Term for a statistic effect such as Strength_Effects HT."""
+    return lambda Character: int(Character[stat + '_Effects'][effect])
+
+# Derived value to the term each statistic contributes, as in character.derive_statistics()
+DERIVED_TERMS = {
+    'HitPoints': {
+        'Stamina': _half('Stamina'),
+        'Luck': _value('Luck'),
+        'Strength': _effect('Strength', 'HT'),
+        'Agility': _effect('Agility', 'HT'),
+        'Intelligence': _effect('Intelligence', 'HT')
+    },
+    'ActionPotential': {
+        'Strength': _value('Strength'),
+        'Intelligence': _half('Intelligence'),
+        'Stamina': _value('Stamina'),
+        'Agility': _half('Agility'),
+        'Ego': _half('Ego'),
+        'Luck': _value('Luck')
+    },
+    'DirectDamage': {
+        'Strength': _effect('Strength', 'DD'),
+        'Agility': _effect('Agility', 'DD'),
+        'Intelligence': _effect('Intelligence', 'DD')
+    }
+}
+
+
+class PowerField:
+    """
+    A power detail field calculated from statistics.
+
+    Attributes:
+        power (str): Key in Character['Powers']['Detail'].
+        path (tuple): Keys below the power detail, e.g. ('Stretching', 'Other').
+        statistics (tuple): Statistics the formula reads.
+        formula (callable): Takes the Statistics dictionary and returns the value,
+                            or also takes the kept roll if rolled is set.
+        applies (callable): Takes the power detail and returns whether this field
+                            exists for the variant rolled, or None if it always does.
+        rolled (str): Key in the power detail of a dice roll the formula keeps, or None.
+    """
+
+    def __init__(self, power, path, statistics, formula, applies=None, rolled=None):
+        self.power = power
+        self.path = tuple(path)
+        self.statistics = tuple(statistics)
+        self.formula = formula
+        self.applies = applies
+        self.rolled = rolled
+
+    def __repr__(self):
+        return f"PowerField({self.power}, {'/'.join(self.path)})"
+
+    def update(self, Character):
+        """
+        Recalculate the field if the character has it.
+
+        Args:
+            Character (dict): Character dictionary.
+
+        Returns:
+            bool: True if the field was recalculated.
+        """
+        detail = Character.get('Powers', {}).get('Detail', {}).get(self.power)
+        if not isinstance(detail, dict):
+            return False
+        if self.applies is not None and not self.applies(detail):
+            return False
+        target = detail
+        for key in self.path[:-1]:
+            target = target.get(key)
+            if not isinstance(target, dict):
+                return False
+        if self.path[-1] not in target:
+            return False
+        if self.rolled is None:
+            target[self.path[-1]] = self.formula(Character['Statistics'])
+        elif self.rolled in detail:
+            target[self.path[-1]] = self.formula(Character['Statistics'], detail[self.rolled])
+        else:
+            return False
+        return True
+
+
+def _augmentation_fields(power, ranges):
+    """Heightened Senses augmentation ranges, one field per augmentation slot."""
+    fields = []
+    for slot in range(1, 13):
+        for augmentation, (statistics, formula) in ranges.items():
+            applies = (lambda key, name: lambda detail: detail.get('Augmentations', {}).get('Type', {}).get(key) == name)(
+                str(slot), augmentation)
+            fields.append(PowerField(power, ('Augmentations', 'Range', str(slot)), statistics, formula, applies))
+    return fields
+
+def _cell_field(power, column):
+    """A field the power class rolls from its power_details.csv statistic formula, read from the same cell."""
+    return PowerField(power, (column,), powers.power_cells[power][column].statistics,
+                      lambda s: powers.power_cells[power][column].evaluate(s))
+
+def _force_beam(beam):
+    """Match a Force Beam beam type, each of which has its own range formula."""
+    return lambda detail: detail.get('StrDetails') == 'Force beam: ' + beam
+
+def _inherent_power(area_effect):
+    """Match an Inherent Power ranged variant (Eye Beams or Spiked Missiles) by its area effect."""
+    return lambda detail: detail.get('AreaEffect') == area_effect and detail.get('DamageAP') == '1d4'
+
+def _not_device(detail):
+    """Device versions of some powers roll the field instead."""
+    return 'Device' not in detail
+
+# Power detail fields calculated from statistics in powers.py, read from the
+# power_details.csv cell wherever the class rolls one
+POWER_FIELDS = [
+    _cell_field('Air Generation', 'Range'),
+    PowerField('Air Generation', ('Blast', 'Range'), ('Stamina', 'Agility'),
+               lambda s: (s['Stamina'] + s['Agility']) * 2),
+    PowerField('Air Generation', ('Storm', 'AreaEffect'), ('Stamina',),
+               lambda s: normal_round(s['Stamina'] / 5)),
+    _cell_field('Animal Affinity', 'Range'),
+    _cell_field('Astral Projection', 'Duration'),
+    PowerField('Astral Projection', ('Speed',), ('Stamina', 'Agility'), lambda s: s['Stamina'] + s['Agility']),
+    _cell_field('Darkness Generation', 'Range'),
+    PowerField('Death Touch', ('Range',), ('Intelligence',), lambda s: s['Intelligence']),
+    _cell_field('Disintegration Beam', 'Range'),
+    PowerField('Elasticity', ('Stretching', 'Limbs-Torso'), ('Agility', 'Stamina'),
+               lambda s: s['Agility'] * s['Stamina']),
+    PowerField('Elasticity', ('Stretching', 'Other'), ('Agility',), lambda s: s['Agility'] * 3),
+    _cell_field('Emotion Control', 'Range'),
+    PowerField('Emotion Control', ('Duration',), ('Ego',), lambda s, roll: max(25 - roll * s['Ego'], 1),
+               rolled='DurationRoll'),
+    # Energy Absorption's second ability is stored under its own 'B' key
+    PowerField('B', ('Range',), ('Intelligence',), lambda s: s['Intelligence']),
+    PowerField('B', ('StoreMax',), ('Strength', 'Stamina'), lambda s: s['Strength'] + s['Stamina'], _not_device),
+    PowerField('Environment Control', ('AreaEffect',), ('Stamina',), lambda s: s['Stamina'] * s['Stamina']),
+    _cell_field('Environment Control', 'Range'),
+    PowerField('Flame Generation', ('Range',), ('Strength', 'Agility'), lambda s: (s['Strength'] + s['Agility']) * 2),
+    PowerField('Flight', ('Speed',), ('Agility', 'Stamina'),
+               lambda s: (s['Agility'] + s['Stamina'] + s['Stamina']) * 3, _not_device),
+    PowerField('Force Beam', ('Range',), ('Agility', 'Strength'),
+               lambda s: (s['Agility'] + s['Strength']) * 10, _force_beam('Laser')),
+    PowerField('Force Beam', ('Range',), ('Agility', 'Strength'),
+               lambda s: (s['Agility'] + s['Strength']) * 5, _force_beam('Plasma')),
+    PowerField('Force Beam', ('Range',), ('Stamina', 'Strength'),
+               lambda s: (s['Stamina'] + s['Strength']) * 8, _force_beam('Magna')),
+    PowerField('Force Beam', ('Range',), ('Agility', 'Strength'),
+               lambda s: (s['Agility'] + s['Strength']) * 15, _force_beam('Matter')),
+    _cell_field('Force Field', 'Range'),
+    PowerField('Gimmick', ('InventNew',), ('Intelligence',), lambda s: s['Intelligence'] * 2),
+    PowerField('Gravity Control', ('AreaEffect',), ('Stamina',), lambda s: s['Stamina'] * s['Stamina']),
+    _cell_field('Gravity Control', 'Range'),
+    _cell_field('Heightened Senses', 'Range'),
+    PowerField('Heightened Speed', ('Speed',), ('Agility', 'Stamina'),
+               lambda s: (s['Agility'] + s['Stamina'] + s['Stamina']) * 3),
+    _cell_field('Ice Generation', 'Range'),
+    PowerField('Inherent Power', ('Range',), ('Agility', 'Strength'),
+               lambda s: s['Agility'] + s['Strength'], _inherent_power('Character')),
+    PowerField('Inherent Power', ('Range',), ('Strength',),
+               lambda s: normal_round(s['Strength'] / 3), _inherent_power('3 targets'))
+] + _augmentation_fields('Heightened Senses', {
+    'Amplified Hearing': (('Stamina',), lambda s: s['Stamina'] + 2),
+    'Super Hearing': (('Stamina', 'Intelligence'), lambda s: (s['Stamina'] + s['Intelligence'] + 2) * 10),
+    'Ultrasonic Hearing': (('Stamina',), lambda s: s['Stamina'] + 2),
+    'Sensitive Touch': (('Stamina',), lambda s: s['Stamina'] + 2),
+    'Telescopic Vision': (('Stamina', 'Intelligence'), lambda s: (s['Stamina'] + s['Intelligence']) * 10),
+    'X-Ray Vision': (('Stamina',), lambda s: s['Stamina'] / 5),
+    'Vibratory Vision': (('Stamina',), lambda s: normal_round(s['Stamina'] / 5))
+})
+
+
+def _build_dependents():
+    """Map each statistic to the derived values and power fields that read it."""
+    dependents = {}
+    for name, terms in DERIVED_TERMS.items():
+        for stat in terms:
+            dependents.setdefault(stat, {'Derived': [], 'Powers': {}})['Derived'].append(name)
+    for field in POWER_FIELDS:
+        for stat in field.statistics:
+            powers = dependents.setdefault(stat, {'Derived': [], 'Powers': {}})['Powers']
+            powers.setdefault(field.power, []).append(field)
+    return dependents
+
+# Statistic to {'Derived': [derived value names], 'Powers': {power: [PowerField, ...]}}
+DEPENDENTS = _build_dependents()
+
+
+def affected(statistics, powers=None):
+    """
+    Get the fields that depend on a set of statistics.
+
+    Args:
+        statistics (iterable): Statistic names, e.g. ['Strength'].
+        powers (iterable): Only include power fields for these power detail keys,
+                           e.g. a character's Character['Powers']['Detail']. All if None.
+
+    Returns:
+        dict: 'Effects' (effect entry names), 'Derived' (derived value names) and
+              'Powers' (PowerField objects), without duplicates.
+    """
+    effects = []
+    derived = []
+    fields = []
+    for stat in statistics:
+        effects.append(stat + '_Effects')
+        entry = DEPENDENTS.get(stat, {'Derived': [], 'Powers': {}})
+        derived.extend(name for name in entry['Derived'] if name not in derived)
+        for power in (entry['Powers'] if powers is None else powers):
+            fields.extend(field for field in entry['Powers'].get(power, []) if field not in fields)
+    return {'Effects': effects, 'Derived': derived, 'Powers': fields}
+
+def update_statistics(Character, changes):
+    """
+    Change statistics and recalculate only the fields that depend on them.
+
+    Statistic effects are looked up again (rolling any dice cells) for the changed
+    statistics only. Derived values change by the difference in the changed
+    statistics' terms, and affected power fields are recalculated.
+
+    Args:
+        Character (dict): Character dictionary, updated in place.
+        changes (dict): Statistic name to new value, e.g. {'Strength': 25}.
+
+    Returns:
+        list: Names of the updated fields, e.g. ['Strength_Effects', 'HitPoints',
+              'Force Beam/Range'].
+    """
+    changed = [stat for stat, value in changes.items() if Character['Statistics'].get(stat) != value]
+    if not changed:
+        return []
+    fields = affected(changed, Character.get('Powers', {}).get('Detail', {}))
+
+    old_terms = {name: sum(DERIVED_TERMS[name][stat](Character) for stat in changed if stat in DERIVED_TERMS[name])
+                 for name in fields['Derived']}
+    for stat in changed:
+        Character['Statistics'][stat] = changes[stat]
+        roll_statistic_effect(Character, stat)
+    updated = list(fields['Effects'])
+
+    for name in fields['Derived']:
+        new_terms = sum(DERIVED_TERMS[name][stat](Character) for stat in changed if stat in DERIVED_TERMS[name])
+        Character[name] = Character[name] + new_terms - old_terms[name]
+        updated.append(name)
+
+    for field in fields['Powers']:
+        if field.update(Character):
+            updated.append(field.power + '/' + '/'.join(field.path))
+    return updated
+
+def refresh_powers(Character):
+    """
+    Recalculate every statistic-dependent power field from the current statistics.
+
+    Args:
+        Character (dict): Character dictionary, updated in place.
+
+    Returns:
+        list: Names of the updated fields.
+    """
+    return [field.power + '/' + '/'.join(field.path) for field in POWER_FIELDS if field.update(Character)]
@@ -0,0 +1,389 @@
+"""
+Super Squadron Dice Log Module
+
+This module records every dice draw to a compact binary ring buffer and replays
+recorded draws exactly, so a reported character can be regenerated offline.
+
+The recorder keeps only the 32-bit dice total of each draw, which is cheap
+enough to leave on in production. Replaying a log runs the same code again, so
+the replayer fills in the call site (the file, line and function that called the
+roll function) and the formula such as "1d8" or "2d4x4" of each draw. Recording
+is opt-in through the dice hook in the roll module:
+
+    recorder = DiceRecorder()
+    with recording(recorder):
+        start = recorder.position
+        Character = generate_character()
+    recorder.log(start).save('character.dice')
+
+    with replaying(DiceLog.load('character.dice')) as replayer:
+        same = generate_character()
+    print(replayer.annotated().entries())
+"""
+
+import array
+import contextlib
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from super_squadron import character, roll
+from super_squadron.roll import _draw, _draw_batch
+
+__all__ = [
+    'ReplayError',
+    'DiceLog',
+    'DiceRecorder',
+    'DiceReplayer',
+    'recording',
+    'replaying',
+    'benchmark'
+]
+
+MAGIC = b'SSDICE'
+VERSION = 1
+_HEADER = struct.Struct('<6sHQI')
+# Totals a recorder collects before moving them into its ring buffer
+_PENDING = 4096
+# numpy's global random state draw that roll._draw() makes for a single die
+_randint = np.random.randint
+
+
+class ReplayError(RuntimeError):
+    """Raised when a replayed draw does not match the log."""
+
+
+def _site(code, line, number, sides, label):
+    """Readable call site and formula for a draw."""
+    name = getattr(code, 'co_qualname', code.co_name)
+    site = f'{os.path.basename(code.co_filename)}:{line} {name}'
+    return site, label if label is not None else f'{number}d{sides}'
+
+
+class DiceLog:
+    """
+    A sequence of recorded draws.
+
+    Attributes:
+        sites (list): (call site, formula) pairs that keys refer to. Empty for
+                      a log from a DiceRecorder, which records only totals.
+        keys (array.array): Site index of each draw, empty when sites is.
+        results (array.array): Dice total of each draw.
+    """
+
+    def __init__(self, sites, keys, results):
+        self.sites = list(sites)
+        self.keys = array.array('I', keys)
+        self.results = array.array('i', results)
+
+    def __repr__(self):
+        return f'DiceLog({len(self)} draws, {len(self.sites)} sites)'
+
+    def __len__(self):
+        return len(self.results)
+
+    def entries(self):
+        """
+        Get the draws in order.
+
+        Returns:
+            list: (call site, formula, result) tuples, with None for the call
+                  site and formula if the log has no sites.
+        """
+        if not self.sites:
+            return [(None, None, result) for result in self.results]
+        return [self.sites[key] + (result,) for key, result in zip(self.keys, self.results)]
+
+    def save(self, path):
+        """
+        Write the log to a binary file.
+
+        Args:
+            path (str): File path.
+        """
+        sites = json.dumps(self.sites).encode()
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self), len(sites)))
+            f.write(sites)
+            f.write(self.keys.tobytes())
+            f.write(self.results.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a log written by save().
+
+        Args:
+            path (str): File path.
+
+        Returns:
+            DiceLog: The recorded draws.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, count, sites_size = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} dice log")
+        offset = _HEADER.size
+        sites = [tuple(site) for site in json.loads(data[offset:offset + sites_size])]
+        offset += sites_size
+        keys = array.array('I')
+        if sites:
+            keys.frombytes(data[offset:offset + 4 * count])
+            offset += 4 * count
+        results = array.array('i')
+        results.frombytes(data[offset:offset + 4 * count])
+        return cls(sites, keys, results)
+
+
+class DiceRecorder:
+    """
+    Dice hook that draws from numpy as usual and records each total in a ring buffer.
+
+    Once capacity draws have been recorded the oldest are overwritten. Only
+    totals are recorded; call sites and formulas come from replaying the log.
+
+    Attributes:
+        capacity (int): Draws kept, rounded up to a power of two.
+    """
+
+    # Looking up the caller's frame would cost about as much as the draw
+    frames = False
+
+    def __init__(self, capacity=1 << 20):
+        self.capacity = 1 << max(int(capacity) - 1, 1).bit_length()
+        self._mask = self.capacity - 1
+        self._entries = np.zeros(self.capacity, dtype=np.int32)
+        self._position = 0
+        # Totals not yet in the ring buffer, which an array append takes less
+        # time to collect than a write into the ring buffer per draw
+        self._totals = array.array('q')
+        self._append_total = self._totals.append
+
+    def __repr__(self):
+        return f'DiceRecorder({min(self.position, self.capacity)} of {self.capacity} draws)'
+
+    @property
+    def position(self):
+        """Number of draws recorded so far, used as a start for log()."""
+        return self._position + len(self._totals)
+
+    def _write(self, entries):
+        """Copy an array of totals into the ring buffer in at most two slices."""
+        count = len(entries)
+        if count > self.capacity:
+            self._position += count - self.capacity
+            entries, count = entries[-self.capacity:], self.capacity
+        start = self._position & self._mask
+        first = min(count, self.capacity - start)
+        self._entries[start:start + first] = entries[:first]
+        self._entries[:count - first] = entries[first:]
+        self._position += count
+
+    def _flush(self):
+        """Move pending totals into the ring buffer."""
+        if not self._totals:
+            return
+        totals = np.frombuffer(self._totals, dtype=np.int64)
+        entries = totals.astype(np.int32)
+        # The totals buffer cannot shrink while an array views it
+        del totals
+        del self._totals[:]
+        self._write(entries)
+
+    def roll(self, number, sides, label, frame):
+        """Draw dice from numpy and record the total."""
+        # Most draws are one die from numpy's global random state, drawn here
+        # as roll._draw() would to save a call
+        if number == 1 and roll._generator is None:
+            total = _randint(1, sides + 1)
+        else:
+            total = _draw(number, sides)
+        self._append_total(total)
+        if len(self._totals) >= _PENDING:
+            self._flush()
+        return total
+
+    def roll_batch(self, number, sides, size, label, frame):
+        """Draw an array of dice totals from numpy and record them."""
+        totals = _draw_batch(number, sides, size)
+        if size < _PENDING:
+            # Small batches join the pending totals
+            self._totals.frombytes(np.asarray(totals, dtype=np.int64).tobytes())
+            if len(self._totals) >= _PENDING:
+                self._flush()
+            return totals
+        self._flush()
+        self._write(totals)
+        return totals
+
+    def log(self, start=0):
+        """
+        Get the draws recorded from a position onwards.
+
+        Args:
+            start (int): Position from an earlier read of the position property.
+
+        Returns:
+            DiceLog: Draws from start to now, without sites.
+        """
+        self._flush()
+        end = self.position
+        if start < end - self.capacity:
+            raise ValueError(f"Draws from {start} have been overwritten. "
+                             f"The oldest kept draw is {end - self.capacity}")
+        return DiceLog([], [], self._entries[np.arange(start, end) & self._mask].tobytes())
+
+
+class DiceReplayer:
+    """
+    Dice hook that returns recorded draws instead of drawing from numpy.
+
+    Draws are matched in order. If the log has sites each draw must use the
+    formula that was recorded, and otherwise each total must be one the
+    formula can roll.
+
+    Attributes:
+        log (DiceLog): Draws to replay.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self._next = 0
+        self._site_keys = {}
+        self._sites = []
+        self._keys = array.array('I')
+
+    def __repr__(self):
+        return f'DiceReplayer({self._next} of {len(self.log)} draws replayed)'
+
+    @property
+    def remaining(self):
+        """Number of draws not replayed yet."""
+        return len(self.log) - self._next
+
+    def _take(self, number, sides, label, frame):
+        """Next recorded total, checked against the draw being made."""
+        site, formula = _site(frame.f_code, frame.f_lineno, number, sides, label)
+        if self._next >= len(self.log):
+            raise ReplayError(f"Dice log exhausted after {len(self.log)} draws at {site}")
+        total = self.log.results[self._next]
+        if self.log.sites:
+            recorded_site, recorded_formula = self.log.sites[self.log.keys[self._next]]
+            if recorded_formula != formula:
+                raise ReplayError(f"Draw {self._next} was {recorded_formula} at {recorded_site} "
+                                  f"when recorded but is {formula} at {site} now")
+        elif not number <= total <= number * sides:
+            raise ReplayError(f"Draw {self._next} was {total} when recorded, "
+                              f"which {formula} at {site} cannot roll")
+        key = self._site_keys.get((site, formula))
+        if key is None:
+            key = self._site_keys[site, formula] = len(self._sites)
+            self._sites.append((site, formula))
+        self._keys.append(key)
+        self._next += 1
+        return total
+
+    def roll(self, number, sides, label, frame):
+        """Return the next recorded total."""
+        return self._take(number, sides, label, frame)
+
+    def roll_batch(self, number, sides, size, label, frame):
+        """Return the next size recorded totals as an array."""
+        return np.array([self._take(number, sides, label, frame) for draw in range(size)], dtype=np.int64)
+
+    def annotated(self):
+        """
+        Get the draws replayed so far with their call sites and formulas.
+
+        Returns:
+            DiceLog: Replayed draws, with sites.
+        """
+        return DiceLog(self._sites, self._keys, self.log.results[:self._next])
+
+
+@contextlib.contextmanager
+def recording(recorder=None):
+    """
+    Record every dice draw inside the with block.
+
+    Args:
+        recorder (DiceRecorder): Recorder to use, a new one if None.
+
+    Yields:
+        DiceRecorder: The recorder.
+    """
+    if recorder is None:
+        recorder = DiceRecorder()
+    previous = roll.set_dice_hook(recorder)
+    try:
+        yield recorder
+    finally:
+        roll.set_dice_hook(previous)
+
+@contextlib.contextmanager
+def replaying(log):
+    """
+    Replay recorded draws inside the with block.
+
+    Args:
+        log (DiceLog): Draws to replay.
+
+    Yields:
+        DiceReplayer: The replayer, whose remaining property shows unused draws.
+    """
+    replayer = DiceReplayer(log)
+    previous = roll.set_dice_hook(replayer)
+    try:
+        yield replayer
+    finally:
+        roll.set_dice_hook(previous)
+
+def benchmark(characters=100, repeats=60):
+    """
+    Time generate_character() with and without a recorder.
+
+    Runs of each alternate from the same seed so both see the same machine
+    load, and the overhead is the median over repeats of recorded time over
+    plain time, which machine load moves less than either time.
+
+    Args:
+        characters (int): Characters generated per run.
+        repeats (int): Runs of each.
+
+    Returns:
+        dict: 'Characters' per run, 'Draws' per character, median
+              'PlainSeconds' and 'RecordedSeconds' per character and
+              'Overhead' (recorded time over plain time, minus one).
+    """
+    recorder = DiceRecorder()
+    plain, recorded = [], []
+    for repeat_number in range(repeats):
+        for times, hook in [(plain, None), (recorded, recorder)]:
+            previous = roll.set_dice_hook(hook)
+            np.random.seed(repeat_number)
+            start = time.process_time()
+            for index in range(characters):
+                character.generate_character()
+            times.append(time.process_time() - start)
+            roll.set_dice_hook(previous)
+    plain, recorded = np.array(plain), np.array(recorded)
+    return {'Characters': characters, 'Draws': recorder.position / (characters * repeats),
+            'PlainSeconds': np.median(plain) / characters, 'RecordedSeconds': np.median(recorded) / characters,
+            'Overhead': np.median(recorded / plain) - 1}
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure the cost of recording dice draws")
+    parser.add_argument('--characters', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=60)
+    args = parser.parse_args()
+
+    summary = benchmark(args.characters, args.repeats)
+    print(f"{summary['Characters']} characters per run, {summary['Draws']:.1f} draws each")
+    print(f"plain {summary['PlainSeconds'] * 1e6:.1f} us, recorded {summary['RecordedSeconds'] * 1e6:.1f} us "
+          f"per character, {summary['Overhead']:.1%} overhead")
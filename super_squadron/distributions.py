@@ -0,0 +1,240 @@
+"""
+Super Squadron Distributions Module
+
+This module computes exact distributions of the derived values HitPoints,
+ActionPotential and DirectDamage without generating characters.
+
+The derived values are sums of per-statistic contributions: halved statistics
+(using normal_round), Luck, a 1d10 for HitPoints, and the HT/DD cells of
+data/characteristics.csv, some of which are dice such as "1d10+7". Each
+statistic is therefore an independent factor with a small probability mass
+function over contribution vectors, and the distributions are built by
+convolving those factors on a numpy grid. The five main statistics also carry
+their running total so the result can be conditioned on the total being over
+60, as in roll.roll_main_statistics().
+"""
+
+import functools
+
+import numpy as np
+
+from super_squadron.powers import normal_round
+from super_squadron.tables import registry
+
+__all__ = [
+    'DERIVED',
+    'MAIN_STATISTICS',
+    'dice_distribution',
+    'joint_distribution',
+    'distribution',
+    'percentile_table',
+    'percentile_rank'
+]
+
+DERIVED = ['HitPoints', 'ActionPotential', 'DirectDamage']
+MAIN_STATISTICS = ['Strength', 'Agility', 'Charisma', 'Intelligence', 'Stamina']
+MAIN_STATISTICS_MINIMUM = 61
+
+_STATISTIC_VALUES = {value: 1.0 / 20 for value in range(1, 21)}
+
+
+def dice_distribution(formula):
+    """
+    Get the exact distribution of a dice formula.
+
+    Args:
+        formula (str or int): Formula in the roll_ap() formats "2d6", "1d6+3",
+                              "2d4x4", "2d4x4+3", or a plain number.
+
+    Returns:
+        dict: Value to probability.
+    """
+    formula_str = str(formula)
+    plus = 0
+    if '+' in formula_str and 'd' in formula_str:
+        formula_str, plus_str = formula_str.split('+')
+        plus = int(plus_str)
+    if 'd' not in formula_str:
+        return {int(formula_str) + plus: 1.0}
+    multiplier = 1
+    if 'x' in formula_str:
+        formula_str, multiplier_str = formula_str.split('x')
+        multiplier = int(multiplier_str)
+    number, sides = [int(part) for part in formula_str.split('d')]
+    totals = np.ones(1)
+    die = np.full(sides, 1.0 / sides)
+    for roll in range(number):
+        totals = np.convolve(totals, die)
+    # After number dice the lowest total is number
+    return {(index + number) * multiplier + plus: float(probability) for index, probability in enumerate(totals)}
+
+def _half(value):
+    """Halve a statistic with normal_round, as the derived values do."""
+    return int(normal_round(float(value) / 2))
+
+def _cell_distribution(column, value):
+    """Distribution of a characteristics.csv cell for a statistic value."""
+    return dice_distribution(characteristics_table[column].iloc[value])
+
+def _contribution(name, stat, value):
+    """Distribution of a statistic's contribution to a derived value, or None if it does not contribute."""
+    if name == 'HitPoints':
+        if stat == 'Stamina':
+            return {_half(value): 1.0}
+        if stat in ('Strength', 'Agility', 'Intelligence'):
+            return _cell_distribution(stat + '_HT', value)
+        if stat == 'Luck':
+            return {value: 1.0}
+    elif name == 'ActionPotential':
+        if stat in ('Strength', 'Stamina', 'Luck'):
+            return {value: 1.0}
+        if stat in ('Intelligence', 'Agility', 'Ego'):
+            return {_half(value): 1.0}
+    elif name == 'DirectDamage':
+        if stat in ('Strength', 'Agility', 'Intelligence'):
+            return _cell_distribution(stat + '_DD', value)
+    return None
+
+def _luck_values():
+    """Distribution of roll.roll_luck()."""
+    luck = {0: 0.90}
+    for value in range(1, 11):
+        luck[value] = 0.01
+    return luck
+
+def _factor(stat, values, names, main):
+    """Build a factor mapping contribution vectors to probabilities for one statistic."""
+    factor = {}
+    for value, probability in values.items():
+        partial = {((value,) if main else ()): probability}
+        for name in names:
+            contribution = _contribution(name, stat, value) or {0: 1.0}
+            expanded = {}
+            for vector, vector_probability in partial.items():
+                for amount, amount_probability in contribution.items():
+                    key = vector + (amount,)
+                    expanded[key] = expanded.get(key, 0.0) + vector_probability * amount_probability
+            partial = expanded
+        for vector, vector_probability in partial.items():
+            factor[vector] = factor.get(vector, 0.0) + vector_probability
+    return factor
+
+def _convolve(grid, offset, factor):
+    """Add an independent factor to a grid distribution whose index 0 sits at offset."""
+    vectors = np.array(list(factor.keys()), dtype=np.int64)
+    low = vectors.min(axis=0)
+    high = vectors.max(axis=0)
+    result = np.zeros(tuple(np.array(grid.shape) + high - low))
+    for vector, probability in zip(vectors, factor.values()):
+        start = vector - low
+        window = tuple(slice(begin, begin + size) for begin, size in zip(start, grid.shape))
+        result[window] += probability * grid
+    return result, offset + low
+
+@functools.lru_cache(maxsize=None)
+def _grid(names):
+    """Exact joint distribution grid and offsets for a tuple of derived value names."""
+    grid = np.ones((1,) * (len(names) + 1))
+    offset = np.zeros(len(names) + 1, dtype=np.int64)
+    for stat in MAIN_STATISTICS:
+        grid, offset = _convolve(grid, offset, _factor(stat, _STATISTIC_VALUES, names, True))
+
+    # Condition on the main statistics total, then drop the total axis
+    start = max(MAIN_STATISTICS_MINIMUM - offset[0], 0)
+    grid = grid[start:].sum(axis=0)
+    grid = grid / grid.sum()
+    offset = offset[1:]
+
+    grid, offset = _convolve(grid, offset, _factor('Ego', _STATISTIC_VALUES, names, False))
+    grid, offset = _convolve(grid, offset, _factor('Luck', _luck_values(), names, False))
+    if 'HitPoints' in names:
+        die = {}
+        for roll in range(1, 11):
+            die[tuple(roll if name == 'HitPoints' else 0 for name in names)] = 0.1
+        grid, offset = _convolve(grid, offset, die)
+    grid.setflags(write=False)
+    return grid, offset
+
+def joint_distribution(names):
+    """
+    Exact joint distribution of several derived values.
+
+    Args:
+        names (list): Derived value names from DERIVED, e.g. ['HitPoints', 'DirectDamage'].
+
+    Returns:
+        dict: Tuple of values (in the order of names) to probability, for every
+              combination with non-zero probability.
+    """
+    for name in names:
+        if name not in DERIVED:
+            raise ValueError(f"Unknown derived value {name}. Expected one of {DERIVED}")
+    grid, offset = _grid(tuple(names))
+    joint = {}
+    for index in zip(*np.nonzero(grid)):
+        joint[tuple(int(position + low) for position, low in zip(index, offset))] = float(grid[index])
+    return joint
+
+def distribution(name):
+    """
+    Exact distribution of one derived value.
+
+    Args:
+        name (str): Derived value name from DERIVED.
+
+    Returns:
+        dict: Value to probability.
+    """
+    return {values[0]: probability for values, probability in joint_distribution([name]).items()}
+
+@functools.lru_cache(maxsize=None)
+def _cumulative(name):
+    """Values and cumulative probabilities of a derived value."""
+    marginal = distribution(name)
+    values = np.array(sorted(marginal))
+    cumulative = np.cumsum([marginal[value] for value in values])
+    return values, cumulative
+
+def _load_tables(tables):
+    """Module globals from a version of the data tables, with empty _grid() and _cumulative() caches."""
+    return {'characteristics_table': tables['characteristics'],
+            '_grid': functools.lru_cache(maxsize=None)(_grid.__wrapped__),
+            '_cumulative': functools.lru_cache(maxsize=None)(_cumulative.__wrapped__)}
+
+# Rebind characteristics_table and drop cached distributions whenever the tables are reloaded
+registry.subscribe(globals(), _load_tables)
+
+def percentile_table(name, percentiles=(1, 5, 10, 25, 50, 75, 90, 95, 99)):
+    """
+    Percentile table for a derived value.
+
+    Args:
+        name (str): Derived value name from DERIVED.
+        percentiles (tuple): Percentiles to report.
+
+    Returns:
+        dict: Percentile to the smallest value whose cumulative probability reaches it.
+    """
+    values, cumulative = _cumulative(name)
+    table = {}
+    for percentile in percentiles:
+        index = np.searchsorted(cumulative, percentile / 100.0 - 1e-12)
+        table[percentile] = int(values[min(index, len(values) - 1)])
+    return table
+
+def percentile_rank(name, value):
+    """
+    Probability that a derived value is at or below value.
+
+    Args:
+        name (str): Derived value name from DERIVED.
+        value (int): Value to rank.
+
+    Returns:
+        float: Cumulative probability, e.g. 0.9 for a 90th percentile character.
+    """
+    values, cumulative = _cumulative(name)
+    index = np.searchsorted(values, value, side='right')
+    if index == 0:
+        return 0.0
+    return float(cumulative[index - 1])
@@ -0,0 +1,344 @@
+"""
+Super Squadron Encounter Module
+
+This module picks villain teams from a roster for session prep, e.g. "four
+villains whose combined threat matches this hero party".
+
+threat_score() rates one character from HitPoints, ActionPotential and
+DirectDamage, plus the MaxAP, DamageAP and Range of each of their powers.
+Rolled values in the character's power details are used where present,
+otherwise the power_details.csv cells. Dice count at their expected value,
+statistic formulas are evaluated with the character's statistics, and "No
+Limit" or "Unlimited" count as THREAT_CAPS. The weights are in THREAT_WEIGHTS.
+
+A ThreatTable scores a roster once and keeps the scores as a sorted array.
+ThreatTable.teams() then searches for teams by meet in the middle over score
+buckets: the sorted scores are cut into at most a few hundred equal-width
+buckets, every multiset of buckets that can fill one half of the team is
+enumerated once and cached with its sorted sums, and each half is matched
+against the complement sums by binary search, looking further out when the
+nearest complements would take more characters from a bucket than it holds. The teams found within the tolerance are
+spread out by farthest-point selection on their sorted member scores, so the
+options range from even teams to one strong villain with weaker support, and
+each option takes different characters from its buckets where it can.
+"""
+
+import numpy as np
+
+from super_squadron import powers
+from super_squadron.formulas import Choice, Constant, Dice, Sentinel, SentinelCell, StatFormula, parse_cell
+
+__all__ = [
+    'THREAT_WEIGHTS',
+    'THREAT_CAPS',
+    'threat_score',
+    'party_threat',
+    'ThreatTable'
+]
+
+# Weight of each value in a threat score; the power fields are summed over the powers
+THREAT_WEIGHTS = {'HitPoints': 1.0, 'ActionPotential': 1.0, 'DirectDamage': 4.0,
+                  'MaxAP': 0.5, 'DamageAP': 4.0, 'Range': 0.02}
+
+# Most a power field counts for, and its value for "No Limit" or "Unlimited"
+THREAT_CAPS = {'MaxAP': 40, 'DamageAP': 30, 'Range': 1000}
+
+POWER_FIELDS = ['MaxAP', 'DamageAP', 'Range']
+
+_UNLIMITED = ('No Limit', 'Unlimited')
+
+# Most bucket multisets enumerated for one half of a team
+_HALF_COMBINATIONS = 100000
+
+# Most buckets, which is already finer than threat scores need to be told apart
+_MAX_BUCKETS = 4096
+
+# Candidate teams kept for the diversity selection
+_POOL = 20000
+
+# Classified detail values; details repeat the same few hundred strings
+_cells = {}
+
+
+def _cell(text):
+    """Classify a detail value once."""
+    cell = _cells.get(text)
+    if cell is None:
+        cell = _cells[text] = parse_cell(text)
+    return cell
+
+def _expected(value, field, Statistics):
+    """Expected numeric value of a power field, capped by THREAT_CAPS."""
+    cap = THREAT_CAPS[field]
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return min(float(value), cap)
+    if not isinstance(value, str):
+        return 0.0
+    if any(text in value for text in _UNLIMITED):
+        return float(cap)
+    cell = _cell(value)
+    if isinstance(cell, Constant):
+        number = cell.value
+    elif isinstance(cell, Dice):
+        number = cell.number * (cell.sides + 1) / 2 * cell.multiplier + cell.plus
+    elif isinstance(cell, Choice):
+        number = (cell.first + cell.second) / 2
+    elif isinstance(cell, StatFormula):
+        number = cell.evaluate(Statistics)
+    elif isinstance(cell, SentinelCell) and cell.sentinel is Sentinel.UNLIMITED:
+        number = cap
+    else:
+        return 0.0
+    return min(float(number), cap)
+
+def threat_score(Character):
+    """
+    Rate how dangerous a character is.
+
+    Args:
+        Character (dict): Character dictionary with derived values and powers.
+
+    Returns:
+        float: Threat score, higher is more dangerous.
+    """
+    Statistics = Character['Statistics']
+    score = sum(THREAT_WEIGHTS[field] * float(Character.get(field, 0) or 0)
+                for field in ('HitPoints', 'ActionPotential', 'DirectDamage'))
+    cells = powers.power_cells
+    details = Character['Powers']['Detail']
+    for power in dict.fromkeys(Character['Powers']['List']):
+        detail = details.get(power, {})
+        table = cells.get(power, {})
+        for field in POWER_FIELDS:
+            if field in detail:
+                value = detail[field]
+            elif field in table:
+                value = table[field].text
+            else:
+                continue
+            score = score + THREAT_WEIGHTS[field] * _expected(value, field, Statistics)
+    return score
+
+def party_threat(characters):
+    """
+    Combined threat of a party.
+
+    Args:
+        characters (iterable): Character dictionaries.
+
+    Returns:
+        float: Sum of their threat scores.
+    """
+    return sum(threat_score(Character) for Character in characters)
+
+def _multisets(count, size):
+    """Every sorted size-tuple of indices below count, as a (multisets, size) array."""
+    combinations = np.arange(count, dtype=np.int64)[:, None]
+    for step in range(size - 1):
+        last = combinations[:, -1]
+        repeats = count - last
+        starts = np.cumsum(repeats) - repeats
+        # Each row is followed by every index from its last index up
+        following = np.arange(int(repeats.sum()), dtype=np.int64) - np.repeat(starts - last, repeats)
+        combinations = np.column_stack([np.repeat(combinations, repeats, axis=0), following])
+    return combinations
+
+def _feasible(combinations, counts):
+    """Which sorted bucket multisets take no more characters from a bucket than it holds."""
+    uses = (combinations[:, :, None] == combinations[:, None, :]).sum(axis=2)
+    return (uses <= counts[combinations]).all(axis=1)
+
+def _bucket_limit(half):
+    """Most buckets for which the multisets of one half stay under _HALF_COMBINATIONS."""
+    count = 1
+    while count < _MAX_BUCKETS:
+        multisets = 1
+        for position in range(half):
+            multisets = multisets * (count + 1 + position) // (position + 1)
+        if multisets > _HALF_COMBINATIONS:
+            return count
+        count = count + 1
+    return count
+
+
+class ThreatTable:
+    """
+    Threat scores of a roster, sorted for team searches.
+
+    Attributes:
+        ids (numpy.ndarray): Character IDs in score order.
+        scores (numpy.ndarray): Threat scores, ascending.
+    """
+
+    def __init__(self, characters, ids=None):
+        """
+        Score a roster.
+
+        Args:
+            characters (iterable): Character dictionaries.
+            ids (sequence): ID of each character. Defaults to each character's
+                            'id' (as RosterStore gives them), or its position.
+        """
+        characters = list(characters)
+        if ids is None:
+            ids = [Character.get('id', position) for position, Character in enumerate(characters)]
+        scores = np.array([threat_score(Character) for Character in characters], dtype=np.float64)
+        order = np.argsort(scores, kind='stable')
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.scores = scores[order]
+        self._buckets = {}
+        self._halves = {}
+
+    @classmethod
+    def from_store(cls, store, **query):
+        """
+        Score the characters of a RosterStore.
+
+        Args:
+            store (RosterStore): The roster.
+            **query: Arguments for RosterStore.query(), e.g. origin='Alien'.
+
+        Returns:
+            ThreatTable: Table keyed by store IDs.
+        """
+        return cls(store.query(**query))
+
+    def __repr__(self):
+        return f'ThreatTable({len(self)} characters)'
+
+    def __len__(self):
+        return len(self.scores)
+
+    def score(self, character_id):
+        """
+        Get a character's threat score.
+
+        Args:
+            character_id (int): Character ID.
+
+        Returns:
+            float: The score.
+        """
+        positions = np.flatnonzero(self.ids == character_id)
+        if not len(positions):
+            raise KeyError(character_id)
+        return float(self.scores[positions[0]])
+
+    def _bucketed(self, limit):
+        """Start, count and mean score of each non-empty equal-width bucket, for at most limit buckets."""
+        if limit not in self._buckets:
+            low, high = self.scores[0], self.scores[-1]
+            width = max((high - low) / limit, 1e-9)
+            keys = np.minimum(((self.scores - low) / width).astype(np.int64), limit - 1)
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            counts = np.diff(np.r_[starts, len(keys)])
+            means = np.add.reduceat(self.scores, starts) / counts
+            self._buckets[limit] = (starts, counts, means)
+        return self._buckets[limit]
+
+    def _half(self, limit, size):
+        """Feasible bucket multisets of one half of a team and their score sums, sorted by sum."""
+        key = (limit, size)
+        if key not in self._halves:
+            starts, counts, means = self._bucketed(limit)
+            combinations = _multisets(len(means), size)
+            combinations = combinations[_feasible(combinations, counts)]
+            sums = means[combinations].sum(axis=1)
+            order = np.argsort(sums, kind='stable')
+            self._halves[key] = (combinations[order], sums[order])
+        return self._halves[key]
+
+    def teams(self, target, size=4, options=5, tolerance=0.05):
+        """
+        Find teams whose combined threat is close to a target.
+
+        Args:
+            target (float or list): Threat to match, or a list of Character
+                                    dictionaries (a hero party) to match.
+            size (int): Characters in each team.
+            options (int): Number of teams to return.
+            tolerance (float): Acceptable difference from the target, as a fraction of it.
+
+        Returns:
+            list: Up to options dictionaries with 'Ids' (character IDs),
+                  'Scores', 'Threat' (their sum) and 'Error' (Threat minus the
+                  target), within the tolerance where possible and otherwise
+                  the closest found.
+        """
+        if not isinstance(target, (int, float, np.integer, np.floating)):
+            target = party_threat(target)
+        if size < 1 or len(self) < size:
+            raise ValueError(f"Cannot pick teams of {size} from {len(self)} characters")
+        first, second = size // 2, size - size // 2
+        limit = _bucket_limit(second)
+        starts, counts, means = self._bucketed(limit)
+        halves, half_sums = self._half(limit, second)
+        spread = 1
+        while True:
+            if first:
+                lefts, left_sums = self._half(limit, first)
+                # The spread nearest complement sums on either side of each left half
+                positions = np.searchsorted(half_sums, target - left_sums)
+                offsets = np.arange(-spread, spread)
+                positions = np.clip((positions[None, :] + offsets[:, None]).ravel(), 0, len(half_sums) - 1)
+                left_rows = np.tile(np.arange(len(left_sums)), len(offsets))
+                combinations = np.column_stack([lefts[left_rows], halves[positions]])
+            else:
+                combinations = halves
+            errors = np.abs(means[combinations].sum(axis=1) - target)
+            kept = np.argpartition(errors, _POOL)[:_POOL] if len(errors) > _POOL else np.arange(len(errors))
+            # A bucket cannot give more characters than it holds, which the halves only
+            # ensure on their own. If too few of the closest teams pass, filter them all
+            feasible = _feasible(combinations[kept], counts)
+            if feasible.sum() < options and len(kept) < len(errors):
+                kept = np.flatnonzero(_feasible(combinations, counts))
+                if len(kept) > _POOL:
+                    kept = kept[np.argpartition(errors[kept], _POOL)[:_POOL]]
+            else:
+                kept = kept[feasible]
+            combinations, errors = np.sort(combinations[kept], axis=1), errors[kept]
+            if len(errors) or not first or spread >= len(half_sums):
+                break
+            # Every nearby complement shares too many characters, e.g. for targets
+            # beyond the roster's strongest or weakest teams, so look further out
+            spread = spread * 4
+        # Teams with the same buckets are the same option; key each by its buckets in base len(means)
+        keys = combinations @ (len(means) ** np.arange(size - 1, -1, -1, dtype=np.int64))
+        keys, unique = np.unique(keys, return_index=True)
+        combinations, errors = combinations[unique], errors[unique]
+        if not len(errors):
+            return []
+
+        within = errors <= abs(target) * tolerance
+        if within.sum() >= options:
+            pool = np.flatnonzero(within)
+            points = means[combinations[pool]] / max(abs(target), 1e-9)
+            best = int(np.argmin(errors[pool]))
+            chosen = [int(pool[best])]
+            distances = np.linalg.norm(points - points[best], axis=1)
+            while len(chosen) < options and distances.max() > 0:
+                pick = int(np.argmax(distances))
+                chosen.append(int(pool[pick]))
+                distances = np.minimum(distances, np.linalg.norm(points - points[pick], axis=1))
+        else:
+            chosen = np.argsort(errors, kind='stable')[:options].tolist()
+
+        cursors = np.zeros(len(means), dtype=np.int64)
+        results = []
+        for row in chosen:
+            # Take each bucket's strongest characters for teams whose buckets fall
+            # short of the target and its weakest otherwise, so a target beyond the
+            # roster gets its strongest or weakest team exactly
+            short = means[combinations[row]].sum() < target
+            team = []
+            for bucket in combinations[row].tolist():
+                offset = cursors[bucket] % counts[bucket]
+                if short:
+                    offset = counts[bucket] - 1 - offset
+                team.append(int(starts[bucket] + offset))
+                cursors[bucket] = cursors[bucket] + 1
+            scores = self.scores[team]
+            threat = float(scores.sum())
+            results.append({'Ids': self.ids[team].tolist(), 'Scores': scores.tolist(), 'Threat': threat,
+                            'Error': threat - target})
+        return sorted(results, key=lambda result: abs(result['Error']))
@@ -0,0 +1,483 @@
+"""
+Super Squadron Equivalence Module
+
+This module checks that the batched and compiled fast paths roll the same
+distributions as the scalar code they replace, so they can be adopted with
+confidence:
+
+    python -m super_squadron.equivalence                   # every check
+    python -m super_squadron.equivalence --check roll_ap --samples 50000
+
+Each check draws a large sample from a legacy path and from a new path, with
+fixed seeds, flattens the results into fields (a power's detail dictionary
+becomes fields such as "Speed" or "Blast.Range"), and tests every field:
+
+- chi-square homogeneity for fields with at most MAX_CATEGORIES values, text
+  fields and fields missing from some results, with rare values pooled
+- two-sample Kolmogorov-Smirnov for numeric fields present in every result
+
+A field diverges when its p-value is under alpha divided by the number of
+tests run (a Bonferroni correction), and the command exits with status 1.
+
+Checks are registered with the check() decorator, so a new fast path adds a
+check here next to the ones for roll_effects, roll_ap, roll_origin, devices,
+the physical, job and NPC reaction sub-roll tables, derived statistics and
+the power classes. Deterministic results, such as the binary codec's round
+trip, are tested under tests/ instead.
+"""
+
+import contextlib
+import copy
+import math
+
+import numpy as np
+
+from super_squadron import character, formulas, gm, origins, powers
+from super_squadron.distributions import DERIVED, joint_distribution
+from super_squadron.roll import (_roll, roll_ap, roll_ap_batch, roll_effects, roll_effects_batch, roll_luck,
+                                 roll_main_statistics, roll_statistic)
+from super_squadron.tables import registry
+
+__all__ = [
+    'MAX_CATEGORIES',
+    'CHECKS',
+    'FieldResult',
+    'check',
+    'chi_square_test',
+    'ks_test',
+    'flatten',
+    'compare',
+    'run_checks'
+]
+
+# Fields with more distinct values than this are only KS tested
+MAX_CATEGORIES = 100
+# Values seen fewer times than this across both samples are pooled for chi-square
+MIN_POOLED = 10
+_MISSING = '<missing>'
+
+# Check name to function(samples, power_samples) yielding (case, legacy results, new results)
+CHECKS = {}
+
+
+class FieldResult:
+    """
+    The outcome of one test on one field.
+
+    Attributes:
+        check (str): Check name, e.g. 'roll_ap'.
+        case (str): Case within the check, e.g. the formula "2d4x4".
+        field (str): Flattened field name.
+        test (str): 'chi-square' or 'ks'.
+        statistic (float): Test statistic.
+        p_value (float): p-value of the test.
+    """
+
+    def __init__(self, check, case, field, test, statistic, p_value):
+        self.check = check
+        self.case = case
+        self.field = field
+        self.test = test
+        self.statistic = statistic
+        self.p_value = p_value
+
+    def __repr__(self):
+        return (f'FieldResult({self.check}, {self.case!r}, {self.field!r}, {self.test}, '
+                f'statistic={self.statistic:.4g}, p={self.p_value:.3g})')
+
+
+def check(name):
+    """
+    Register an equivalence check.
+
+    The function takes the number of samples and the number of power samples,
+    and yields (case, legacy results, new results) tuples, where results are
+    lists of values or of dictionaries.
+    """
+    def register(function):
+        CHECKS[name] = function
+        return function
+    return register
+
+def _gamma_q(a, x):
+    """Regularized upper incomplete gamma function Q(a, x)."""
+    if x <= 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Series for P(a, x)
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(1.0 - total * math.exp(log_prefix), 0.0)
+    # Continued fraction for Q(a, x), by the modified Lentz method
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1.0 / tiny
+    d = 1.0 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+def _kolmogorov_q(value):
+    """Survival function of the Kolmogorov distribution."""
+    if value < 0.2:
+        return 1.0
+    total = 0.0
+    for j in range(1, 101):
+        term = 2 * (-1) ** (j - 1) * math.exp(-2 * j * j * value * value)
+        total += term
+        if abs(term) < 1e-12:
+            break
+    return min(max(total, 0.0), 1.0)
+
+def chi_square_test(legacy, new):
+    """
+    Chi-square test that two samples of categorical values share a distribution.
+
+    Values seen fewer than MIN_POOLED times across both samples are pooled into one category.
+
+    Args:
+        legacy (list): Hashable values.
+        new (list): Hashable values.
+
+    Returns:
+        tuple: (statistic, degrees of freedom, p-value).
+    """
+    counts = {}
+    for column, values in enumerate((legacy, new)):
+        for value in values:
+            counts.setdefault(value, [0, 0])[column] += 1
+    table = [pair for pair in counts.values() if sum(pair) >= MIN_POOLED]
+    pooled = [sum(pair[column] for pair in counts.values() if sum(pair) < MIN_POOLED) for column in (0, 1)]
+    if sum(pooled):
+        table.append(pooled)
+    if len(table) < 2:
+        return 0.0, 0, 1.0
+    observed = np.array(table, dtype=np.float64)
+    legacy_total, new_total = observed.sum(axis=0)
+    scale = math.sqrt(new_total / legacy_total)
+    statistic = float((((observed[:, 0] * scale - observed[:, 1] / scale) ** 2) / observed.sum(axis=1)).sum())
+    freedom = len(table) - 1
+    return statistic, freedom, _gamma_q(freedom / 2.0, statistic / 2.0)
+
+def ks_test(legacy, new):
+    """
+    Two-sample Kolmogorov-Smirnov test, with the asymptotic p-value.
+
+    The p-value is conservative for discrete values.
+
+    Args:
+        legacy (sequence): Numbers.
+        new (sequence): Numbers.
+
+    Returns:
+        tuple: (D statistic, p-value).
+    """
+    legacy = np.sort(np.asarray(legacy, dtype=np.float64))
+    new = np.sort(np.asarray(new, dtype=np.float64))
+    values = np.concatenate([legacy, new])
+    difference = np.abs(np.searchsorted(legacy, values, side='right') / len(legacy)
+                        - np.searchsorted(new, values, side='right') / len(new))
+    statistic = float(difference.max())
+    effective = math.sqrt(len(legacy) * len(new) / (len(legacy) + len(new)))
+    return statistic, _kolmogorov_q((effective + 0.12 + 0.11 / effective) * statistic)
+
+def flatten(value, prefix=''):
+    """
+    Flatten nested dictionaries and lists into one dictionary of fields.
+
+    Args:
+        value: A dictionary, list or plain value.
+        prefix (str): Field name prefix.
+
+    Returns:
+        dict: Dotted field name, e.g. "Blast.Range", to value. A plain value is the field "value".
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {prefix or 'value': value}
+    fields = {}
+    for key, item in items:
+        name = f'{prefix}.{key}' if prefix else str(key)
+        if isinstance(item, (dict, list)):
+            fields.update(flatten(item, name))
+        else:
+            fields[name] = item
+    return fields
+
+def _is_number(value):
+    """Whether a value is an int or float, but not a bool."""
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+def compare(legacy, new, check_name='', case=''):
+    """
+    Test every field of two samples of results.
+
+    Args:
+        legacy (list): Values or dictionaries from the legacy path.
+        new (list): Values or dictionaries from the new path.
+        check_name (str): Check name for the results.
+        case (str): Case name for the results.
+
+    Returns:
+        list: FieldResult for each test.
+    """
+    legacy = [flatten(result) for result in legacy]
+    new = [flatten(result) for result in new]
+    names = dict.fromkeys(name for results in (legacy, new) for result in results for name in result)
+    outcomes = []
+    for name in names:
+        legacy_values = [result.get(name, _MISSING) for result in legacy]
+        new_values = [result.get(name, _MISSING) for result in new]
+        numeric = all(_is_number(value) for values in (legacy_values, new_values) for value in values)
+        distinct = set(map(repr, legacy_values)) | set(map(repr, new_values))
+        if len(distinct) == 1:
+            continue
+        if numeric:
+            statistic, p_value = ks_test(legacy_values, new_values)
+            outcomes.append(FieldResult(check_name, case, name, 'ks', statistic, p_value))
+        if not numeric or len(distinct) <= MAX_CATEGORIES:
+            # repr keeps 1 and "1" apart
+            statistic, freedom, p_value = chi_square_test([repr(value) for value in legacy_values],
+                                                          [repr(value) for value in new_values])
+            outcomes.append(FieldResult(check_name, case, name, 'chi-square', statistic, p_value))
+    return outcomes
+
+def _seeded(seed, function, *args):
+    """Call a function after seeding numpy's random generator."""
+    np.random.seed(seed)
+    return function(*args)
+
+
+@check('roll_effects')
+def _check_roll_effects(samples, power_samples):
+    """roll_effects() against roll_effects_batch()."""
+    for number, sides in [(1, 4), (1, 6), (3, 6), (2, 10), (1, 20), (5, 4), (1, 100)]:
+        yield (f'{number}d{sides}', [roll_effects(number, sides) for sample in range(samples)],
+               roll_effects_batch(number, sides, samples).tolist())
+
+def _dice_formulas():
+    """Distinct Dice cells of power_details.csv."""
+    cells = {}
+    for row in powers.power_cells.values():
+        for cell in row.values():
+            if isinstance(cell, formulas.Dice):
+                cells.setdefault(cell.text, cell)
+    return cells
+
+@check('roll_ap')
+def _check_roll_ap(samples, power_samples):
+    """roll_ap() against roll_ap_batch() and formulas.roll_column() for every power_details.csv dice cell."""
+    for text, cell in _dice_formulas().items():
+        legacy = [roll_ap(text) for sample in range(samples)]
+        yield f'{text} roll_ap_batch', legacy, roll_ap_batch(text, samples)
+        yield f'{text} roll_column', legacy, formulas.roll_column([cell], np.zeros(samples, dtype=np.int64))
+
+def _notebook_roll_origin():
+    """The origin ladder from the Character Generator notebook, before data/origins.csv."""
+    origin_dict = {'Artifact': "No", 'Lifespan': "Human"}
+    roll = _roll(1, 10)
+    if roll <= 3:
+        origin, age = "Mutant", _roll(1, 12) + 15
+    elif roll == 4:
+        origin, age = "Self Developed", _roll(1, 12) + 25
+    elif roll == 5:
+        origin, age = "Supernatural", _roll(1, 10) + 20
+    elif roll == 6:
+        origin, age = "Designed or Sponsored", _roll(1, 12) + 25
+    elif roll == 10:
+        origin, age = "Alien", _roll(1, 10) * _roll(1, 6)
+        origin_dict['Lifespan'] = _roll(1, 20) * _roll(1, 20)
+    else:
+        origin, age = "Accidental/Scientific", _roll(1, 8) * _roll(1, 6) + 25
+        if _roll(1, 100) <= 5:
+            origin_dict['Artifact'] = "Yes"
+    origin_dict['Origin'] = origin
+    origin_dict['Age'] = age
+    return origin_dict
+
+@check('roll_origin')
+def _check_roll_origin(samples, power_samples):
+    """The notebook origin ladder against origins.roll_origin() and roll_origin_batch()."""
+    legacy = [_notebook_roll_origin() for sample in range(samples)]
+    yield 'roll_origin', legacy, [origins.roll_origin() for sample in range(samples)]
+    batch = origins.roll_origin_batch(samples)
+    del batch['OriginID']
+    new = [dict(zip(batch, values)) for values in zip(*batch.values())]
+    yield 'roll_origin_batch', legacy, new
+    # Age and lifespan by origin, so a swapped formula cannot hide in the mixture
+    for name in origins.rules.names:
+        yield (f'{name} roll_origin_batch', [result for result in legacy if result['Origin'] == name],
+               [result for result in new if result['Origin'] == name])
+
+@check('devices')
+def _check_devices(samples, power_samples):
+    """character.assign_devices() against origins.assign_devices_batch()."""
+    for name in origins.rules.names:
+        devices = sorted(origins.device_powers(name))
+        if not devices:
+            continue
+        # Device powers, one listed twice, and a power that is never a device for the origin
+        listed = devices[:3] + devices[:1] + ['Immortality']
+        luck = [sample % 11 for sample in range(samples)]
+        legacy = []
+        for sample in range(samples):
+            Character = {'Origin': {'Origin': name}, 'Statistics': {'Luck': luck[sample]},
+                         'Powers': {'List': listed, 'Detail': {power: {} for power in listed}}}
+            detail = character.assign_devices(Character)['Powers']['Detail']
+            legacy.append({power: 'Device' in detail[power] for power in listed})
+        new = [{power: power in devices for power in listed}
+               for devices in origins.assign_devices_batch([name] * samples, [listed] * samples, luck)]
+        yield name, legacy, new
+
+@check('physical')
+def _check_physical(samples, power_samples):
+    """character.roll_physical() against roll_physical_batch()."""
+    legacy = [character.roll_physical({}) for sample in range(samples)]
+    batch = character.roll_physical_batch(samples)
+    yield 'roll_physical_batch', legacy, [dict(zip(batch, values)) for values in zip(*batch.values())]
+
+@check('job')
+def _check_job(samples, power_samples):
+    """character.roll_job() against roll_job_batch()."""
+    legacy = [character.roll_job({}) for sample in range(samples)]
+    batch = character.roll_job_batch(samples)
+    yield 'roll_job_batch', legacy, [dict(zip(batch, values)) for values in zip(*batch.values())]
+
+@check('npc_reactions')
+def _check_npc_reactions(samples, power_samples):
+    """gm.roll_npc_reaction() against roll_npc_reactions()."""
+    for dm in (0, 25):
+        yield (f'dm {dm}', [gm.roll_npc_reaction(dm) for sample in range(samples)],
+               gm.roll_npc_reactions(samples, dm))
+
+def _derived_statistics():
+    """Derived values of a character rolled as generate_character() does."""
+    Statistics = roll_main_statistics(character.new_statistics())
+    Statistics['Ego'] = roll_statistic()
+    Statistics['Luck'] = roll_luck()
+    Character = character.derive_statistics(character.roll_statistic_effects({'Statistics': Statistics}))
+    return {name: Character[name] for name in DERIVED}
+
+@check('derived_statistics')
+def _check_derived_statistics(samples, power_samples):
+    """Statistics rolled through roll_main_statistics() against the exact distributions module."""
+    legacy = [_derived_statistics() for sample in range(samples)]
+    joint = joint_distribution(DERIVED)
+    outcomes = list(joint)
+    probabilities = np.array([joint[outcome] for outcome in outcomes])
+    picks = np.random.choice(len(outcomes), size=samples, p=probabilities / probabilities.sum())
+    yield 'joint_distribution', legacy, [dict(zip(DERIVED, outcomes[pick])) for pick in picks.tolist()]
+
+@contextlib.contextmanager
+def _legacy_power_rolls():
+    """
+    Roll the power classes' own values with roll_ap(), as they did before
+    cells were classified, e.g. roll_ap(self.deviceap) for the device AP of
+    whichever beam type ForceBeam picked.
+
+    Choice and statistic formula values, whose results deliberately changed,
+    are still rolled as cells.
+    """
+    roll_cell = powers.PowerBase.roll
+
+    def roll(self, column, Character):
+        value = getattr(self, column.lower())
+        if isinstance(formulas.parse_cell(value), (formulas.Choice, formulas.StatFormula)):
+            return roll_cell(self, column, Character)
+        return roll_ap(value)
+
+    powers.PowerBase.roll = roll
+    try:
+        yield
+    finally:
+        powers.PowerBase.roll = roll_cell
+
+def _power_details(base, power, samples):
+    """Detail dictionaries from applying a power class to copies of a character."""
+    details = []
+    for sample in range(samples):
+        Character = copy.deepcopy(base)
+        Character['Powers']['List'] = [power]
+        Character['Powers']['Detail'] = {power: {}}
+        powers.power_classes[power](Character)
+        details.append(Character['Powers']['Detail'][power])
+    return details
+
+@check('power_classes')
+def _check_power_classes(samples, power_samples):
+    """Power classes rolling cells through roll_ap() against classified cells, per power detail field."""
+    base = _seeded(0, character.generate_character)
+    base['Powers'] = {'Number': 1, 'List': [], 'Detail': {}}
+    for power in powers.power_classes:
+        with _legacy_power_rolls():
+            legacy = _power_details(base, power, power_samples)
+        yield power, legacy, _power_details(base, power, power_samples)
+
+def run_checks(names=None, samples=20000, power_samples=2000, seed=12345, alpha=0.001):
+    """
+    Run equivalence checks.
+
+    Each check starts from its own fixed seed, so runs are repeatable.
+
+    Args:
+        names (list): Check names from CHECKS. All checks if None.
+        samples (int): Results drawn from each path per case.
+        power_samples (int): Results drawn from each path per power class.
+        seed (int): Base seed.
+        alpha (float): Family-wise significance level.
+
+    Returns:
+        dict: 'Results' (list of FieldResult), 'Threshold' (per-test p-value threshold)
+              and 'Failures' (FieldResults under the threshold).
+    """
+    results = []
+    with registry.reading():
+        for offset, name in enumerate(names or CHECKS):
+            np.random.seed(seed + offset)
+            for case, legacy, new in CHECKS[name](samples, power_samples):
+                results.extend(compare(legacy, new, name, case))
+    threshold = alpha / max(len(results), 1)
+    return {'Results': results, 'Threshold': threshold,
+            'Failures': [result for result in results if result.p_value < threshold]}
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description="Check that fast paths roll the same distributions as the legacy code")
+    parser.add_argument('--check', action='append', choices=sorted(CHECKS), help="Check to run, repeatable. Default all")
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--power-samples', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=12345)
+    parser.add_argument('--alpha', type=float, default=0.001, help="Family-wise significance level")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = run_checks(args.check, args.samples, args.power_samples, args.seed, args.alpha)
+    for result in summary['Failures']:
+        print(f"DIVERGED {result.check} {result.case!r} {result.field!r}: {result.test} "
+              f"statistic {result.statistic:.4g}, p {result.p_value:.3g}")
+    print(f"{len(summary['Results'])} tests, {len(summary['Failures'])} diverged at p < {summary['Threshold']:.3g}, "
+          f"{time.perf_counter() - start:.1f}s")
+    sys.exit(1 if summary['Failures'] else 0)
@@ -0,0 +1,299 @@
+"""
+Super Squadron Formulas Module
+
+This module classifies data table cells once, when the tables are loaded, so
+power application rolls them without inspecting strings.
+
+power_details.csv mixes several kinds of value in the same columns:
+
+    Constant     "20", "5000000000"
+    Dice         "2d4x4", "1d6+3", "6d10+20", "1d10x10+15"
+    Choice       "20or10", either value on a 1d100 roll of 50 or less
+    StatFormula  "Strengthx2+Agilityx2", "Strength/2+Agility/2", "Stamina+10"
+    Sentinel     "NotApplicable", "Unlimited", "Variable", "HTH"
+    Text         anything else, e.g. "Sight" or "1d4*Ego*-1+25"
+
+Rolling a cell gives the same result, with the same dice draws, as roll_ap()
+gives for its text, with two exceptions. A StatFormula is evaluated when
+Statistics are given instead of being returned as text. A Choice is rolled,
+where roll_ap() returns "20or10" as text because its letter check comes before
+its "or" branch.
+"""
+
+import enum
+import math
+import re
+
+import numpy as np
+
+from super_squadron.roll import _roll, _roll_batch
+
+__all__ = [
+    'STATISTICS',
+    'Sentinel',
+    'Cell',
+    'Constant',
+    'Dice',
+    'Choice',
+    'StatFormula',
+    'SentinelCell',
+    'Text',
+    'parse_cell',
+    'normalize_table',
+    'roll_column'
+]
+
+STATISTICS = ['Strength', 'Agility', 'Charisma', 'Intelligence', 'Stamina', 'PublicStanding', 'Ego', 'Luck']
+
+_CONSTANT = re.compile(r'-?\d+$')
+_DICE = re.compile(r'(\d+)d(\d+)(?:x(\d+))?(?:\+(\d+))?$')
+_CHOICE = re.compile(r'(\d+)or(\d+)$')
+_STAT_TERM = re.compile(r'({})(?:([x/])(-?\d+))?$'.format('|'.join(STATISTICS)))
+
+
+class Sentinel(enum.Enum):
+    """Special values that roll_ap() returns as they are."""
+    NOT_APPLICABLE = 'NotApplicable'
+    UNLIMITED = 'Unlimited'
+    VARIABLE = 'Variable'
+    HTH = 'HTH'
+
+
+class Cell:
+    """
+    A classified table cell.
+
+    Attributes:
+        kind (str): Class name of the cell, e.g. 'Dice'.
+        text (str): The cell as written in the table.
+        statistics (tuple): Statistics the cell reads, empty unless it is a StatFormula.
+    """
+
+    kind = 'Cell'
+    statistics = ()
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f'{self.kind}({self.text!r})'
+
+    def roll(self, Statistics=None):
+        """
+        Roll or evaluate the cell.
+
+        Args:
+            Statistics (dict): Character statistics for StatFormula cells.
+
+        Returns:
+            int or str: The value, or the text for cells without one.
+        """
+        return self.text
+
+
+class Constant(Cell):
+    """A whole number."""
+
+    kind = 'Constant'
+
+    def __init__(self, text, value):
+        super().__init__(text)
+        self.value = value
+
+    def roll(self, Statistics=None):
+        return self.value
+
+
+class Dice(Cell):
+    """A dice formula, number d sides, times multiplier, plus plus."""
+
+    kind = 'Dice'
+
+    def __init__(self, text, number, sides, multiplier=1, plus=0):
+        super().__init__(text)
+        self.number = number
+        self.sides = sides
+        self.multiplier = multiplier
+        self.plus = plus
+
+    def roll(self, Statistics=None):
+        return _roll(self.number, self.sides, self.text) * self.multiplier + self.plus
+
+
+class Choice(Cell):
+    """One of two values, the first on a 1d100 roll of 50 or less."""
+
+    kind = 'Choice'
+
+    def __init__(self, text, first, second):
+        super().__init__(text)
+        self.first = first
+        self.second = second
+
+    def roll(self, Statistics=None):
+        if _roll(1, 100, self.text) <= 50:
+            return self.first
+        return self.second
+
+
+class StatFormula(Cell):
+    """
+    A sum of statistic terms and a constant, e.g. "Strengthx2+Agilityx2".
+
+    Attributes:
+        terms (list): (statistic, multiplier, divisor) for each statistic term.
+        plus (int): Constant added to the terms.
+    """
+
+    kind = 'StatFormula'
+
+    def __init__(self, text, terms, plus=0):
+        super().__init__(text)
+        self.terms = terms
+        self.plus = plus
+        self.statistics = tuple(dict.fromkeys(stat for stat, multiplier, divisor in terms))
+
+    def evaluate(self, Statistics):
+        """
+        Evaluate the formula.
+
+        Args:
+            Statistics (dict): Character statistics.
+
+        Returns:
+            int: The value, with halves rounded up as powers.normal_round() does.
+        """
+        total = self.plus
+        for stat, multiplier, divisor in self.terms:
+            total += Statistics[stat] * multiplier / divisor if divisor != 1 else Statistics[stat] * multiplier
+        if isinstance(total, float):
+            total = math.floor(total + 0.5)
+        return total
+
+    def roll(self, Statistics=None):
+        if Statistics is None:
+            return self.text
+        return self.evaluate(Statistics)
+
+
+class SentinelCell(Cell):
+    """A Sentinel value."""
+
+    kind = 'Sentinel'
+
+    def __init__(self, text, sentinel):
+        super().__init__(text)
+        self.sentinel = sentinel
+
+
+class Text(Cell):
+    """Text with no value to roll."""
+
+    kind = 'Text'
+
+
+def _stat_formula(text):
+    """Parse a statistic formula, or return None if text is not one."""
+    terms = []
+    plus = 0
+    for part in text.split('+'):
+        if _CONSTANT.match(part):
+            plus += int(part)
+            continue
+        match = _STAT_TERM.match(part)
+        if match is None:
+            return None
+        stat, operator, number = match.groups()
+        if operator is None:
+            terms.append((stat, 1, 1))
+        elif operator == 'x':
+            terms.append((stat, int(number), 1))
+        elif int(number) == 0:
+            return None
+        else:
+            terms.append((stat, 1, int(number)))
+    if not terms:
+        return None
+    return StatFormula(text, terms, plus)
+
+def parse_cell(value):
+    """
+    Classify a table cell.
+
+    Args:
+        value: Cell value, usually a string from the table.
+
+    Returns:
+        Cell: The classified cell.
+    """
+    text = str(value)
+    for sentinel in Sentinel:
+        # roll_ap() treats any cell containing a sentinel as that sentinel
+        if sentinel.value in text:
+            return SentinelCell(text, sentinel)
+    if _CONSTANT.match(text):
+        return Constant(text, int(text))
+    match = _DICE.match(text)
+    if match is not None:
+        number, sides, multiplier, plus = match.groups()
+        return Dice(text, int(number), int(sides), int(multiplier or 1), int(plus or 0))
+    match = _CHOICE.match(text)
+    if match is not None:
+        return Choice(text, int(match.group(1)), int(match.group(2)))
+    formula = _stat_formula(text)
+    if formula is not None:
+        return formula
+    return Text(text)
+
+def normalize_table(table, key, columns=None):
+    """
+    Classify every cell of a table once.
+
+    Args:
+        table (pandas.DataFrame): Table, e.g. power_details.
+        key (str): Column naming each row, e.g. 'Power'.
+        columns (list): Columns to classify. All but key if None.
+
+    Returns:
+        dict: Row name to {column: Cell}.
+    """
+    if columns is None:
+        columns = [column for column in table.columns if column != key]
+    cells = {}
+    for row in zip(table[key].tolist(), *(table[column].tolist() for column in columns)):
+        cells[row[0]] = {column: parse_cell(value) for column, value in zip(columns, row[1:])}
+    return cells
+
+def roll_column(cells, rows):
+    """
+    Roll the cells of a classified column at many rows at once.
+
+    Each distinct Dice or Choice cell among the rows is drawn as one batch.
+    StatFormula cells give their text, as without Statistics.
+
+    Args:
+        cells (list): Cell for each table row.
+        rows (numpy.ndarray): Row index of each roll.
+
+    Returns:
+        list: One value per row index, as Cell.roll() would give it.
+    """
+    rows = np.asarray(rows)
+    results = [None] * len(rows)
+    groups = {}
+    for position, row in enumerate(rows.tolist()):
+        # Rows with the same text roll the same way, so they share a batch
+        cell = cells[row]
+        groups.setdefault(cell.text, (cell, []))[1].append(position)
+    for cell, positions in groups.values():
+        if isinstance(cell, Dice):
+            values = (_roll_batch(cell.number, cell.sides, len(positions), cell.text) * cell.multiplier
+                      + cell.plus).tolist()
+        elif isinstance(cell, Choice):
+            draws = _roll_batch(1, 100, len(positions), cell.text)
+            values = np.where(draws <= 50, cell.first, cell.second).tolist()
+        else:
+            values = [cell.roll()] * len(positions)
+        for position, value in zip(positions, values):
+            results[position] = value
+    return results
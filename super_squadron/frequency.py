@@ -0,0 +1,254 @@
+"""
+Super Squadron Frequency Module
+
+This module computes exact power frequencies for the origin tables in
+data/powers.csv without generating characters.
+
+Each roll on an origin column is treated as a branching Markov process: the
+roll either emits a power or, on "Roll again twice", starts two further rolls
+on the Secondary column. For any set of powers the probability that a roll
+never emits one of them satisfies
+
+    q(column) = 1 - p_hit(column) - p_again(column) + p_again(column) * q(secondary)^2
+
+which is solved directly (as a quadratic when an origin has no Secondary column
+and re-rolls on itself). A character with n rolls misses the set with
+probability q^n, and the number of rolls comes from the Powers column plus the
+Luck bonus in character.roll_power_number().
+"""
+
+import math
+
+from super_squadron import origins
+from super_squadron.character import ROLL_AGAIN, secondary_column
+from super_squadron.tables import registry
+
+__all__ = [
+    'ORIGINS',
+    'column_distribution',
+    'number_distribution',
+    'power_probability',
+    'power_probabilities',
+    'expected_powers',
+    'device_probability',
+    'device_probabilities'
+]
+
+ORIGINS = ['Mutant', 'Self Developed', 'Supernatural', 'Designed or Sponsored', 'Alien', 'Accidental/Scientific']
+
+
+def _load_tables(tables):
+    """Module globals from a version of the data tables, with an empty column_distribution() cache."""
+    return {'powers_table': tables['powers'], '_column_cache': {}}
+
+# Rebind powers_table whenever the tables are reloaded
+registry.subscribe(globals(), _load_tables)
+
+
+def column_distribution(column):
+    """
+    Get the probability of each entry in an origin table column.
+
+    Args:
+        column (str): Column name in powers.csv, e.g. "Mutant" or "Mutant Secondary".
+
+    Returns:
+        dict: Entry name to probability, including "Roll again twice".
+    """
+    if column not in _column_cache:
+        counts = powers_table[column].value_counts()
+        total = counts.sum()
+        _column_cache[column] = {name: float(count / total) for name, count in counts.items()}
+    return _column_cache[column]
+
+def number_distribution(luck=0):
+    """
+    Get the distribution of the number of rolls on the origin table.
+
+    Args:
+        luck (int): Character Luck statistic.
+
+    Returns:
+        dict: Number of rolls to probability.
+    """
+    base = column_distribution('Powers')
+    if luck == 10:
+        bonus = {1: 0.75, 2: 0.25}
+    elif 7 <= luck <= 9:
+        bonus = {0: 0.25, 1: 0.75}
+    elif 4 <= luck <= 6:
+        bonus = {0: 0.5, 1: 0.5}
+    elif 1 <= luck <= 3:
+        bonus = {0: 0.75, 1: 0.25}
+    else:
+        bonus = {0: 1.0}
+    numbers = {}
+    for number, probability in base.items():
+        for extra, extra_probability in bonus.items():
+            numbers[int(number) + extra] = numbers.get(int(number) + extra, 0.0) + probability * extra_probability
+    return numbers
+
+def _luck_distribution():
+    """Distribution of roll.roll_luck(): Luck 11 - roll for rolls under 11 on d100, otherwise 0."""
+    luck = {0: 0.90}
+    for value in range(1, 11):
+        luck[value] = 0.01
+    return luck
+
+def _miss_probability(column, weights):
+    """
+    Probability that one roll on column never emits a weighted hit.
+
+    Args:
+        column (str): Origin table column.
+        weights (dict): Power name to the chance that emitting it counts as a hit.
+    """
+    distribution = column_distribution(column)
+    hit = sum(probability * weights.get(name, 0.0) for name, probability in distribution.items())
+    again = distribution.get(ROLL_AGAIN, 0.0)
+    if again == 0.0:
+        return 1.0 - hit
+    secondary = secondary_column(column)
+    if secondary != column:
+        secondary_miss = _miss_probability(secondary, weights)
+        return 1.0 - hit - again + again * secondary_miss * secondary_miss
+    # Self-referencing column: again*q^2 - q + (1 - hit - again) = 0, smallest root
+    constant = 1.0 - hit - again
+    return (1.0 - math.sqrt(max(1.0 - 4.0 * again * constant, 0.0))) / (2.0 * again)
+
+def _expected_emissions(column):
+    """Expected number of powers emitted by one roll on column."""
+    distribution = column_distribution(column)
+    again = distribution.get(ROLL_AGAIN, 0.0)
+    secondary = secondary_column(column)
+    if again == 0.0:
+        return 1.0
+    if secondary == column:
+        return (1.0 - again) / (1.0 - 2.0 * again)
+    return (1.0 - again) + 2.0 * again * _expected_emissions(secondary)
+
+def _numbers(number, luck):
+    """Number-of-rolls distribution for a fixed roll count, a fixed Luck or Luck rolled as usual."""
+    if number is not None:
+        return {number: 1.0}
+    if luck is not None:
+        return number_distribution(luck)
+    numbers = {}
+    for luck_value, luck_probability in _luck_distribution().items():
+        for count, probability in number_distribution(luck_value).items():
+            numbers[count] = numbers.get(count, 0.0) + luck_probability * probability
+    return numbers
+
+def _present_probability(origin, weights, number, luck):
+    """Probability that at least one weighted hit occurs across a character's rolls."""
+    miss = _miss_probability(origin, weights)
+    return sum(probability * (1.0 - miss ** count) for count, probability in _numbers(number, luck).items())
+
+def power_probability(origin, power, number=None, luck=None):
+    """
+    Exact probability that a character of an origin has a power.
+
+    Args:
+        origin (str): Origin name, e.g. "Mutant".
+        power (str): Power name, e.g. "Heightened Senses".
+        number (int): Number of rolls on the origin table. If None it is rolled as usual.
+        luck (int): Luck used for the roll-count bonus when number is None.
+                    If None Luck is rolled as usual too.
+
+    Returns:
+        float: Probability the power appears at least once in the character's power list.
+    """
+    return _present_probability(origin, {power: 1.0}, number, luck)
+
+def power_probabilities(origin, number=None, luck=None):
+    """
+    Exact probability of every power for an origin.
+
+    Args:
+        origin (str): Origin name, e.g. "Mutant".
+        number (int): Number of rolls on the origin table. If None it is rolled as usual.
+        luck (int): Luck for the roll-count bonus when number is None, rolled as usual if None.
+
+    Returns:
+        dict: Power name to probability, sorted from most to least likely.
+    """
+    names = set(column_distribution(origin)) | set(column_distribution(secondary_column(origin)))
+    names.discard(ROLL_AGAIN)
+    probabilities = {name: power_probability(origin, name, number, luck) for name in names}
+    return dict(sorted(probabilities.items(), key=lambda item: -item[1]))
+
+def expected_powers(origin, number=None, luck=None):
+    """
+    Expected number of powers in a character's power list.
+
+    Args:
+        origin (str): Origin name, e.g. "Mutant".
+        number (int): Number of rolls on the origin table. If None it is rolled as usual.
+        luck (int): Luck for the roll-count bonus when number is None, rolled as usual if None.
+
+    Returns:
+        dict: 'Listed' is the expected list length (repeats included) and 'Distinct'
+              the expected number of different powers.
+    """
+    numbers = _numbers(number, luck)
+    listed = _expected_emissions(origin) * sum(count * probability for count, probability in numbers.items())
+    distinct = sum(power_probabilities(origin, number, luck).values())
+    return {'Listed': listed, 'Distinct': distinct}
+
+def _device_weights(origin, powers, luck):
+    """Chance that each listed occurrence of a power becomes a device."""
+    rules = origins.rules
+    origin_id = rules.ids.get(origin)
+    if origin_id is None:
+        return {}
+    chance = 1.0
+    if rules.device_roll[origin_id]:
+        # d100 + Luck at or under the target
+        chance = min(max(int(rules.device_target[origin_id]) - (luck or 0), 0), 100) / 100.0
+    return {power: chance for power in powers if power in rules.devices[origin_id]}
+
+def _device_powers(origin):
+    """Device powers of an origin in power ID order."""
+    rules = origins.rules
+    origin_id = rules.ids.get(origin)
+    if origin_id is None:
+        return []
+    return sorted(rules.devices[origin_id], key=rules.power_ids.get)
+
+def device_probability(origin, number=None, luck=None, power=None):
+    """
+    Exact probability of device assignment under the origin device rules.
+
+    Args:
+        origin (str): Origin name, e.g. "Alien".
+        number (int): Number of rolls on the origin table. If None it is rolled as usual.
+        luck (int): Luck for the roll-count bonus and the Alien device roll. If None
+                    Luck is rolled as usual.
+        power (str): If given, the probability that this power is a device,
+                     otherwise the probability that the character has any device.
+
+    Returns:
+        float: Device probability.
+    """
+    if luck is None:
+        return sum(luck_probability * device_probability(origin, number, luck_value, power)
+                   for luck_value, luck_probability in _luck_distribution().items())
+    powers = [power] if power is not None else _device_powers(origin)
+    weights = _device_weights(origin, powers, luck)
+    if not weights:
+        return 0.0
+    return _present_probability(origin, weights, number, luck)
+
+def device_probabilities(origin, number=None, luck=None):
+    """
+    Exact probability that each device-eligible power is a device for an origin.
+
+    Args:
+        origin (str): Origin name, e.g. "Alien".
+        number (int): Number of rolls on the origin table. If None it is rolled as usual.
+        luck (int): Luck for the roll-count bonus and the Alien device roll, rolled as usual if None.
+
+    Returns:
+        dict: Power name to probability.
+    """
+    return {power: device_probability(origin, number, luck, power) for power in _device_powers(origin)}
@@ -0,0 +1,260 @@
+"""
+Super Squadron GM Module
+
+This module rolls NPC Reaction, Loyalty and Morale on data/gm.csv.
+
+Each table is rolled as a row from 0 to 100. The Reaction row's ReactionDM is
+added to the Loyalty roll, and the Loyalty row's MoraleDM is added to the Morale
+roll, with rows clamped to the table, as in the GM Tables notebook.
+
+simulate_morale() runs a group of NPCs through combat rounds as a state
+machine, with one numpy roll per NPC still fighting for each check:
+
+    1. Each NPC still fighting is hit on HIT_CHANCE percent, losing 1d20
+       percent of their HitPoints, and is down at 0.
+    2. An NPC who was hit and is not panicking retreats on a percentile roll
+       at or under their Ego's CompulsoryRetreat in characteristics.csv.
+    3. Otherwise their morale breaks on a roll at or under their Ego's
+       WillingRetreat, unless their Loyalty never checks morale.
+    4. A broken NPC rolls on the Morale table with their Loyalty MoraleDM. The
+       first word of the result sets their state: Suicidal, Kamikaze (one last
+       attack, then out), Defeated (surrenders), Retreats, Flees, or Panics,
+       which keeps them fighting for 1d4 rounds before they roll on the
+       Morale table again.
+"""
+
+import time
+
+import numpy as np
+
+from super_squadron.roll import roll_effects, roll_effects_batch, roll_ap_batch
+from super_squadron.tables import registry
+
+__all__ = [
+    'gm_table',
+    'HIT_CHANCE',
+    'MORALE_STATES',
+    'roll_reaction',
+    'roll_loyalty',
+    'roll_morale',
+    'roll_npc_reaction',
+    'roll_npc_reactions',
+    'simulate_morale'
+]
+
+# Percent chance that an NPC still fighting is hit in a round
+HIT_CHANCE = 50
+
+# States of simulate_morale(), by code
+MORALE_STATES = ['Fighting', 'Panicking', 'Down', 'Suicidal', 'Kamikaze', 'Defeated', 'Retreats', 'Flees']
+
+_FIGHTING, _PANICKING, _DOWN, _SUICIDAL, _KAMIKAZE, _DEFEATED, _RETREATS, _FLEES = range(len(MORALE_STATES))
+
+# States that count as routed in simulate_morale() curves
+_ROUTED = [_KAMIKAZE, _DEFEATED, _RETREATS, _FLEES]
+
+def _morale_states(morales):
+    """State code of each Morale table row, from the first word of its text."""
+    codes = []
+    for morale in morales:
+        state = str(morale).split('.')[0].split()[0] if str(morale).strip() else ''
+        if state == 'Panics':
+            state = 'Panicking'
+        if state not in MORALE_STATES[_PANICKING:]:
+            raise ValueError(f"gm.csv Morale {morale!r} does not start with a known state")
+        codes.append(MORALE_STATES.index(state))
+    return np.array(codes, dtype=np.int8)
+
+def _load_tables(tables):
+    """Module globals from a version of the data tables, with an empty _column() cache."""
+    gm = tables['gm']
+    characteristics = tables['characteristics']
+    return {'gm_table': gm, '_columns': {},
+            '_morale_codes': _morale_states(gm['Morale'].tolist()),
+            '_never_checks': np.array([str(loyalty).startswith('Suicidal') for loyalty in gm['Loyalty'].tolist()]),
+            '_retreat': (np.asarray(characteristics['Ego_CompulsoryRetreat'], dtype=np.int64),
+                         np.asarray(characteristics['Ego_WillingRetreat'], dtype=np.int64))}
+
+# Load the GM reaction, loyalty and morale table and the Ego retreat columns,
+# and rebind them whenever the tables are reloaded
+registry.subscribe(globals(), _load_tables)
+
+
+def _column(name):
+    """Values of a gm.csv column as a list of plain Python values."""
+    if name not in _columns:
+        _columns[name] = [value.item() if hasattr(value, 'item') else value for value in gm_table[name]]
+    return _columns[name]
+
+def _row(roll, dm):
+    """Clamp a modified roll to the table rows."""
+    return min(max(int(roll) + int(dm), 0), len(gm_table) - 1)
+
+@registry.reading()
+def roll_reaction(dm=0):
+    """
+    Roll an NPC reaction.
+
+    Args:
+        dm (int): Modifier added to the roll, e.g. a Charisma reaction effect.
+
+    Returns:
+        dict: 'Reaction' description and 'ReactionDM' for the loyalty roll.
+    """
+    row = _row(roll_effects(1, len(gm_table)) - 1, dm)
+    return {'Reaction': _column('Reaction')[row], 'ReactionDM': _column('Reaction_ReactionDM')[row]}
+
+@registry.reading()
+def roll_loyalty(reaction_dm=0):
+    """
+    Roll an NPC's loyalty.
+
+    Args:
+        reaction_dm (int): ReactionDM from roll_reaction().
+
+    Returns:
+        dict: 'Loyalty' description and 'MoraleDM' for morale rolls.
+    """
+    row = _row(roll_effects(1, len(gm_table)) - 1, reaction_dm)
+    return {'Loyalty': _column('Loyalty')[row], 'MoraleDM': _column('Loyalty_MoraleDM')[row]}
+
+@registry.reading()
+def roll_morale(morale_dm=0):
+    """
+    Roll an NPC's morale.
+
+    Args:
+        morale_dm (int): MoraleDM from roll_loyalty().
+
+    Returns:
+        dict: 'Morale' description.
+    """
+    row = _row(roll_effects(1, len(gm_table)) - 1, morale_dm)
+    return {'Morale': _column('Morale')[row]}
+
+@registry.reading()
+def roll_npc_reaction(dm=0):
+    """
+    Roll Reaction, then Loyalty and Morale with the resulting modifiers.
+
+    Args:
+        dm (int): Modifier added to the reaction roll.
+
+    Returns:
+        dict: Reaction, ReactionDM, Loyalty, MoraleDM and Morale.
+    """
+    npc = roll_reaction(dm)
+    npc.update(roll_loyalty(npc['ReactionDM']))
+    npc.update(roll_morale(npc['MoraleDM']))
+    return npc
+
+def _loyalty_rows(count, dm):
+    """Reaction and Loyalty table rows of count NPCs, rolled with numpy."""
+    last = len(gm_table) - 1
+    reaction_dms = np.asarray(gm_table['Reaction_ReactionDM'], dtype=np.int64)
+    formula = f'1d{last + 1}'
+    reaction_rows = np.clip(np.asarray(roll_ap_batch(formula, count), dtype=np.int64) - 1
+                            + np.asarray(dm, dtype=np.int64), 0, last)
+    loyalty_rows = np.clip(np.asarray(roll_ap_batch(formula, count), dtype=np.int64) - 1
+                           + reaction_dms[reaction_rows], 0, last)
+    return reaction_rows, loyalty_rows
+
+@registry.reading()
+def roll_npc_reactions(count, dm=0):
+    """
+    Roll many NPC reactions at once with numpy.
+
+    Args:
+        count (int): Number of NPCs.
+        dm (int or sequence): Reaction modifier, one for all NPCs or one per NPC.
+
+    Returns:
+        list: count dictionaries as from roll_npc_reaction().
+    """
+    reaction_rows, loyalty_rows = _loyalty_rows(count, dm)
+    last = len(gm_table) - 1
+    morale_dms = np.asarray(gm_table['Loyalty_MoraleDM'], dtype=np.int64)
+    morale_rows = np.clip(np.asarray(roll_ap_batch(f'1d{last + 1}', count), dtype=np.int64) - 1
+                          + morale_dms[loyalty_rows], 0, last)
+    reactions, reaction_dm = _column('Reaction'), _column('Reaction_ReactionDM')
+    loyalties, morale_dm = _column('Loyalty'), _column('Loyalty_MoraleDM')
+    morales = _column('Morale')
+    return [{'Reaction': reactions[reaction], 'ReactionDM': reaction_dm[reaction],
+             'Loyalty': loyalties[loyalty], 'MoraleDM': morale_dm[loyalty], 'Morale': morales[morale]}
+            for reaction, loyalty, morale in zip(reaction_rows.tolist(), loyalty_rows.tolist(), morale_rows.tolist())]
+
+@registry.reading()
+def simulate_morale(egos, rounds=50, dm=0, morale_dms=None, hit_chance=HIT_CHANCE):
+    """
+    Simulate morale and retreat for a group of NPCs over successive combat rounds.
+
+    Args:
+        egos (sequence): Ego of each NPC, e.g. [Character['Statistics']['Ego'] for Character in mob].
+        rounds (int): Combat rounds.
+        dm (int or sequence): Reaction modifier for the Reaction and Loyalty rolls
+                              that give each NPC's MoraleDM.
+        morale_dms (sequence): MoraleDM of each NPC, or one for all. If given,
+                               Reaction and Loyalty are not rolled and every NPC
+                               checks morale.
+        hit_chance (int): Percent chance that an NPC still fighting is hit in a round.
+
+    Returns:
+        dict: 'NPCs', 'Rounds', 'States' (MORALE_STATES), 'Counts' (numpy array
+              of NPCs in each state after each round, row 0 before the first),
+              the curves 'Fighting' (fighting or panicking), 'Survival' (not down
+              or dead) and 'Rout' (Kamikaze, Defeated, Retreats or Flees) as
+              fractions of the group after each round, and 'Seconds'.
+    """
+    start = time.perf_counter()
+    last = len(gm_table) - 1
+    compulsory_table, willing_table = _retreat
+    ego_rows = np.clip(np.asarray(egos, dtype=np.int64), 0, len(compulsory_table) - 1)
+    compulsory, willing = compulsory_table[ego_rows], willing_table[ego_rows]
+    count = len(ego_rows)
+    if morale_dms is None:
+        reaction_rows, loyalty_rows = _loyalty_rows(count, dm)
+        morale_dms = np.asarray(gm_table['Loyalty_MoraleDM'], dtype=np.int64)[loyalty_rows]
+        checks = ~_never_checks[loyalty_rows]
+    else:
+        morale_dms = np.broadcast_to(np.asarray(morale_dms, dtype=np.int64), (count,))
+        checks = np.ones(count, dtype=bool)
+
+    state = np.full(count, _FIGHTING, dtype=np.int8)
+    health = np.full(count, 100, dtype=np.int64)
+    timer = np.zeros(count, dtype=np.int64)
+    counts = np.zeros((rounds + 1, len(MORALE_STATES)), dtype=np.int64)
+    counts[0] = np.bincount(state, minlength=len(MORALE_STATES))
+
+    def morale(rows):
+        """Roll rows on the Morale table, setting their state and any panic rounds."""
+        table_rows = np.clip(roll_effects_batch(1, last + 1, len(rows)) - 1 + morale_dms[rows], 0, last)
+        state[rows] = _morale_codes[table_rows]
+        panicking = rows[state[rows] == _PANICKING]
+        timer[panicking] = roll_effects_batch(1, 4, len(panicking))
+
+    for round_number in range(1, rounds + 1):
+        active = np.flatnonzero(state <= _PANICKING)
+        if len(active):
+            hit = active[roll_effects_batch(1, 100, len(active)) <= hit_chance]
+            health[hit] -= roll_effects_batch(1, 20, len(hit))
+            state[hit[health[hit] <= 0]] = _DOWN
+            hit = hit[health[hit] > 0]
+
+            # Panic runs out, and the NPC rolls on the Morale table again
+            panicking = active[state[active] == _PANICKING]
+            timer[panicking] -= 1
+            morale(panicking[timer[panicking] <= 0])
+
+            fighting = hit[state[hit] == _FIGHTING]
+            forced = roll_effects_batch(1, 100, len(fighting)) <= compulsory[fighting]
+            state[fighting[forced]] = _RETREATS
+            fighting = fighting[~forced & checks[fighting]]
+            morale(fighting[roll_effects_batch(1, 100, len(fighting)) <= willing[fighting]])
+        counts[round_number] = np.bincount(state, minlength=len(MORALE_STATES))
+
+    size = max(count, 1)
+    return {'NPCs': count, 'Rounds': rounds, 'States': list(MORALE_STATES), 'Counts': counts,
+            'Fighting': counts[:, [_FIGHTING, _PANICKING]].sum(axis=1) / size,
+            'Survival': 1.0 - counts[:, [_DOWN, _SUICIDAL]].sum(axis=1) / size,
+            'Rout': counts[:, _ROUTED].sum(axis=1) / size,
+            'Seconds': time.perf_counter() - start}
@@ -0,0 +1,445 @@
+"""
+Super Squadron Index Module
+
+This module keeps an in-memory inverted index over a roster of characters so
+interactive tools can answer questions such as "Designed or Sponsored characters
+with a Flight device" or "Invisibility with Special 'Permanently invisible'"
+without scanning every Character['Powers']['Detail'].
+
+Origins, powers and devices map to bitmaps (packed numpy uint8 arrays with one
+bit per character ID) which are combined with bitwise AND. Scalar power detail
+fields have far more distinct values and are mostly sparse, so they map to
+posting sets instead. Numeric columns are kept as arrays indexed by character
+ID together with a sorted copy for range lookups. Changes since the sorted
+copies were last built are tracked as pending and re-checked against the
+current values, so adding or updating a character never re-sorts the roster.
+"""
+
+import numpy as np
+
+from super_squadron.roster import STAT_COLUMNS, DERIVED_COLUMNS
+
+__all__ = [
+    'NUMERIC_COLUMNS',
+    'RosterIndex'
+]
+
+NUMERIC_COLUMNS = ['Age'] + STAT_COLUMNS + DERIVED_COLUMNS + ['Height', 'Weight', 'Pay']
+
+# Pending changes are merged into the sorted arrays once there are this many,
+# or one sixteenth of the roster if that is larger
+MERGE_MINIMUM = 1024
+
+BITMAP_TABLES = ('origins', 'powers', 'devices')
+
+
+def _number(value):
+    """Numeric column value, NaN when missing or not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _column_value(Character, column):
+    """Get a numeric column from a character dictionary."""
+    if column in STAT_COLUMNS:
+        return _number(Character.get('Statistics', {}).get(column))
+    if column == 'Age':
+        return _number(Character.get('Origin', {}).get('Age'))
+    return _number(Character.get(column))
+
+def _detail_value(value):
+    """Hashable form of a power detail value, or None if the value is not indexed."""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return None
+
+def _bitmap_ids(bitmap, size):
+    """Character IDs whose bit is set in a bitmap, in ascending order."""
+    # Unpack only the non-zero bytes, bitmaps are usually sparse
+    used = np.flatnonzero(bitmap[:-(-size // 8)])
+    rows, bits = np.nonzero(np.unpackbits(bitmap[used, None], axis=1, bitorder='little'))
+    character_ids = used[rows] * 8 + bits
+    return character_ids[character_ids < size]
+
+def _bitmap_contains(bitmap, character_ids):
+    """Mask of the character IDs whose bit is set in a bitmap."""
+    return ((bitmap[character_ids >> 3] >> (character_ids & 7).astype(np.uint8)) & 1).astype(bool)
+
+def _bounds(column, minimum, maximum):
+    """Check a numeric column name and turn optional bounds into floats."""
+    if column not in NUMERIC_COLUMNS:
+        raise ValueError(f"Cannot filter on {column}. Expected one of {NUMERIC_COLUMNS}")
+    low = -np.inf if minimum is None else minimum
+    high = np.inf if maximum is None else maximum
+    return low, high
+
+def _terms(Character):
+    """Posting keys for a character, grouped by posting table."""
+    origin = Character.get('Origin', {}).get('Origin')
+    powers = Character.get('Powers', {})
+    power_names = set(powers.get('List', []))
+    devices = set()
+    details = set()
+    for power, detail in powers.get('Detail', {}).items():
+        power_names.add(power)
+        if not isinstance(detail, dict):
+            continue
+        if 'Device' in detail:
+            devices.add(power)
+        for field, value in detail.items():
+            value = _detail_value(value)
+            if value is not None:
+                details.add((power, field, value))
+    return {
+        'origins': {origin} if origin is not None else set(),
+        'powers': power_names,
+        'devices': devices,
+        'details': details
+    }
+
+
+class RosterIndex:
+    """
+    In-memory inverted index over a roster of characters.
+
+    Character IDs are positions in insertion order and stay stable when other
+    characters are updated or removed. A character changed in place must be
+    removed (or updated with a changed copy) so its old postings can be found.
+
+    Attributes:
+        characters (list): Indexed character dictionaries by ID, None once removed.
+    """
+
+    def __init__(self, characters=()):
+        self.characters = []
+        self._bitmaps = {table: {} for table in BITMAP_TABLES}
+        self._details = {}
+        self._values = {column: np.empty(0) for column in NUMERIC_COLUMNS}
+        self._alive = np.zeros(0, dtype=bool)
+        self._stale = np.zeros(0, dtype=bool)
+        self._sorted = {column: (np.zeros(0, dtype=np.int64), np.empty(0)) for column in NUMERIC_COLUMNS}
+        self._pending = set()
+        self._count = 0
+        self.extend(characters)
+
+    def __repr__(self):
+        return f'RosterIndex({self._count} characters)'
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, character_id):
+        return 0 <= character_id < len(self.characters) and self.characters[character_id] is not None
+
+    def get(self, character_id):
+        """
+        Get an indexed character.
+
+        Args:
+            character_id (int): Character ID.
+
+        Returns:
+            dict: Character dictionary.
+        """
+        if character_id not in self:
+            raise KeyError(character_id)
+        return self.characters[character_id]
+
+    def _grow(self, size):
+        """Make room in the arrays and bitmaps for size characters."""
+        capacity = len(self._alive)
+        if size <= capacity:
+            return
+        # Keep the capacity a multiple of 8 so bitmaps have whole bytes
+        capacity = -(-max(size, capacity * 2, 1024) // 8) * 8
+        for column, values in self._values.items():
+            self._values[column] = np.concatenate([values, np.full(capacity - len(values), np.nan)])
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+        self._stale = np.concatenate([self._stale, np.zeros(capacity - len(self._stale), dtype=bool)])
+        for bitmaps in self._bitmaps.values():
+            for key, bitmap in bitmaps.items():
+                bitmaps[key] = np.concatenate([bitmap, np.zeros(capacity // 8 - len(bitmap), dtype=np.uint8)])
+
+    def _index(self, character_id, Character):
+        """Add a character's postings and numeric values."""
+        terms = _terms(Character)
+        byte = character_id >> 3
+        bit = np.uint8(1 << (character_id & 7))
+        for table in BITMAP_TABLES:
+            bitmaps = self._bitmaps[table]
+            for key in terms[table]:
+                bitmap = bitmaps.get(key)
+                if bitmap is None:
+                    bitmap = bitmaps[key] = np.zeros(len(self._alive) // 8, dtype=np.uint8)
+                bitmap[byte] |= bit
+        for key in terms['details']:
+            self._details.setdefault(key, set()).add(character_id)
+        for column in NUMERIC_COLUMNS:
+            self._values[column][character_id] = _column_value(Character, column)
+        self._alive[character_id] = True
+        self._mark_pending(character_id)
+        self._count += 1
+
+    def _unindex(self, character_id):
+        """Remove a character's postings and numeric values."""
+        terms = _terms(self.characters[character_id])
+        byte = character_id >> 3
+        mask = np.uint8(0xFF ^ (1 << (character_id & 7)))
+        for table in BITMAP_TABLES:
+            bitmaps = self._bitmaps[table]
+            for key in terms[table]:
+                if key in bitmaps:
+                    bitmaps[key][byte] &= mask
+        for key in terms['details']:
+            members = self._details.get(key)
+            if members is not None:
+                members.discard(character_id)
+                if not members:
+                    del self._details[key]
+        for column in NUMERIC_COLUMNS:
+            self._values[column][character_id] = np.nan
+        self._alive[character_id] = False
+        self._mark_pending(character_id)
+        self._count -= 1
+
+    def _mark_pending(self, character_id):
+        """Record that a character's sorted array entries may be stale."""
+        self._pending.add(character_id)
+        self._stale[character_id] = True
+
+    def _merge(self, force=False):
+        """Rebuild the sorted arrays once enough changes are pending."""
+        if not self._pending:
+            return
+        if not force and len(self._pending) < max(MERGE_MINIMUM, len(self.characters) // 16):
+            return
+        character_ids = np.flatnonzero(self._alive[:len(self.characters)])
+        for column in NUMERIC_COLUMNS:
+            values = self._values[column][character_ids]
+            order = np.argsort(values, kind='stable')
+            self._sorted[column] = (character_ids[order], values[order])
+        self._stale[:] = False
+        self._pending = set()
+
+    def add(self, Character):
+        """
+        Index a character.
+
+        Args:
+            Character (dict): Character dictionary.
+
+        Returns:
+            int: Assigned character ID.
+        """
+        character_id = len(self.characters)
+        self._grow(character_id + 1)
+        self.characters.append(Character)
+        self._index(character_id, Character)
+        self._merge()
+        return character_id
+
+    def extend(self, characters):
+        """
+        Index several characters, building the sorted arrays once at the end.
+
+        Args:
+            characters (iterable): Character dictionaries.
+
+        Returns:
+            list: Assigned character IDs.
+        """
+        characters = list(characters)
+        first_id = len(self.characters)
+        self._grow(first_id + len(characters))
+        for character_id, Character in enumerate(characters, first_id):
+            self.characters.append(Character)
+            self._index(character_id, Character)
+        self._merge(force=True)
+        return list(range(first_id, first_id + len(characters)))
+
+    def update(self, character_id, Character):
+        """
+        Re-index a character after it has changed.
+
+        Args:
+            character_id (int): Character ID.
+            Character (dict): New character dictionary. This must not be the
+                              indexed dictionary modified in place.
+        """
+        if self.get(character_id) is Character:
+            raise ValueError("Character was modified in place so its old postings are unknown. "
+                             "Pass a changed copy, or remove() it before changing it and add() it again.")
+        self._unindex(character_id)
+        self.characters[character_id] = Character
+        self._index(character_id, Character)
+        self._merge()
+
+    def remove(self, character_id):
+        """
+        Remove a character from the index.
+
+        Args:
+            character_id (int): Character ID.
+        """
+        self.get(character_id)
+        self._unindex(character_id)
+        self.characters[character_id] = None
+        self._merge()
+
+    def _bitmap_set(self, table, key):
+        """Character IDs set in a bitmap, as a frozenset."""
+        bitmap = self._bitmaps[table].get(key)
+        if bitmap is None:
+            return frozenset()
+        return frozenset(_bitmap_ids(bitmap, len(self.characters)).tolist())
+
+    def origin(self, name):
+        """
+        Get the IDs of characters of an origin.
+
+        Args:
+            name (str): Origin name, e.g. "Alien".
+
+        Returns:
+            frozenset: Character IDs.
+        """
+        return self._bitmap_set('origins', name)
+
+    def power(self, name):
+        """
+        Get the IDs of characters with a power.
+
+        Args:
+            name (str): Power name, e.g. "Force Beam".
+
+        Returns:
+            frozenset: Character IDs.
+        """
+        return self._bitmap_set('powers', name)
+
+    def device(self, name):
+        """
+        Get the IDs of characters with a power as a device.
+
+        Args:
+            name (str): Power name, e.g. "Flight".
+
+        Returns:
+            frozenset: Character IDs.
+        """
+        return self._bitmap_set('devices', name)
+
+    def detail(self, power, field, value):
+        """
+        Get the IDs of characters with a power detail field equal to value.
+
+        Args:
+            power (str): Power name, e.g. "Invisibility".
+            field (str): Detail field, e.g. "Special".
+            value: Detail value, e.g. "Permanently invisible".
+
+        Returns:
+            frozenset: Character IDs.
+        """
+        return frozenset(self._details.get((power, field, value), ()))
+
+    def _range_ids(self, column, low, high):
+        """Character IDs with a column in [low, high], as an array."""
+        sorted_ids, sorted_values = self._sorted[column]
+        start = np.searchsorted(sorted_values, low, side='left')
+        stop = np.searchsorted(sorted_values, high, side='right')
+        character_ids = sorted_ids[start:stop]
+        if not self._pending:
+            return character_ids
+        # Entries changed since the last merge may be stale, so take the pending
+        # IDs out of the slice and check their current values instead
+        pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+        character_ids = np.concatenate([character_ids[~self._stale[character_ids]], pending])
+        return self._filter(character_ids, column, low, high)
+
+    def _filter(self, character_ids, column, low, high):
+        """Keep the IDs whose current column value is in [low, high]."""
+        values = self._values[column][character_ids]
+        return character_ids[(values >= low) & (values <= high)]
+
+    def stat_range(self, column, minimum=None, maximum=None):
+        """
+        Get the IDs of characters with a numeric column in a range.
+
+        Args:
+            column (str): Column from NUMERIC_COLUMNS, e.g. "ActionPotential".
+            minimum (float): Inclusive lower bound, None for no bound.
+            maximum (float): Inclusive upper bound, None for no bound.
+
+        Returns:
+            frozenset: Character IDs.
+        """
+        low, high = _bounds(column, minimum, maximum)
+        return frozenset(self._range_ids(column, low, high).tolist())
+
+    def select(self, origin=None, powers=None, devices=None, details=None, ranges=None):
+        """
+        Get the IDs of characters matching every condition.
+
+        Bitmaps are combined with bitwise AND, detail posting sets are intersected
+        smallest first and checked against the bitmap, and ranges are applied to
+        the surviving IDs, so no condition scans the character dictionaries.
+
+        Args:
+            origin (str or list): Origin name, or a list of origins to match any of.
+            powers (list): Power names the character must all have.
+            devices (list): Power names the character must all have as devices.
+            details (list): (power, field, value) tuples that must all match.
+            ranges (dict): Column name to inclusive (minimum, maximum), either may be None.
+
+        Returns:
+            list: Matching character IDs in ascending order.
+        """
+        size = len(self.characters)
+        bounds = {column: _bounds(column, *limits) for column, limits in (ranges or {}).items()}
+        keys = []
+        if origin is not None:
+            origins = [origin] if isinstance(origin, str) else list(origin)
+            keys.append([('origins', name) for name in origins])
+        keys.extend([('powers', name)] for name in powers or [])
+        keys.extend([('devices', name)] for name in devices or [])
+
+        bitmap = None
+        for alternatives in keys:
+            maps = [self._bitmaps[table][key] for table, key in alternatives if key in self._bitmaps[table]]
+            if not maps:
+                return []
+            combined = np.bitwise_or.reduce(maps) if len(maps) > 1 else maps[0]
+            bitmap = combined if bitmap is None else bitmap & combined
+
+        if details:
+            postings = sorted((self._details.get(tuple(key), set()) for key in details), key=len)
+            matches = postings[0].intersection(*postings[1:])
+            character_ids = np.fromiter(matches, dtype=np.int64, count=len(matches))
+            if bitmap is not None:
+                character_ids = character_ids[_bitmap_contains(bitmap, character_ids)]
+        elif bitmap is not None:
+            character_ids = _bitmap_ids(bitmap, size)
+        elif bounds:
+            # Start from the narrowest range
+            candidates = [self._range_ids(column, low, high) for column, (low, high) in bounds.items()]
+            character_ids = min(candidates, key=len)
+        else:
+            character_ids = np.flatnonzero(self._alive[:size])
+
+        for column, (low, high) in bounds.items():
+            character_ids = self._filter(character_ids, column, low, high)
+        return np.sort(character_ids).tolist()
+
+    def query(self, origin=None, powers=None, devices=None, details=None, ranges=None):
+        """
+        Get the characters matching every condition. Arguments are as for select().
+
+        Returns:
+            list: Matching character dictionaries in ID order.
+        """
+        return [self.characters[character_id]
+                for character_id in self.select(origin, powers, devices, details, ranges)]
@@ -0,0 +1,363 @@
+"""
+Super Squadron Matching Module
+
+This module generates characters that meet a GM's constraints, such as "an
+Alien with Flight and Invisibility, ActionPotential 50 or more", without
+generating whole characters until one happens to match.
+
+Constraints are a dictionary:
+
+    'Origin'     an origin name, or a list of allowed origins
+    'Powers'     powers the character must have
+    'Devices'    powers the character must have as devices
+    <field>      (low, high) bounds, either None for no bound, on a statistic
+                 (e.g. 'Luck'), 'HitPoints', 'ActionPotential', 'DirectDamage',
+                 'Age', 'Height', 'Weight', 'Pay' or 'PatrolDM'
+
+The origin, Luck and number of rolls on the origin table are drawn together
+from their exact conditional distribution: the usual probability of each
+combination times the probability, from the origin tables in data/powers.csv
+and the device rules in data/origins.csv, that its rolls give the required
+powers and devices (inclusion-exclusion over the frequency module's miss
+probabilities). Power lists are then rolled in numpy batches for that origin
+and roll count until one holds the required powers and devices; these batches
+are sized from the known probability.
+
+The other constraints are residual. Main statistics are rolled in batches and
+those over an upper bound are rejected at once, as powers only raise
+statistics. Derived values are checked once statistic effects are rolled,
+physical and job details are re-rolled on their own until they match, and
+the finished character is checked against everything. generate_matching()
+reports how many candidates it needed.
+"""
+
+import itertools
+
+import numpy as np
+
+from super_squadron import origins
+from super_squadron.character import (apply_powers, assign_devices, derive_statistics, roll_job, roll_other_skill,
+                                      roll_physical, roll_powers_batch, roll_statistic_effects)
+from super_squadron.formulas import STATISTICS
+from super_squadron.frequency import _device_weights, _luck_distribution, _miss_probability, number_distribution
+from super_squadron.roll import keyed_generator, roll_effects_batch, set_generator
+from super_squadron.tables import registry
+
+__all__ = [
+    'DERIVED_FIELDS',
+    'PHYSICAL_FIELDS',
+    'NUMERIC_FIELDS',
+    'parse_constraints',
+    'matches',
+    'forced_distribution',
+    'generate_matching'
+]
+
+DERIVED_FIELDS = ['HitPoints', 'ActionPotential', 'DirectDamage']
+
+# Fields rolled by the physical and job stage, which can be re-rolled on their own
+PHYSICAL_FIELDS = ['Height', 'Weight', 'Pay', 'PatrolDM']
+
+NUMERIC_FIELDS = STATISTICS + DERIVED_FIELDS + ['Age'] + PHYSICAL_FIELDS
+
+# Statistics rolled by roll_main_statistics(), then Ego
+_ROLLED_STATISTICS = ['Strength', 'Agility', 'Charisma', 'Intelligence', 'Stamina', 'Ego']
+
+# Sides of the die that picks from the forced distribution
+_RESOLUTION = 2 ** 30
+
+# Most power lists rolled in one batch
+_MAX_LIST_BATCH = 1024
+
+
+def parse_constraints(constraints):
+    """
+    Check and normalize a constraints dictionary.
+
+    Args:
+        constraints (dict): Constraints as described in the module docstring.
+                            A single number for a field means exactly that value.
+
+    Returns:
+        dict: 'Origins' (list of allowed origin names), 'Powers' and 'Devices'
+              (frozensets) and 'Bounds' (field to (low, high)).
+    """
+    rules = origins.rules
+    parsed = {'Origins': list(rules.names), 'Powers': frozenset(), 'Devices': frozenset(), 'Bounds': {}}
+    for key, value in constraints.items():
+        if key == 'Origin':
+            allowed = [value] if isinstance(value, str) else list(value)
+            unknown = [origin for origin in allowed if origin not in rules.ids]
+            if unknown:
+                raise ValueError(f"Unknown origins {unknown}, expected names from {rules.names}")
+            parsed['Origins'] = [origin for origin in rules.names if origin in allowed]
+        elif key in ('Powers', 'Devices'):
+            powers = frozenset([value] if isinstance(value, str) else value)
+            unknown = sorted(powers - rules.power_ids.keys())
+            if unknown:
+                raise ValueError(f"Unknown powers {unknown}")
+            parsed[key] = powers
+        elif key in NUMERIC_FIELDS:
+            if isinstance(value, (int, float)):
+                low, high = value, value
+            else:
+                low, high = value
+            parsed['Bounds'][key] = (low, high)
+        else:
+            raise ValueError(f"Unknown constraint {key!r}, expected 'Origin', 'Powers', 'Devices' "
+                             f"or one of {NUMERIC_FIELDS}")
+    return parsed
+
+def _number(value):
+    """A field value as a number, or None for text such as an unrolled pay formula."""
+    if isinstance(value, (int, float, np.integer)):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _within(value, bounds):
+    """Whether a value is inside (low, high) bounds."""
+    low, high = bounds
+    value = _number(value)
+    return value is not None and (low is None or value >= low) and (high is None or value <= high)
+
+def _field(Character, field):
+    """Value of a numeric constraint field of a character."""
+    if field in STATISTICS:
+        return Character['Statistics'][field]
+    if field == 'Age':
+        return Character['Origin']['Age']
+    return Character[field]
+
+def _fields_within(Character, bounds, fields):
+    """Whether the character is inside the bounds on each of fields that has bounds."""
+    return all(_within(_field(Character, field), bounds[field]) for field in fields if field in bounds)
+
+def matches(Character, constraints):
+    """
+    Check a finished character against constraints.
+
+    Args:
+        Character (dict): Character dictionary, as generate_character() returns it.
+        constraints (dict): Constraints, or the result of parse_constraints().
+
+    Returns:
+        bool: Whether the character meets every constraint.
+    """
+    parsed = constraints if 'Bounds' in constraints else parse_constraints(constraints)
+    powers = Character['Powers']
+    if Character['Origin']['Origin'] not in parsed['Origins']:
+        return False
+    if not parsed['Powers'] <= set(powers['List']):
+        return False
+    if any('Device' not in powers['Detail'].get(power, {}) for power in parsed['Devices']):
+        return False
+    return _fields_within(Character, parsed['Bounds'], NUMERIC_FIELDS)
+
+def forced_distribution(parsed):
+    """
+    Exact joint distribution of origin, Luck and number of rolls given the
+    origin, Luck, power and device constraints.
+
+    Args:
+        parsed (dict): Result of parse_constraints().
+
+    Returns:
+        dict: 'Entries' (list of (origin, luck, number) combinations that can
+              meet the constraints), 'Weights' (numpy array, the probability
+              of each combination and of meeting the constraints with it),
+              'Cover' (numpy array, the probability that a power list rolled
+              for each combination meets the power and device constraints)
+              and 'Probability' (sum of Weights, the chance that an ordinary
+              character meets these constraints).
+    """
+    rules = origins.rules
+    devices = parsed['Devices']
+    items = sorted(parsed['Powers'] | devices)
+    subsets = [subset for size in range(len(items) + 1) for subset in itertools.combinations(items, size)]
+    faces = np.bincount(rules.by_roll[1:], minlength=len(rules.names))
+    luck_bounds = parsed['Bounds'].get('Luck', (None, None))
+    entries, weights, covers = [], [], []
+    for origin in parsed['Origins']:
+        origin_probability = faces[rules.ids[origin]] / rules.sides
+        for luck, luck_probability in _luck_distribution().items():
+            if not _within(luck, luck_bounds):
+                continue
+            chances = _device_weights(origin, devices, luck)
+            # A required device only counts when the listed power becomes a device
+            hits = {power: chances.get(power, 0.0) if power in devices else 1.0 for power in items}
+            misses = [((-1) ** len(subset), _miss_probability(origin, {power: hits[power] for power in subset}))
+                      for subset in subsets]
+            for number, number_probability in number_distribution(luck).items():
+                cover = sum(sign * miss ** number for sign, miss in misses)
+                if cover <= 1e-15:
+                    continue
+                entries.append((origin, luck, number))
+                weights.append(origin_probability * luck_probability * number_probability * cover)
+                covers.append(cover)
+    weights = np.array(weights, dtype=np.float64)
+    return {'Entries': entries, 'Weights': weights, 'Cover': np.array(covers, dtype=np.float64),
+            'Probability': float(weights.sum())}
+
+def _choose(weights, size):
+    """Indices drawn with the given weights, through the dice so seeds and hooks see them."""
+    cumulative = np.cumsum(weights)
+    uniforms = (roll_effects_batch(1, _RESOLUTION, size) - 0.5) / _RESOLUTION * cumulative[-1]
+    return np.minimum(np.searchsorted(cumulative, uniforms, side='right'), len(weights) - 1)
+
+def _roll_statistics(size):
+    """Main statistics (rerolled until over 60, as roll_main_statistics()) and Ego for size characters."""
+    rows = []
+    needed = size
+    while needed > 0:
+        draws = roll_effects_batch(1, 20, needed * 5).reshape(needed, 5)
+        kept = draws[draws.sum(axis=1) > 60]
+        rows.append(kept)
+        needed = needed - len(kept)
+    main = np.concatenate(rows)
+    return np.column_stack([main, roll_effects_batch(1, 20, size)])
+
+def _roll_powers(origin, luck, number, cover, parsed, report):
+    """Roll power lists in batches until one has the required powers and devices."""
+    required = parsed['Powers'] | parsed['Devices']
+    devices = parsed['Devices']
+    size = int(min(max(1.0 / cover, 1.0), _MAX_LIST_BATCH))
+    while True:
+        power_lists = roll_powers_batch(origin, number, size)
+        report['PowerLists'] = report['PowerLists'] + size
+        covering = [powers_list for powers_list in power_lists if required <= set(powers_list)]
+        if not covering:
+            continue
+        if not devices:
+            return covering[0], None
+        marked = origins.assign_devices_batch([origin] * len(covering), covering, [luck] * len(covering))
+        for powers_list, device_list in zip(covering, marked):
+            if devices <= set(device_list):
+                return powers_list, device_list
+
+def _candidate(entry, cover, rolled, parsed, report, max_attempts):
+    """
+    Build one candidate character, or return the stage that rejected it.
+
+    Returns:
+        dict or str: The character, or 'Derived' or 'Final'.
+    """
+    origin, luck, number = entry
+    bounds = parsed['Bounds']
+    Statistics = dict(zip(_ROLLED_STATISTICS[:5], rolled[:5]))
+    Statistics.update({'PublicStanding': 11, 'Ego': rolled[5], 'Luck': luck})
+    effects = {'Statistics': Statistics}
+    roll_statistic_effects(effects)
+    derive_statistics(effects)
+    if not _fields_within(effects, bounds, DERIVED_FIELDS):
+        return 'Derived'
+
+    Origin = origins.roll_origin(origin)
+    Origin['Age'] = int(Origin['Age'])
+    if Origin['Lifespan'] != 'Human':
+        Origin['Lifespan'] = int(Origin['Lifespan'])
+    powers_list, device_list = _roll_powers(origin, luck, number, cover, parsed, report)
+    Character = {'Statistics': Statistics, 'Origin': Origin,
+                 'Powers': {'Number': len(powers_list), 'List': powers_list,
+                            'Detail': {power: {} for power in powers_list}}}
+    if device_list is None:
+        assign_devices(Character)
+    else:
+        for power in device_list:
+            Character['Powers']['Detail'][power]['Device'] = {}
+    Character.update((key, value) for key, value in effects.items() if key != 'Statistics')
+
+    while True:
+        # Physical and job details do not depend on anything constrained, so
+        # they are re-rolled alone
+        report['PhysicalRolls'] = report['PhysicalRolls'] + 1
+        if report['PhysicalRolls'] > max_attempts:
+            raise RuntimeError(f"No physical and job roll matched {bounds} in {max_attempts} attempts")
+        roll_physical(Character)
+        roll_job(Character)
+        roll_other_skill(Character)
+        if _fields_within(Character, bounds, PHYSICAL_FIELDS):
+            break
+    apply_powers(Character)
+    if not matches(Character, parsed):
+        return 'Final'
+    return Character
+
+@registry.reading()
+def generate_matching(constraints, n=1, seed=None, max_attempts=1000000):
+    """
+    Generate characters that meet constraints.
+
+    The characters follow the same distribution as generate_character()
+    characters that meet the constraints.
+
+    Args:
+        constraints (dict): Constraints as described in the module docstring.
+        n (int): Number of characters.
+        seed (int): If given, dice come from Philox generators keyed on it, one
+                    for the batches and one for each candidate, so the same call
+                    gives the same characters.
+        max_attempts (int): Most candidates tried before giving up.
+
+    Returns:
+        dict: 'Characters' (list of n Character dictionaries), 'Attempts'
+              (candidates tried), 'AcceptanceRate' (n / Attempts), 'Rejected'
+              (candidates rejected at 'Statistics', 'Derived' and 'Final'),
+              'PowerLists' and 'PhysicalRolls' (power lists and physical and
+              job details rolled), and 'Probability' (chance that an ordinary
+              character meets the origin, Luck, power and device constraints).
+    """
+    parsed = parse_constraints(constraints)
+    forced = forced_distribution(parsed)
+    if not forced['Entries']:
+        raise ValueError(f"No character can meet the constraints {constraints}")
+    highs = np.array([parsed['Bounds'].get(stat, (None, None))[1] for stat in _ROLLED_STATISTICS], dtype=object)
+    bounded = np.array([high is not None for high in highs])
+    limits = np.where(bounded, highs, 0).astype(np.int64)
+
+    report = {'Attempts': 0, 'Rejected': {'Statistics': 0, 'Derived': 0, 'Final': 0},
+              'PowerLists': 0, 'PhysicalRolls': 0}
+    characters = []
+    if seed is not None:
+        driver = keyed_generator(seed)
+        previous = set_generator(driver)
+    try:
+        while len(characters) < n:
+            if report['Attempts'] >= max_attempts:
+                raise RuntimeError(f"Only {len(characters)} of {n} characters met the constraints "
+                                   f"in {report['Attempts']} attempts")
+            size = int(min(max(2 * (n - len(characters)), 16), 4096, max_attempts - report['Attempts']))
+            picks = _choose(forced['Weights'], size).tolist()
+            rolled = _roll_statistics(size)
+            # Powers only raise statistics, so a roll over an upper bound never matches
+            allowed = ~((rolled > limits) & bounded).any(axis=1)
+            for pick, row, ok in zip(picks, rolled.tolist(), allowed.tolist()):
+                if len(characters) == n:
+                    break
+                report['Attempts'] = report['Attempts'] + 1
+                if not ok:
+                    report['Rejected']['Statistics'] = report['Rejected']['Statistics'] + 1
+                    continue
+                if seed is not None:
+                    # apply_powers() moves a generator to each power's sub-stream, so
+                    # every candidate draws from its own generator, as roster characters do
+                    set_generator(keyed_generator(seed, report['Attempts']))
+                try:
+                    result = _candidate(forced['Entries'][pick], forced['Cover'][pick], row, parsed, report,
+                                        max_attempts)
+                finally:
+                    if seed is not None:
+                        set_generator(driver)
+                if isinstance(result, str):
+                    report['Rejected'][result] = report['Rejected'][result] + 1
+                else:
+                    characters.append(result)
+    finally:
+        if seed is not None:
+            set_generator(previous)
+    return {'Characters': characters, 'Attempts': report['Attempts'],
+            'AcceptanceRate': len(characters) / max(report['Attempts'], 1), 'Rejected': report['Rejected'],
+            'PowerLists': report['PowerLists'], 'PhysicalRolls': report['PhysicalRolls'],
+            'Probability': forced['Probability']}
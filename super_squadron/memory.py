@@ -0,0 +1,203 @@
+"""
+Super Squadron Memory Module
+
+This module shows where memory goes when large rosters are generated, so
+representation changes can be measured. Nothing here runs unless it is called;
+generation itself is not instrumented.
+
+profile_stages() generates a roster one pipeline stage at a time (the stages of
+character.GENERATION_STAGES, then JSON serialization) with tracemalloc tracing,
+and takes a snapshot around each stage. Each stage reports the bytes it left
+allocated, per character, and the source lines that allocated most of them.
+The power details stage also reports bytes per power-detail dictionary.
+
+rss_benchmark() measures peak resident set size for whole runs, each in a fresh
+process, with the roster held as Character dictionaries or as a CompactRoster:
+
+    python -m super_squadron.memory --characters 2000
+    python -m super_squadron.memory --benchmark --counts 10000 100000 1000000
+    python -m super_squadron.memory --benchmark --representation compact
+
+Peak RSS comes from the resource module, which is not available on Windows.
+"""
+
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from super_squadron.character import GENERATION_STAGES, generate_character
+from super_squadron.compact import CompactRoster
+from super_squadron.tables import registry
+
+__all__ = [
+    'REPRESENTATIONS',
+    'profile_stages',
+    'peak_rss',
+    'rss_run',
+    'rss_benchmark'
+]
+
+REPRESENTATIONS = ['dict', 'compact']
+
+
+def _serialize(Character):
+    """JSON text of a character, as a roster dump or a service response holds it."""
+    return json.dumps(Character)
+
+def _snapshot():
+    """Take a tracemalloc snapshot without the allocations of tracemalloc and this module."""
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                      tracemalloc.Filter(False, __file__)])
+
+def _top_lines(after, before, top):
+    """Source lines that allocated the most between two snapshots."""
+    differences = after.compare_to(before, 'lineno')
+    return [{'Line': f'{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}',
+             'Bytes': statistic.size_diff, 'Blocks': statistic.count_diff}
+            for statistic in differences[:top] if statistic.size_diff > 0]
+
+@registry.reading()
+def profile_stages(count=1000, top=5):
+    """
+    Generate a roster stage by stage under tracemalloc.
+
+    All characters go through one stage before any goes through the next, so
+    each snapshot difference is the memory that stage adds to the roster. The
+    draws differ from generate_character() calls but follow the same rules.
+
+    Args:
+        count (int): Number of characters.
+        top (int): Source lines reported per stage.
+
+    Returns:
+        dict: 'Characters', 'Stages' (a list of dictionaries with 'Stage',
+              'Bytes', 'BytesPerCharacter', 'Seconds' and 'Top', the source
+              lines that allocated most), 'PowerDetails' (dictionaries made
+              by the PowerDetails stage), 'BytesPerPowerDetail', 'PeakBytes'
+              (traced peak) and 'SerializedBytes' (total JSON length).
+    """
+    stages = list(GENERATION_STAGES) + [('Serialization', _serialize)]
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        characters = [{} for index in range(count)]
+        serialized = []
+        results = []
+        snapshot = _snapshot()
+        for stage, function in stages:
+            start = time.perf_counter()
+            if stage == 'Serialization':
+                serialized = [function(Character) for Character in characters]
+            else:
+                for Character in characters:
+                    function(Character)
+            seconds = time.perf_counter() - start
+            previous, snapshot = snapshot, _snapshot()
+            size = sum(statistic.size_diff for statistic in snapshot.compare_to(previous, 'filename'))
+            results.append({'Stage': stage, 'Bytes': size, 'BytesPerCharacter': size / max(count, 1),
+                            'Seconds': seconds, 'Top': _top_lines(snapshot, previous, top)})
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    details = sum(len(Character['Powers']['Detail']) for Character in characters)
+    detail_bytes = next(result['Bytes'] for result in results if result['Stage'] == 'PowerDetails')
+    return {'Characters': count, 'Stages': results, 'PowerDetails': details,
+            'BytesPerPowerDetail': detail_bytes / max(details, 1), 'PeakBytes': peak,
+            'SerializedBytes': sum(len(text) for text in serialized)}
+
+def peak_rss():
+    """
+    Peak resident set size of this process so far.
+
+    Returns:
+        int: Bytes.
+    """
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def rss_run(count, representation='dict'):
+    """
+    Generate and hold a roster, reporting the process's peak RSS.
+
+    Run it in a fresh process (see rss_benchmark()), as the peak covers
+    everything the process has done.
+
+    Args:
+        count (int): Number of characters.
+        representation (str): 'dict' keeps Character dictionaries in a list,
+                              'compact' appends them to a CompactRoster.
+
+    Returns:
+        dict: 'Characters', 'Representation', 'PeakRSS' in bytes and 'Seconds'.
+    """
+    if representation not in REPRESENTATIONS:
+        raise ValueError(f"Unknown representation {representation!r}, expected one of {REPRESENTATIONS}")
+    start = time.perf_counter()
+    roster = [] if representation == 'dict' else CompactRoster(capacity=max(count, 1))
+    for index in range(count):
+        roster.append(generate_character())
+    return {'Characters': count, 'Representation': representation, 'PeakRSS': peak_rss(),
+            'Seconds': time.perf_counter() - start}
+
+def rss_benchmark(counts=(10000, 100000, 1000000), representation='dict'):
+    """
+    Measure peak RSS for rosters of several sizes, each in a fresh process.
+
+    A run with no characters gives the baseline of the interpreter and tables,
+    which is subtracted for bytes per character.
+
+    Args:
+        counts (sequence): Roster sizes.
+        representation (str): A name from REPRESENTATIONS.
+
+    Returns:
+        list: rss_run() dictionaries with 'BytesPerCharacter' added, baseline first.
+    """
+    runs = []
+    for count in [0] + list(counts):
+        output = subprocess.run([sys.executable, '-m', 'super_squadron.memory', '--run', str(count),
+                                 '--representation', representation],
+                                check=True, capture_output=True, text=True).stdout
+        run = json.loads(output.splitlines()[-1])
+        run['BytesPerCharacter'] = (run['PeakRSS'] - runs[0]['PeakRSS']) / count if count else 0.0
+        runs.append(run)
+    return runs
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Memory use of character generation")
+    parser.add_argument('--characters', type=int, default=1000, help="Roster size for the stage profile")
+    parser.add_argument('--top', type=int, default=5, help="Source lines shown per stage")
+    parser.add_argument('--benchmark', action='store_true', help="Measure peak RSS in fresh processes")
+    parser.add_argument('--counts', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--representation', choices=REPRESENTATIONS, default='dict')
+    parser.add_argument('--run', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        print(json.dumps(rss_run(args.run, args.representation)))
+    elif args.benchmark:
+        for run in rss_benchmark(args.counts, args.representation):
+            print(f"{run['Characters']:>8} characters ({run['Representation']}): "
+                  f"peak RSS {run['PeakRSS'] / 2 ** 20:.1f} MiB, "
+                  f"{run['BytesPerCharacter']:.0f} bytes per character, {run['Seconds']:.1f}s")
+    else:
+        profile = profile_stages(args.characters, args.top)
+        for stage in profile['Stages']:
+            print(f"{stage['Stage']:<14} {stage['BytesPerCharacter']:>9.0f} bytes per character "
+                  f"({stage['Seconds']:.2f}s)")
+            for line in stage['Top']:
+                print(f"    {line['Bytes']:>10} bytes in {line['Blocks']:>6} blocks  {line['Line']}")
+        print(f"{profile['PowerDetails']} power details, {profile['BytesPerPowerDetail']:.0f} bytes each; "
+              f"{profile['SerializedBytes'] / max(profile['Characters'], 1):.0f} bytes of JSON per character; "
+              f"traced peak {profile['PeakBytes'] / 2 ** 20:.1f} MiB")
@@ -0,0 +1,270 @@
+"""
+Super Squadron Origins Module
+
+This module rolls origins and decides which powers are devices from the rules
+in data/origins.csv, instead of an if/elif ladder and per-origin lists of power
+names.
+
+Each row of origins.csv is one origin, keyed by its OriginID:
+
+    RollLow, RollHigh      faces of the origin die that give the origin
+    Age, AgeTimes, AgePlus Age is Age x AgeTimes + AgePlus, e.g. 1d8 x 1d6 + 25
+    Lifespan, LifespanTimes "Human", or dice multiplied together, e.g. 1d20 x 1d20
+    ArtifactChance         percent chance, on 1d100, of an artifact
+    DeviceRollTarget       if set, a device power is only a device on a
+                           d100 + Luck roll at or under the target
+    DevicePowers           powers that are devices for the origin, separated by ";"
+
+The rules are compiled once per table version into an OriginRules: a lookup
+array from die face to origin ID, classified dice cells, probability thresholds,
+a frozenset of device powers per origin, and a packed bitmask of device power
+IDs per origin for deciding the devices of many characters at once.
+
+roll_origin() makes the same draws, in the same order, as the ladder it replaces.
+Each function reads the module's rules once, so a reload of the tables part
+way through a call cannot mix two versions of the rules.
+"""
+
+import numpy as np
+
+from super_squadron.formulas import parse_cell, roll_column
+from super_squadron.roll import _roll, _roll_batch
+from super_squadron.tables import registry
+
+__all__ = [
+    'OriginRules',
+    'compile_rules',
+    'rules',
+    'roll_origin',
+    'roll_origin_batch',
+    'device_powers',
+    'assign_devices_batch'
+]
+
+
+class OriginRules:
+    """
+    Origin and device rules compiled from data/origins.csv.
+
+    Attributes:
+        names (list): Origin name of each origin ID.
+        ids (dict): Origin name to origin ID.
+        sides (int): Sides of the origin die.
+        by_roll (numpy.ndarray): Origin ID of each face of the origin die, indexed by the roll.
+        age (list): (Age, AgeTimes) cells of each origin ID.
+        age_plus (numpy.ndarray): AgePlus of each origin ID.
+        lifespan (list): (Lifespan, LifespanTimes) cells of each origin ID.
+        artifact_chance (numpy.ndarray): ArtifactChance of each origin ID.
+        device_roll (numpy.ndarray): Whether each origin ID rolls for devices.
+        device_target (numpy.ndarray): DeviceRollTarget of each origin ID, 0 where there is no roll.
+        devices (list): frozenset of device power names of each origin ID.
+        power_ids (dict): Power name to power ID, its row in power_details.csv.
+        device_bits (numpy.ndarray): Device power IDs of each origin ID as a packed
+                                     (origins, bytes) uint8 bitmask.
+    """
+
+    def __init__(self, origins, power_names):
+        self.names = origins['Origin'].tolist()
+        self.ids = {name: origin_id for origin_id, name in enumerate(self.names)}
+        if origins['OriginID'].tolist() != list(range(len(self.names))):
+            raise ValueError("origins.csv OriginID must count up from 0")
+        lows = origins['RollLow'].tolist()
+        highs = origins['RollHigh'].tolist()
+        self.sides = max(highs)
+        by_roll = np.full(self.sides + 1, -1, dtype=np.int64)
+        for origin_id, (low, high) in enumerate(zip(lows, highs)):
+            if (by_roll[low:high + 1] != -1).any():
+                raise ValueError(f"origins.csv rolls {low}-{high} for {self.names[origin_id]} overlap another origin")
+            by_roll[low:high + 1] = origin_id
+        if (by_roll[1:] == -1).any():
+            raise ValueError(f"origins.csv does not cover every face of 1d{self.sides}")
+        self.by_roll = by_roll
+        self.age = [(parse_cell(age), parse_cell(times))
+                    for age, times in zip(origins['Age'].tolist(), origins['AgeTimes'].tolist())]
+        self.age_plus = origins['AgePlus'].to_numpy(dtype=np.int64)
+        self.lifespan = [(parse_cell(lifespan), parse_cell(times))
+                         for lifespan, times in zip(origins['Lifespan'].tolist(), origins['LifespanTimes'].tolist())]
+        self.artifact_chance = origins['ArtifactChance'].to_numpy(dtype=np.int64)
+        targets = origins['DeviceRollTarget'].to_numpy(dtype=np.float64)
+        self.device_roll = ~np.isnan(targets)
+        self.device_target = np.where(self.device_roll, targets, 0).astype(np.int64)
+        self.power_ids = {name: power_id for power_id, name in enumerate(power_names)}
+        self.devices = []
+        masks = np.zeros((len(self.names), len(self.power_ids)), dtype=bool)
+        for origin_id, powers in enumerate(origins['DevicePowers'].tolist()):
+            names = frozenset(powers.split(';')) if isinstance(powers, str) else frozenset()
+            unknown = sorted(names - self.power_ids.keys())
+            if unknown:
+                raise ValueError(f"origins.csv device powers for {self.names[origin_id]} "
+                                 f"are not in power_details.csv: {unknown}")
+            self.devices.append(names)
+            masks[origin_id, [self.power_ids[name] for name in names]] = True
+        self.device_bits = np.packbits(masks, axis=1)
+
+    def __repr__(self):
+        return f'OriginRules({len(self.names)} origins, {len(self.power_ids)} powers)'
+
+    def power_bits(self, power_lists):
+        """
+        Pack lists of powers into bitmasks over power IDs.
+
+        Args:
+            power_lists (list): A list of power names for each character.
+
+        Returns:
+            numpy.ndarray: (characters, bytes) uint8 bitmask, one row per character.
+        """
+        masks = np.zeros((len(power_lists), len(self.power_ids)), dtype=bool)
+        rows = [row for row, powers in enumerate(power_lists) for power in powers if power in self.power_ids]
+        columns = [self.power_ids[power] for powers in power_lists for power in powers if power in self.power_ids]
+        masks[rows, columns] = True
+        return np.packbits(masks, axis=1)
+
+
+def compile_rules(origins, power_names):
+    """
+    Compile origins.csv.
+
+    Args:
+        origins (pandas.DataFrame): The origins table.
+        power_names (list): Power names in power ID order.
+
+    Returns:
+        OriginRules: The compiled rules.
+    """
+    return OriginRules(origins, list(power_names))
+
+def _load_tables(tables):
+    """Module globals from a version of the data tables."""
+    return {'rules': compile_rules(tables['origins'], tables['power_details']['Power'].tolist())}
+
+# Compile the origin rules, and recompile them whenever the tables are reloaded
+registry.subscribe(globals(), _load_tables)
+
+
+def _product(cells):
+    """Roll a pair of cells and multiply them, or give the first's text if it has no value."""
+    first, second = cells
+    value = first.roll()
+    if isinstance(value, str):
+        return value
+    return value * second.roll()
+
+def roll_origin(origin=None):
+    """
+    Roll for character origin type and age.
+
+    Args:
+        origin (str): Origin name to roll the age, lifespan and artifact of,
+                      without rolling the origin die. Rolled as usual if None.
+
+    Returns:
+        dict: Dictionary containing 'Origin', 'Age', 'Artifact', and 'Lifespan' keys.
+    """
+    compiled = rules
+    if origin is None:
+        origin_id = int(compiled.by_roll[_roll(1, compiled.sides)])
+    elif origin in compiled.ids:
+        origin_id = compiled.ids[origin]
+    else:
+        raise ValueError(f"Unknown origin {origin!r}, expected one of {compiled.names}")
+    age = _product(compiled.age[origin_id]) + int(compiled.age_plus[origin_id])
+    origin_dict = {'Artifact': "No", 'Lifespan': _product(compiled.lifespan[origin_id])}
+    chance = int(compiled.artifact_chance[origin_id])
+    if chance and _roll(1, 100) <= chance:
+        origin_dict['Artifact'] = "Yes"
+    origin_dict['Origin'] = compiled.names[origin_id]
+    origin_dict['Age'] = age
+    return origin_dict
+
+def _product_column(cells, origin_ids):
+    """Roll pairs of cells for many origin IDs, multiplying where the first has a value."""
+    firsts = roll_column([first for first, second in cells], origin_ids)
+    seconds = roll_column([second for first, second in cells], origin_ids)
+    return [first if isinstance(first, str) else first * second for first, second in zip(firsts, seconds)]
+
+def roll_origin_batch(count):
+    """
+    Roll many origins at once with numpy.
+
+    The results follow the same rules as roll_origin(), but the draws are made
+    column by column, so they differ from count roll_origin() calls.
+
+    Args:
+        count (int): Number of characters.
+
+    Returns:
+        dict: 'OriginID', 'Origin', 'Age', 'Artifact' and 'Lifespan', each a list with one value per character.
+    """
+    compiled = rules
+    origin_ids = compiled.by_roll[_roll_batch(1, compiled.sides, count)]
+    ages = np.asarray(_product_column(compiled.age, origin_ids), dtype=np.int64) + compiled.age_plus[origin_ids]
+    chances = compiled.artifact_chance[origin_ids]
+    artifacts = np.zeros(count, dtype=bool)
+    rolled = np.flatnonzero(chances > 0)
+    artifacts[rolled] = _roll_batch(1, 100, len(rolled)) <= chances[rolled]
+    return {
+        'OriginID': origin_ids.tolist(),
+        'Origin': [compiled.names[origin_id] for origin_id in origin_ids.tolist()],
+        'Age': ages.tolist(),
+        'Artifact': np.where(artifacts, "Yes", "No").tolist(),
+        'Lifespan': _product_column(compiled.lifespan, origin_ids)
+    }
+
+def device_powers(origin):
+    """
+    Get the powers that can be devices for an origin.
+
+    Args:
+        origin (str): Origin name, e.g. "Alien".
+
+    Returns:
+        frozenset: Power names, empty for origins without devices or not in origins.csv.
+    """
+    compiled = rules
+    origin_id = compiled.ids.get(origin)
+    if origin_id is None:
+        return frozenset()
+    return compiled.devices[origin_id]
+
+def assign_devices_batch(origins, power_lists, luck):
+    """
+    Decide which powers are devices for many characters at once.
+
+    Eligibility is the AND of each character's power bitmask with its origin's
+    device bitmask. Eligible powers of origins with a DeviceRollTarget are then
+    devices on one batch of d100 rolls, each at or under the target less the
+    character's Luck, one roll for each time the power is listed.
+
+    Args:
+        origins (list): Origin name of each character.
+        power_lists (list): Power names of each character.
+        luck (sequence): Luck of each character.
+
+    Returns:
+        list: The device power names of each character, in the order of its powers.
+    """
+    compiled = rules
+    origin_ids = np.array([compiled.ids.get(origin, -1) for origin in origins], dtype=np.int64)
+    known = origin_ids >= 0
+    eligible = np.zeros((len(origin_ids), len(compiled.power_ids)), dtype=bool)
+    if known.any():
+        bits = compiled.power_bits([powers for powers, is_known in zip(power_lists, known.tolist()) if is_known])
+        eligible[known] = np.unpackbits(bits & compiled.device_bits[origin_ids[known]], axis=1,
+                                        count=len(compiled.power_ids)).astype(bool)
+    # Each listed occurrence of an eligible power rolls, as in character.assign_devices()
+    rolling = known & compiled.device_roll[np.maximum(origin_ids, 0)]
+    power_ids = compiled.power_ids
+    occurrences = [(row, power_ids[power]) for row in np.flatnonzero(rolling).tolist()
+                   for power in power_lists[row] if power in power_ids and eligible[row, power_ids[power]]]
+    rows = np.array([row for row, power_id in occurrences], dtype=np.int64)
+    columns = np.array([power_id for row, power_id in occurrences], dtype=np.int64)
+    targets = compiled.device_target[origin_ids[rows]] - np.asarray(luck, dtype=np.int64)[rows]
+    success = _roll_batch(1, 100, len(occurrences)) <= targets
+    eligible[rolling] = False
+    eligible[rows[success], columns[success]] = True
+    devices = []
+    for row, powers in zip(eligible, power_lists):
+        devices.append([power for power in dict.fromkeys(powers)
+                        if power in power_ids and row[power_ids[power]]])
+    return devices
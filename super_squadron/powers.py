@@ -8,12 +8,12 @@ Powers are loaded from the data/power_details.csv file and stored in the powers_
 Each power class represents a specific superpower that can be assigned to characters.
 """
 
-import pandas as pd
 import numpy as np
 import math
-import os
 
+from super_squadron.formulas import normalize_table, parse_cell
 from super_squadron.roll import roll_ap, roll_effects
+from super_squadron.tables import load_table, registry
 
 def normal_round(n):
     """Round a number to the nearest integer using standard rounding rules."""
@@ -75,30 +75,53 @@ class PowerBase:
     def __repr__(self):
         return f'PowerBase({self.name}, {self.apcost})'
 
+    def roll(self, column, Character):
+        """
+        Roll this power's power_details.csv cell, as classified when the table was loaded.
+
+        A class that sets its own value for the column, as ForceBeam does for
+        each beam type, rolls that value instead.
+
+        Args:
+            column (str): Column name, e.g. 'DeviceAP'.
+            Character (dict): Character whose Statistics are used for statistic formulas.
+
+        Returns:
+            int or str: The rolled value, or the cell text if it has no value.
+        """
+        cell = power_cells[self.name][column]
+        value = getattr(self, column.lower())
+        if str(value) != cell.text:
+            cell = _override_cell(value)
+        return cell.roll(Character['Statistics'])
+
+# Classified values that classes set in place of their power_details.csv cells
+_override_cells = {}
+
+def _override_cell(value):
+    """Classify a value a power class set itself, once per value."""
+    text = str(value)
+    cell = _override_cells.get(text)
+    if cell is None:
+        cell = _override_cells[text] = parse_cell(text)
+    return cell
+
 def printtest():
     """Print a test message for Super Squadron."""
     print("Super Squadron")
 
-# Get the directory where this file is located
-current_dir = os.path.dirname(os.path.abspath(__file__))
-data_file = os.path.join(current_dir, '..', 'data', 'power_details.csv')
-
-# Load power details with error handling
-try:
-    df = pd.read_csv(data_file, low_memory=False)
-except FileNotFoundError:
-    # Try alternative path (when running from different directory)
-    data_file = 'data/power_details.csv'
-    try:
-        df = pd.read_csv(data_file, low_memory=False)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Could not find power_details.csv. Tried: {data_file}")
+def _load_tables(tables):
+    """Build df, powers_dict and power_cells from a version of the data tables."""
+    df = tables['power_details']
+    powers_dict = {}
+    for index, row in df.iterrows():
+        powers_dict[row['Power']] = PowerBase(row['Power'], row['APCost'], row['MaxAP'], row['AreaEffect'], row['DeviceAP'],\
+         row['DamageAP'], row['Duration'], row['DurationUnit'], row['Range'], row['DeviceRange'], row['Choices'])
+    return {'df': df, 'powers_dict': powers_dict, 'power_cells': normalize_table(df, 'Power')}
 
-powers_dict = {}
-
-for index, row in df.iterrows():
-    powers_dict[row['Power']] = PowerBase(row['Power'], row['APCost'], row['MaxAP'], row['AreaEffect'], row['DeviceAP'],\
-     row['DamageAP'], row['Duration'], row['DurationUnit'], row['Range'], row['DeviceRange'], row['Choices'])
+# Load power details into df, powers_dict and power_cells, and rebuild them
+# whenever the tables are reloaded
+registry.subscribe(globals(), _load_tables)
 
 
 class Adaption(PowerBase):
@@ -124,8 +147,8 @@ class Adaption(PowerBase):
         Character['Powers']['Detail'][powername]['4AP'] = "-15-85C, gravity variation 75%"
         Character['Powers']['Detail'][powername]['5AP'] = "-25-95C, reduced O2, gravity variation 100%"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 
 class AirGeneration(PowerBase):
@@ -143,7 +166,7 @@ class AirGeneration(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Blast'] = {}
         Character['Powers']['Detail'][powername]['Damage'] = {}
@@ -158,8 +181,8 @@ class AirGeneration(PowerBase):
         Character['Powers']['Detail'][powername]['Oxygen']['APCost'] = "1"
         Character['Powers']['Detail'][powername]['Oxygen']['Volume'] = "1"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class AnimalAffinity(PowerBase):
     def __init__(self, Character):
@@ -176,7 +199,7 @@ class AnimalAffinity(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Intelligence'])*3
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Loyalty'] = 30
         Character['Powers']['Detail'][powername]['Morale'] = -10
@@ -184,8 +207,8 @@ class AnimalAffinity(PowerBase):
         Character['Powers']['Detail'][powername]['Statistics'] = "2d6 [ST, AG, IQ, SA]"
         Character['Powers']['Detail'][powername]['Damage'] = "1/1/1d3"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Armour(PowerBase):
     def __init__(self, Character):
@@ -208,8 +231,8 @@ class Armour(PowerBase):
         Character['Powers']['Detail'][powername]['DamageReduction']['HTH'] = 1/3
         Character['Powers']['Detail'][powername]['DamageReduction']['Other'] = 1/2
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
             devcheck = roll_effects(1, 100)
             if devcheck <= 15:
@@ -229,7 +252,7 @@ class AstralProjection(PowerBase):
         Character['Powers']['Detail'][powername]['MaxAP'] = self.maxap
         Character['Powers']['Detail'][powername]['AreaEffect'] = self.areaeffect
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
-        Character['Powers']['Detail'][powername]['Duration'] = (Character['Statistics']['Stamina'])+10
+        Character['Powers']['Detail'][powername]['Duration'] = self.roll('Duration', Character)
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
         Character['Powers']['Detail'][powername]['Range'] = self.range
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
@@ -243,8 +266,8 @@ class AstralProjection(PowerBase):
             if spellscheck <= 85:
                 Character['Powers']['Detail'][powername]['SpellsInAstral'] = "Yes"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class BodyAugmentation(PowerBase):
     def __init__(self, Character):
@@ -302,8 +325,8 @@ class BodyAugmentation(PowerBase):
             else:
                 Character['Powers']['Detail'][powername]['Augmentations']['Powers'][str(power + 1)] = "No"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 
 class Cybernetics(PowerBase):
@@ -362,8 +385,8 @@ class Cybernetics(PowerBase):
             else:
                 Character['Powers']['Detail'][powername]['Augmentations']['Powers'][str(power + 1)] = "No"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class DarknessGeneration(PowerBase):
     def __init__(self, Character):
@@ -380,14 +403,14 @@ class DarknessGeneration(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Intelligence'])*1
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['AttackDM'] = 30
         Character['Powers']['Detail'][powername]['MishapChance'] = "80 - (LK+EXP)"
         Character['Powers']['Detail'][powername]['MishapDamage'] = "1d2"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class DeathTouch(PowerBase):
     def __init__(self, Character):
@@ -419,8 +442,8 @@ class DeathTouch(PowerBase):
         Character['Powers']['Detail'][powername]['DefensivePowerModifierSaveB'] = "Half Damage"
         Character['Powers']['Detail'][powername]['DefensivePowerModifierPermanentDamage'] = "91-00 - LK"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Defect(PowerBase):
     def __init__(self, Character):
@@ -440,8 +463,8 @@ class Defect(PowerBase):
         Character['Powers']['Detail'][powername]['Range'] = self.range
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class DensityControl(PowerBase):
     def __init__(self, Character):
@@ -487,8 +510,8 @@ class DensityControl(PowerBase):
         Character['Powers']['Detail'][powername]['DensityLevel']['-2']['Move'] = "10"
 
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class DimensionalGate(PowerBase):
     def __init__(self, Character):
@@ -520,8 +543,8 @@ class DimensionalGate(PowerBase):
         Character['Powers']['Detail'][powername]['Duration']['5'] = {"AP":20,"DM":95}
 
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class DisintegrationBeam(PowerBase):
     def __init__(self, Character):
@@ -538,11 +561,11 @@ class DisintegrationBeam(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Strength']*15)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EgoChange(PowerBase):
     def __init__(self, Character):
@@ -559,11 +582,11 @@ class EgoChange(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Elasticity(PowerBase):
     def __init__(self, Character):
@@ -580,15 +603,15 @@ class Elasticity(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Stretching'] = {}
         Character['Powers']['Detail'][powername]['Stretching']['Limbs-Torso'] = (Character['Statistics']['Agility'])*(Character['Statistics']['Stamina'])
         Character['Powers']['Detail'][powername]['Stretching']['Other'] = (Character['Statistics']['Agility'])*3
         Character['Powers']['Detail'][powername]['Stretching']['Entangle'] = "(ST + AG + LK)"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EmotionControl(PowerBase):
     def __init__(self, Character):
@@ -603,14 +626,17 @@ class EmotionControl(PowerBase):
         Character['Powers']['Detail'][powername]['MaxAP'] = self.maxap
         Character['Powers']['Detail'][powername]['AreaEffect'] = self.areaeffect
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
-        Character['Powers']['Detail'][powername]['Duration'] = self.duration
+        # Duration is 1d4*Ego*-1+25 turns, at least one, with the 1d4 kept so dependencies can recalculate it
+        durationroll = roll_effects(1, 4)
+        Character['Powers']['Detail'][powername]['Duration'] = max(25 - durationroll*Character['Statistics']['Ego'], 1)
+        Character['Powers']['Detail'][powername]['DurationRoll'] = durationroll
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Intelligence']*2)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Save'] = "(EG + LK + Exp)"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EnergyAbsorption(PowerBase):
     def __init__(self, Character):
@@ -627,7 +653,7 @@ class EnergyAbsorption(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Store'] = 70
         powcheck = roll_effects(1, 100)
@@ -646,14 +672,15 @@ class EnergyAbsorption(PowerBase):
             Character['Powers']['Detail'][powername2]['StoreMax'] = (Character['Statistics']['Strength'] + Character['Statistics']['Stamina'])
             Character['Powers']['Detail'][powername2]['StoreBlast'] = "1d4 to 1d30, depending on energy"
             if 'Device' in Character['Powers']['Detail'][powername]:
-                Character['Powers']['Detail'][powername2]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-                Character['Powers']['Detail'][powername2]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+                Character['Powers']['Detail'][powername2]['Device'] = {}
+                Character['Powers']['Detail'][powername2]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+                Character['Powers']['Detail'][powername2]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
                 Character['Powers']['Detail'][powername2]['Device']['Overload'] = "50% energy in 15m radius"
                 Character['Powers']['Detail'][powername2]['StoreMax'] = roll_ap("1d4x10")
 
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EnhancedAgility(PowerBase):
     def __init__(self, Character):
@@ -670,12 +697,12 @@ class EnhancedAgility(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Statistics']['Agility'] = Character['Statistics']['Agility'] + roll_effects(2,10)
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EnhancedCharisma(PowerBase):
     def __init__(self, Character):
@@ -692,12 +719,12 @@ class EnhancedCharisma(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Statistics']['Charisma'] = Character['Statistics']['Charisma'] + roll_effects(1,10)
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EnhancedIntelligence(PowerBase):
     def __init__(self, Character):
@@ -714,12 +741,12 @@ class EnhancedIntelligence(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Statistics']['Intelligence'] = Character['Statistics']['Intelligence'] + roll_effects(2,10)
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EnhancedStamina(PowerBase):
     def __init__(self, Character):
@@ -736,12 +763,12 @@ class EnhancedStamina(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Statistics']['Stamina'] = Character['Statistics']['Stamina'] + roll_effects(2,10)
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EnhancedStrength(PowerBase):
     def __init__(self, Character):
@@ -758,12 +785,12 @@ class EnhancedStrength(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Statistics']['Strength'] = Character['Statistics']['Strength'] + roll_effects(2,10)
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class EnvironmentControl(PowerBase):
     def __init__(self, Character):
@@ -780,14 +807,14 @@ class EnvironmentControl(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Strength'] + Character['Statistics']['Stamina'])
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Gravity'] = "50%"
         Character['Powers']['Detail'][powername]['Temperature'] = "35 degrees"
         Character['Powers']['Detail'][powername]['Oxygen'] = "100%"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class FastRecovery(PowerBase):
     def __init__(self, Character):
@@ -804,13 +831,13 @@ class FastRecovery(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Rate'] = "1 HT per hour"
         Character['Powers']['Detail'][powername]['AttackEffects'] = "1/4 normal duration"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class FlameGeneration(PowerBase):
     def __init__(self, Character):
@@ -832,8 +859,8 @@ class FlameGeneration(PowerBase):
         Character['Powers']['Detail'][powername]['Flight'] = (Character['Agility_Effects']['Move'])*4
         Character['Powers']['Detail'][powername]['Immunity'] = "High temperatures"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Flight(PowerBase):
     def __init__(self, Character):
@@ -850,7 +877,7 @@ class Flight(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Speed'] = (Character['Statistics']['Agility'] + Character['Statistics']['Stamina'] + Character['Statistics']['Stamina'])*3
         if Character['Powers']['Detail'][powername]['Speed'] > 150:
@@ -862,8 +889,8 @@ class Flight(PowerBase):
             Character['Powers']['Detail'][powername]['Hyperspace'] = "Yes"
             Character['Powers']['Detail'][powername]['SpeedHyperspace'] = "1 Light Year per five minutes"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
             Character['Powers']['Detail'][powername]['Speed'] = roll_effects(2,10) * roll_effects(2,10)
             if Character['Powers']['Detail'][powername]['Speed'] > 150:
                 addspeed = roll_effects(1,100)*10
@@ -937,12 +964,12 @@ class ForceBeam(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Strength']*15)
+        Character['Powers']['Detail'][powername]['Range'] = self.range
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
 
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class ForceField(PowerBase):
     def __init__(self, Character):
@@ -959,14 +986,14 @@ class ForceField(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Strength'] + Character['Statistics']['Stamina'])
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Defense'] = "8 pts for every 2 AP"
         Character['Powers']['Detail'][powername]['ExtraArea'] = "Double AP per character"
         Character['Powers']['Detail'][powername]['Special'] = "Air, light and sound get through"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Gimmick(PowerBase):
     def __init__(self, Character):
@@ -987,24 +1014,16 @@ class Gimmick(PowerBase):
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Number'] = roll_effects(1,4)+1
         Character['Powers']['Detail'][powername]['Gimmicks'] = {}
-        # Load gimmicks with error handling
-        try:
-            gimmicks_file = os.path.join(current_dir, '..', 'data', 'Gimmicks.csv')
-            gimmicks = pd.read_csv(gimmicks_file)
-        except FileNotFoundError:
-            try:
-                gimmicks = pd.read_csv('data/Gimmicks.csv')
-            except FileNotFoundError:
-                raise FileNotFoundError("Could not find Gimmicks.csv")
+        gimmicks = load_table('gimmicks')
         
         for gimmick in range(Character['Powers']['Detail'][powername]['Number']):
-            new_gimmick = gimmicks['Gimmick'].sample()
-            Character['Powers']['Detail'][powername]['Gimmicks'][str(gimmick+1)] = new_gimmick.values[0]
+            new_gimmick = gimmicks['Gimmick'].iloc[roll_effects(1, len(gimmicks)) - 1]
+            Character['Powers']['Detail'][powername]['Gimmicks'][str(gimmick+1)] = new_gimmick
         Character['Powers']['Detail'][powername]['InventNew'] = (Character['Statistics']['Intelligence'])*2
         Character['Powers']['Detail'][powername]['ScientistInventNew'] = 30
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class GravityControl(PowerBase):
     def __init__(self, Character):
@@ -1021,15 +1040,15 @@ class GravityControl(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = self.range
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Special'] = "100% effect per AP"
         Character['Powers']['Detail'][powername]['AgilityEffect'] = "Double or halve per direction"
         Character['Powers']['Detail'][powername]['Flight'] = (Character['Agility_Effects']['Move'])*10
         Character['Powers']['Detail'][powername]['APCostFlight'] = 2
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class HeightenedAttack(PowerBase):
     def __init__(self, Character):
@@ -1051,8 +1070,8 @@ class HeightenedAttack(PowerBase):
         Character['Powers']['Detail'][powername]['DD'] = "1d4"
         Character['Powers']['Detail'][powername]['HP'] = roll_effects(2,10)  #need to add up all HP for character sheet
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class HeightenedDefense(PowerBase):
     def __init__(self, Character):
@@ -1074,8 +1093,8 @@ class HeightenedDefense(PowerBase):
         Character['Powers']['Detail'][powername]['DD'] = "-1"
         Character['Powers']['Detail'][powername]['HP'] = roll_effects(3,8)  #need to add up all HP for character sheet
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class HeightenedExpertise(PowerBase):
     def __init__(self, Character):
@@ -1097,8 +1116,8 @@ class HeightenedExpertise(PowerBase):
         Character['Powers']['Detail'][powername]['Special'] = "Fancy Manoeuvres: if over 50% HP with any weapon"
         Character['Powers']['Detail'][powername]['HP'] = roll_effects(1,4)  #need to add up all HP for character sheet
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 
 class HeightenedSenses(PowerBase):
@@ -1116,7 +1135,7 @@ class HeightenedSenses(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = self.range
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['Augmentations'] = {}
         Character['Powers']['Detail'][powername]['Augmentations']['Type'] = {}
@@ -1259,8 +1278,8 @@ class HeightenedSenses(PowerBase):
                 Character['Powers']['Detail'][powername]['Augmentations']['Range'][str(power + 1)] = normal_round((Character['Statistics']['Stamina'])/5)
                 Character['Powers']['Detail'][powername]['Augmentations']['Special'][str(power + 1)] = "Blocked by some light soruces"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class HeightenedSpeed(PowerBase):
     def __init__(self, Character):
@@ -1277,7 +1296,7 @@ class HeightenedSpeed(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = roll_ap(self.range)
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['ExtraAction'] = 1
         Character['Powers']['Detail'][powername]['Speed'] = (Character['Statistics']['Agility'] + Character['Statistics']['Stamina'] + Character['Statistics']['Stamina'])*3
@@ -1291,8 +1310,8 @@ class HeightenedSpeed(PowerBase):
             Character['Powers']['Detail'][powername]['CreateVortex'] = "Yes"
             Character['Powers']['Detail'][powername]['MaxWeight'] = "3kg per 500km"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
             Character['Powers']['Detail'][powername]['Speed'] = roll_effects(2,10) * roll_effects(2,10)
             if Character['Powers']['Detail'][powername]['Speed'] > 150:
                 addspeed = roll_effects(1,100)*10
@@ -1315,13 +1334,13 @@ class IceGeneration(PowerBase):
         Character['Powers']['Detail'][powername]['DamageAP'] = self.damageap
         Character['Powers']['Detail'][powername]['Duration'] = self.duration
         Character['Powers']['Detail'][powername]['DurationUnit'] = self.durationunit
-        Character['Powers']['Detail'][powername]['Range'] = (Character['Statistics']['Strength'] + Character['Statistics']['Agility'])
+        Character['Powers']['Detail'][powername]['Range'] = self.roll('Range', Character)
         Character['Powers']['Detail'][powername]['Choices'] = self.choices
         Character['Powers']['Detail'][powername]['FreezeSave'] = "SA + AG + LK"
         Character['Powers']['Detail'][powername]['Immunity'] = "Low temperatures"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Immateriality(PowerBase):
     def __init__(self, Character):
@@ -1344,8 +1363,8 @@ class Immateriality(PowerBase):
         Character['Powers']['Detail'][powername]['Immunity'] = "HTH"
         Character['Powers']['Detail'][powername]['Special'] = "Affected by spells, sound light etc."
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Immortality(PowerBase):
     def __init__(self, Character):
@@ -1369,8 +1388,8 @@ class Immortality(PowerBase):
             addage = roll_effects(1,100) * roll_effects(1,100)
             Character['Origin']['Age'] = Character['Origin']['Age'] + addage
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 
 class InherentPower(PowerBase):
@@ -1461,8 +1480,8 @@ class InherentPower(PowerBase):
                 Character['Powers']['Detail'][powername]['DurationUnit'] = "NotApplicable"
                 Character['Powers']['Detail'][powername]['Range'] = (normal_round(Character['Statistics']['Strength']/3))
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Invisibility(PowerBase):
     def __init__(self, Character):
@@ -1487,8 +1506,8 @@ class Invisibility(PowerBase):
         if vischeck >= 91:
             Character['Powers']['Detail'][powername]['Special'] = "Permanently invisible"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
 
 class Invulnerability(PowerBase):
     def __init__(self, Character):
@@ -1510,5 +1529,50 @@ class Invulnerability(PowerBase):
         Character['Powers']['Detail'][powername]['Damage'] = 0.25
         Character['Powers']['Detail'][powername]['Special'] = "No damage if 2 or less"
         if 'Device' in Character['Powers']['Detail'][powername]:
-            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = roll_ap(self.deviceap)
-            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = roll_ap(self.devicerange)
+            Character['Powers']['Detail'][powername]['Device']['DeviceAP'] = self.roll('DeviceAP', Character)
+            Character['Powers']['Detail'][powername]['Device']['DeviceRange'] = self.roll('DeviceRange', Character)
+
+# Power name to the class that rolls its details
+power_classes = {
+    'Adaption': Adaption,
+    'Air Generation': AirGeneration,
+    'Animal Affinity': AnimalAffinity,
+    'Armour': Armour,
+    'Astral Projection': AstralProjection,
+    'Body Augmentation': BodyAugmentation,
+    'Cybernetics': Cybernetics,
+    'Darkness Generation': DarknessGeneration,
+    'Death Touch': DeathTouch,
+    'Defect': Defect,
+    'Density Control': DensityControl,
+    'Dimensional Gate': DimensionalGate,
+    'Disintegration Beam': DisintegrationBeam,
+    'Ego Change': EgoChange,
+    'Elasticity': Elasticity,
+    'Emotion Control': EmotionControl,
+    'Energy Absorption': EnergyAbsorption,
+    'Enhanced Agility': EnhancedAgility,
+    'Enhanced Charisma': EnhancedCharisma,
+    'Enhanced Intelligence': EnhancedIntelligence,
+    'Enhanced Stamina': EnhancedStamina,
+    'Enhanced Strength': EnhancedStrength,
+    'Environment Control': EnvironmentControl,
+    'Fast Recovery': FastRecovery,
+    'Flame Generation': FlameGeneration,
+    'Flight': Flight,
+    'Force Beam': ForceBeam,
+    'Force Field': ForceField,
+    'Gimmick': Gimmick,
+    'Gravity Control': GravityControl,
+    'Heightened Attack': HeightenedAttack,
+    'Heightened Defense': HeightenedDefense,
+    'Heightened Expertise': HeightenedExpertise,
+    'Heightened Senses': HeightenedSenses,
+    'Heightened Speed': HeightenedSpeed,
+    'Ice Generation': IceGeneration,
+    'Immateriality': Immateriality,
+    'Immortality': Immortality,
+    'Inherent Power': InherentPower,
+    'Invisibility': Invisibility,
+    'Invulnerability': Invulnerability
+}
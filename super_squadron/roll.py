@@ -4,9 +4,19 @@ Super Squadron Roll Module
 This module provides dice rolling functions for the Super Squadron role-playing game.
 It includes functions for rolling statistics, luck, origins, and calculating action points.
 
-All dice rolls use numpy's random number generator for consistency.
+All dice rolls use numpy's random number generator for consistency. Every
+draw goes through _roll() or _roll_batch(), where an optional dice hook (see
+set_dice_hook() and the dicelog module) can record or replay it.
+
+Draws come from numpy's global random state unless set_generator() installs a
+numpy Generator. keyed_generator() gives one on a Philox counter-based bit
+generator keyed on (seed, index), so the draws for any index can be made
+without making those of the indices before it, and select_stream() moves it to
+an independent sub-stream, e.g. one per generation stage.
 """
 
+import sys
+
 import numpy as np
 
 __all__ = [
@@ -14,14 +24,151 @@ __all__ = [
     'roll_luck', 
     'roll_origin',
     'roll_effects',
+    'roll_effects_batch',
     'roll_main_statistics',
-    'roll_ap'
+    'roll_ap',
+    'roll_ap_batch',
+    'validate_ap',
+    'set_dice_hook',
+    'set_generator',
+    'current_generator',
+    'keyed_generator',
+    'select_stream'
 ]
 
+# Object with roll() and roll_batch() methods that handles every draw, or None
+_dice_hook = None
+# Whether the hook is passed the caller's frame, which costs about as much as a draw
+_hook_frames = False
+# numpy Generator that dice are drawn from, or None for numpy's global random state
+_generator = None
+# Largest dice number and sides roll_ap_batch() accepts in a formula
+_MAX_DICE = 100
+_MAX_SIDES = 1000
+
+
+def set_dice_hook(hook):
+    """
+    Route every dice draw through a hook, for example a dicelog recorder or replayer.
+
+    Args:
+        hook: Object with roll(number, sides, label, frame) and
+              roll_batch(number, sides, size, label, frame) methods, or None
+              to draw from numpy directly. frame is the frame that called the
+              roll function, or None if the hook has a false frames attribute.
+
+    Returns:
+        The previous hook.
+    """
+    global _dice_hook, _hook_frames
+    previous = _dice_hook
+    _dice_hook = hook
+    _hook_frames = getattr(hook, 'frames', True)
+    return previous
+
+def set_generator(generator):
+    """
+    Draw dice from a numpy Generator instead of numpy's global random state.
+
+    Args:
+        generator (numpy.random.Generator): Generator to draw from, or None for
+                                            numpy's global random state.
+
+    Returns:
+        The previous generator.
+    """
+    global _generator
+    previous = _generator
+    _generator = generator
+    return previous
+
+def current_generator():
+    """The Generator installed by set_generator(), or None."""
+    return _generator
+
+def keyed_generator(seed, index=0):
+    """
+    Make a Generator whose draws depend only on a seed and an index.
+
+    Philox is counter-based: its output is a function of the key and a counter,
+    so creating the generator for index 734211 costs the same as for index 0.
+
+    Args:
+        seed (int): Campaign or roster seed, from 0 to 2**64 - 1.
+        index (int): Character or NPC index, from 0 to 2**64 - 1.
+
+    Returns:
+        numpy.random.Generator: Generator on sub-stream 0.
+    """
+    if not 0 <= seed < 2 ** 64 or not 0 <= index < 2 ** 64:
+        raise ValueError(f"seed and index must be from 0 to 2**64 - 1, not {seed} and {index}")
+    return np.random.Generator(np.random.Philox(key=[index, seed]))
+
+def select_stream(generator, stream):
+    """
+    Restart a keyed_generator() Generator at the beginning of a sub-stream.
+
+    The stream number is the top word of the Philox counter, so sub-streams never
+    overlap and the draws in one do not depend on how many were made in another.
+
+    Args:
+        generator (numpy.random.Generator): Generator from keyed_generator().
+        stream (int): Sub-stream number, from 0 to 2**64 - 1.
+    """
+    bit_generator = generator.bit_generator
+    bit_generator.state = {
+        'bit_generator': 'Philox',
+        'state': {'counter': np.array([0, 0, 0, stream], dtype=np.uint64),
+                  'key': bit_generator.state['state']['key']},
+        'buffer': np.zeros(4, dtype=np.uint64),
+        'buffer_pos': 4,
+        'has_uint32': 0,
+        'uinteger': 0
+    }
+
+def _draw(number, sides):
+    """Sum of number dice with sides sides from the generator or numpy's global random state."""
+    if _generator is not None:
+        if number == 1:
+            return int(_generator.integers(1, sides + 1))
+        return int(_generator.integers(1, sides + 1, size=number).sum())
+    if number == 1:
+        return np.random.randint(1, sides + 1)
+    total = 0
+    for roll in range(number):
+        total = total + np.random.randint(1, sides + 1)
+    return total
+
+def _draw_batch(number, sides, size):
+    """size sums of number dice from the generator or numpy's global random state, as an array."""
+    if _generator is not None:
+        return _generator.integers(1, sides + 1, size=(size, number)).sum(axis=1)
+    return np.random.randint(1, sides + 1, size=(size, number)).sum(axis=1)
+
+def _roll(number, sides, label=None):
+    """
+    Roll number dice with sides sides and return the total.
+
+    Args:
+        number (int): Number of dice.
+        sides (int): Sides on each die.
+        label (str): Formula the dice belong to, e.g. "2d4x4". Defaults to "<number>d<sides>".
+    """
+    if _dice_hook is not None:
+        # Frame 0 is _roll and frame 1 the roll function, so frame 2 is its caller
+        return _dice_hook.roll(number, sides, label, sys._getframe(2) if _hook_frames else None)
+    return _draw(number, sides)
+
+def _roll_batch(number, sides, size, label=None):
+    """Roll number dice with sides sides size times, returning an array of totals."""
+    if _dice_hook is not None:
+        return _dice_hook.roll_batch(number, sides, size, label, sys._getframe(2) if _hook_frames else None)
+    return _draw_batch(number, sides, size)
+
 
 def roll_statistic():
     """Roll a random statistic value between 1 and 20 (inclusive)."""
-    statistic = np.random.randint(1, 21)
+    statistic = _roll(1, 20)
     return statistic
 
 def roll_luck():
@@ -32,7 +179,7 @@ def roll_luck():
         int: Luck value between 0 and 10, where values under 11 give luck.
     """
     luck = 0
-    roll = np.random.randint(1, 101)
+    roll = _roll(1, 100)
     if roll < 11:
         luck = 11 - roll
     return luck
@@ -40,41 +187,15 @@ def roll_luck():
 def roll_origin():
     """
     Roll for character origin type and age.
-    
+
+    The rules come from data/origins.csv, see origins.roll_origin().
+
     Returns:
         dict: Dictionary containing 'Origin', 'Age', 'Artifact', and 'Lifespan' keys.
     """
-    origin_dict = {}
-    roll = np.random.randint(1, 11)
-    origin_dict['Artifact'] = "No"
-    origin_dict['Lifespan'] = "Human"
-    if roll <= 3:
-        origin = "Mutant"
-        age = np.random.randint(1, 13) + 15
-    elif roll == 4:
-        origin = "Self Developed"
-        age = np.random.randint(1, 13) + 25
-    elif roll == 5:
-        origin = "Supernatural"
-        age = np.random.randint(1, 11) + 20
-    elif roll == 6:
-        origin = "Designed or Sponsored"
-        age = np.random.randint(1, 13) + 25
-    elif roll == 10:
-        origin = "Alien"
-        age = np.random.randint(1, 11) * np.random.randint(1, 7)
-        lifespan = np.random.randint(1, 21) * np.random.randint(1, 21)
-        origin_dict['Lifespan'] = lifespan
-    else:
-        origin = "Accidental/Scientific"
-        age = np.random.randint(1, 9) * np.random.randint(1, 7) + 25
-        artifact_roll = np.random.randint(1, 101)
-        if artifact_roll <= 5:
-            origin_dict['Artifact'] = "Yes"
-        
-    origin_dict['Origin'] = origin
-    origin_dict['Age'] = age
-    return origin_dict
+    # Imported here because the origins module rolls through this one
+    from super_squadron.origins import roll_origin as roll_origin_rules
+    return roll_origin_rules()
 
 def roll_effects(number, dice_sides):
     """
@@ -87,12 +208,21 @@ def roll_effects(number, dice_sides):
     Returns:
         int: Sum of all dice rolls.
     """
-    roll_total = 0
-    for roll in range(number):
-        dice_roll = np.random.randint(1, dice_sides + 1)
-        roll_total = roll_total + dice_roll
-        
-    return roll_total
+    return _roll(number, dice_sides)
+
+def roll_effects_batch(number, dice_sides, size):
+    """
+    Roll multiple dice size times at once.
+
+    Args:
+        number (int): Number of dice in each roll.
+        dice_sides (int): Number of sides on each die.
+        size (int): Number of rolls.
+
+    Returns:
+        numpy.ndarray: size sums of number dice.
+    """
+    return _roll_batch(number, dice_sides, size)
     
 def roll_main_statistics(Statistics):
     """
@@ -111,8 +241,6 @@ def roll_main_statistics(Statistics):
             if index < 5:
                 Statistics[key] = roll_statistic()
                 stats_total = stats_total + Statistics[key]
-                print(key, Statistics[key])
-        print("Total:", stats_total)
     return Statistics
 
 def roll_ap(deviceap):
@@ -150,12 +278,12 @@ def roll_ap(deviceap):
                 plus = int(roll_plus[1])
                 roll_mult = roll_plus[0].split('x')
                 roll_list = roll_mult[0].split('d')
-                devap = roll_effects(int(roll_list[0]), int(roll_list[1])) * int(roll_mult[1]) + plus
+                devap = _roll(int(roll_list[0]), int(roll_list[1]), deviceap_str) * int(roll_mult[1]) + plus
                 return devap
             else:
                 roll_mult = deviceap_str.split('x')
                 roll_list = roll_mult[0].split('d')
-                devap = roll_effects(int(roll_list[0]), int(roll_list[1])) * int(roll_mult[1])
+                devap = _roll(int(roll_list[0]), int(roll_list[1]), deviceap_str) * int(roll_mult[1])
                 return devap
         
         # Handle simple dice rolls with addition: "1d6+3"
@@ -164,7 +292,7 @@ def roll_ap(deviceap):
             plus = int(roll_plus[1])
             if 'd' in roll_plus[0]:
                 roll_list = roll_plus[0].split('d')
-                devap = roll_effects(int(roll_list[0]), int(roll_list[1])) + plus
+                devap = _roll(int(roll_list[0]), int(roll_list[1]), deviceap_str) + plus
                 return devap
             else:
                 return int(roll_plus[0]) + plus
@@ -172,13 +300,13 @@ def roll_ap(deviceap):
         # Handle simple dice rolls: "2d6"
         elif 'd' in deviceap_str:
             roll_list = deviceap_str.split('d')
-            devap = roll_effects(int(roll_list[0]), int(roll_list[1]))
+            devap = _roll(int(roll_list[0]), int(roll_list[1]), deviceap_str)
             return devap
         
         # Handle 'or' statements
         elif 'or' in deviceap_str:
             roll_list = deviceap_str.split('or')
-            devcheck = roll_effects(1, 100)
+            devcheck = _roll(1, 100, deviceap_str)
             if devcheck <= 50:
                 devap = 20
             else:
@@ -192,3 +320,68 @@ def roll_ap(deviceap):
         # If parsing fails, return the original string
         return deviceap_str
 
+def _dice_formula(deviceap):
+    """
+    Parse a plain dice formula.
+
+    Returns:
+        tuple: (number, sides, multiplier, plus) for "2d6", "1d6+3", "2d4x4" or
+               "2d4x4+3", or None for anything roll_ap() handles otherwise.
+
+    Raises:
+        ValueError: If the number of dice or their sides are out of range.
+    """
+    deviceap_str = str(deviceap)
+    if 'd' not in deviceap_str or 'or' in deviceap_str:
+        return None
+    try:
+        plus = 0
+        if '+' in deviceap_str:
+            deviceap_str, plus_str = deviceap_str.split('+')
+            plus = int(plus_str)
+        multiplier = 1
+        if 'x' in deviceap_str:
+            deviceap_str, multiplier_str = deviceap_str.split('x')
+            multiplier = int(multiplier_str)
+        number, sides = deviceap_str.split('d')
+        number, sides = int(number), int(sides)
+    except ValueError:
+        return None
+    if not 1 <= number <= _MAX_DICE or not 1 <= sides <= _MAX_SIDES:
+        raise ValueError(f"Dice formula {deviceap} needs 1 to {_MAX_DICE} dice with 1 to {_MAX_SIDES} sides")
+    return number, sides, multiplier, plus
+
+def validate_ap(deviceap):
+    """
+    Check that an AP formula can be rolled, e.g. before queueing a request for it.
+
+    Args:
+        deviceap (str): Formula string as for roll_ap(), e.g. "2d4x4".
+
+    Raises:
+        ValueError: If a dice formula has more than 100 dice or more than 1000 sides.
+    """
+    _dice_formula(deviceap)
+
+def roll_ap_batch(deviceap, size):
+    """
+    Roll an AP formula many times at once.
+
+    Dice formulas are rolled as one numpy array, anything else falls back to roll_ap().
+
+    Args:
+        deviceap (str): Formula string as for roll_ap(), e.g. "2d4x4".
+        size (int): Number of rolls.
+
+    Returns:
+        list: size results, as roll_ap() would return them.
+
+    Raises:
+        ValueError: If a dice formula has more than 100 dice or more than 1000 sides.
+    """
+    formula = _dice_formula(deviceap)
+    if formula is None:
+        return [roll_ap(deviceap) for roll in range(size)]
+    number, sides, multiplier, plus = formula
+    totals = _roll_batch(number, sides, size, str(deviceap))
+    return (totals * multiplier + plus).tolist()
@@ -0,0 +1,67 @@
+"""
+Super Squadron Roster Module
+
+This module converts lists of Character dictionaries into columnar numpy arrays.
+A columnar roster keeps one array per statistic or derived value, which is the
+layout used by the batch tools (combat sweeps, indexes and simulators).
+
+Columns are stored as int32 arrays so they can be placed in shared memory
+without conversion.
+"""
+
+import numpy as np
+
+__all__ = [
+    'STAT_COLUMNS',
+    'DERIVED_COLUMNS',
+    'ROSTER_COLUMNS',
+    'to_columns',
+    'stack_columns'
+]
+
+STAT_COLUMNS = ['Strength', 'Agility', 'Charisma', 'Intelligence', 'Stamina', 'PublicStanding', 'Ego', 'Luck']
+DERIVED_COLUMNS = ['HitPoints', 'ActionPotential', 'DirectDamage']
+ROSTER_COLUMNS = STAT_COLUMNS + DERIVED_COLUMNS
+
+
+def _to_int(value):
+    """Convert a character value to int, treating missing or non-numeric values as 0."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def to_columns(characters):
+    """
+    Convert Character dictionaries into a columnar roster.
+
+    Args:
+        characters (list): Character dictionaries as produced by the generator.
+
+    Returns:
+        dict: Column name to int32 numpy array, one entry per character.
+    """
+    count = len(characters)
+    columns = {name: np.zeros(count, dtype=np.int32) for name in ROSTER_COLUMNS}
+    for index, Character in enumerate(characters):
+        statistics = Character.get('Statistics', {})
+        for name in STAT_COLUMNS:
+            columns[name][index] = _to_int(statistics.get(name, 0))
+        for name in DERIVED_COLUMNS:
+            columns[name][index] = _to_int(Character.get(name, 0))
+    return columns
+
+def stack_columns(columns, names=None):
+    """
+    Stack roster columns into a single 2D array.
+
+    Args:
+        columns (dict): Columnar roster from to_columns().
+        names (list): Column order, defaults to ROSTER_COLUMNS.
+
+    Returns:
+        numpy.ndarray: int32 array of shape (len(names), characters).
+    """
+    if names is None:
+        names = ROSTER_COLUMNS
+    return np.ascontiguousarray(np.stack([columns[name] for name in names]).astype(np.int32))
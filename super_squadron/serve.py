@@ -0,0 +1,466 @@
+"""
+Super Squadron Serve Module
+
+This module runs a local asyncio generation service so GM tools can request
+characters, NPC reactions and dice rolls without running the generator
+in-process:
+
+    python -m super_squadron.serve --port 8765
+
+The protocol is newline-delimited JSON over TCP. Each request line is an object
+with a "type" and an optional "id" that is echoed in the response:
+
+    {"id": 1, "type": "character", "count": 2}
+    {"id": 4, "type": "character", "seed": 7, "index": 734211}
+    {"id": 2, "type": "reaction", "dm": -15}
+    {"id": 3, "type": "roll", "formula": "2d4x4", "count": 10}
+
+Responses are {"id": ..., "result": ...} or {"id": ..., "error": "..."} and are
+written as soon as they are ready, so pipelined requests can complete out of
+order. A character request with a seed returns the characters at index,
+index + 1, ... of that seeded roster, the same on every call. Concurrent
+requests of a type are coalesced into micro-batches: reactions
+and rolls are drawn as numpy arrays and characters generated in chunks, all in a
+process pool so the event loop never blocks on them.
+
+With --reload-interval the server and every pool process watch the data CSVs
+and swap in edited tables between requests, without a restart.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+
+from super_squadron.character import generate_character
+from super_squadron.gm import roll_npc_reactions
+from super_squadron.roll import roll_ap_batch, validate_ap
+from super_squadron.tables import registry
+
+__all__ = [
+    'REQUEST_TYPES',
+    'MAX_COUNT',
+    'MicroBatcher',
+    'GenerationServer',
+    'request',
+    'benchmark'
+]
+
+REQUEST_TYPES = ['character', 'reaction', 'roll']
+
+# Largest count accepted in a single request
+MAX_COUNT = 1000
+
+
+def _seed_worker(reload_interval=None):
+    """Give each pool process its own random state instead of the parent's copy, and watch the tables."""
+    np.random.seed()
+    if reload_interval:
+        registry.start(reload_interval)
+
+def _generate_characters(count):
+    """Generate characters in a pool process."""
+    return [generate_character() for character in range(count)]
+
+def _generate_seeded(seed, index, count):
+    """Generate characters of a seeded roster in a pool process."""
+    return [generate_character(seed, index + offset) for offset in range(count)]
+
+def _roll_formulas(totals):
+    """Roll each formula its total number of times in a pool process, or give the error it raised."""
+    rolled = {}
+    for formula, total in totals.items():
+        try:
+            rolled[formula] = roll_ap_batch(formula, total)
+        except Exception as error:
+            rolled[formula] = error
+    return rolled
+
+def _encode(value):
+    """Encode numpy scalars left in results."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _count(message):
+    """Validated count of a request."""
+    count = message.get('count', 1)
+    # bool is a subclass of int, but true is not a count
+    if type(count) is not int or not 1 <= count <= MAX_COUNT:
+        raise ValueError(f"count must be an integer from 1 to {MAX_COUNT}")
+    return count
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent requests into batches.
+
+    The first request of a batch waits at most max_delay seconds for others to
+    join, and a batch is dispatched early once it holds max_batch requests.
+
+    Attributes:
+        handler (callable): Coroutine function taking a list of requests and
+                            returning a list of results in the same order. An
+                            exception in place of a result fails only that request.
+        max_batch (int): Most requests in a batch.
+        max_delay (float): Longest wait in seconds for a batch to fill.
+    """
+
+    def __init__(self, handler, max_batch=64, max_delay=0.002):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        """
+        Add a request to the next batch.
+
+        Args:
+            item: Request passed to the handler.
+
+        Returns:
+            The handler's result for this request.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        """Hand the pending requests to the handler as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        """Run the handler and resolve each request's future."""
+        try:
+            results = await self.handler([item for item, future in batch])
+        except Exception as error:
+            for item, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (item, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class GenerationServer:
+    """
+    Local asyncio server for characters, NPC reactions and dice rolls.
+
+    Attributes:
+        host (str): Address to listen on.
+        port (int): Port to listen on, 0 for any free port (see the port after start()).
+        workers (int): Process pool size for character generation.
+        chunk_size (int): Characters generated per pool task.
+        reload_interval (float): Seconds between checks for edited data tables in
+                                 the server and each pool process, or None to never reload.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, workers=None, max_batch=64, max_delay=0.002, chunk_size=16,
+                 reload_interval=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.reload_interval = reload_interval
+        self._pool = None
+        self._server = None
+        self._batchers = {
+            'character': MicroBatcher(self._characters, max_batch, max_delay),
+            'reaction': MicroBatcher(self._reactions, max_batch, max_delay),
+            'roll': MicroBatcher(self._rolls, max_batch, max_delay)
+        }
+
+    async def start(self):
+        """Start the process pool and begin listening."""
+        workers = self.workers or os.cpu_count() or 1
+        self._pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=_seed_worker,
+                                                            initargs=(self.reload_interval,))
+        # Start the pool processes before the first request arrives
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _generate_characters, 1) for worker in range(workers)))
+        if self.reload_interval:
+            # Only after the pool has forked, so no process inherits the watcher's locks
+            registry.start(self.reload_interval)
+        self._server = await asyncio.start_server(self._connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening and shut down the process pool."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self.reload_interval:
+            registry.stop()
+
+    async def serve_forever(self):
+        """Start the server and run until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def _characters(self, counts):
+        """Generate a batch of character requests in the process pool."""
+        total = sum(counts)
+        loop = asyncio.get_running_loop()
+        sizes = [min(self.chunk_size, total - start) for start in range(0, total, self.chunk_size)]
+        chunks = await asyncio.gather(*(loop.run_in_executor(self._pool, _generate_characters, size)
+                                        for size in sizes))
+        characters = [Character for chunk in chunks for Character in chunk]
+        results = []
+        for count in counts:
+            results.append(characters[:count])
+            characters = characters[count:]
+        return results
+
+    async def _reactions(self, requests):
+        """Roll a batch of NPC reaction requests in one numpy draw in the process pool."""
+        dms = [dm for dm, count in requests for npc in range(count)]
+        npcs = await asyncio.get_running_loop().run_in_executor(self._pool, roll_npc_reactions, len(dms), dms)
+        results = []
+        for dm, count in requests:
+            results.append(npcs[:count])
+            npcs = npcs[count:]
+        return results
+
+    async def _rolls(self, requests):
+        """Roll a batch of dice requests in the process pool, one numpy draw per distinct formula."""
+        totals = {}
+        for formula, count in requests:
+            totals[formula] = totals.get(formula, 0) + count
+        rolled = await asyncio.get_running_loop().run_in_executor(self._pool, _roll_formulas, totals)
+        results = []
+        for formula, count in requests:
+            if isinstance(rolled[formula], Exception):
+                results.append(rolled[formula])
+                continue
+            results.append(rolled[formula][:count])
+            rolled[formula] = rolled[formula][count:]
+        return results
+
+    async def handle(self, message):
+        """
+        Answer one request.
+
+        Args:
+            message (dict): Decoded request.
+
+        Returns:
+            dict: Response with the request's id and a result or an error.
+        """
+        response = {'id': message.get('id')}
+        try:
+            request_type = message.get('type')
+            if request_type == 'character' and 'seed' in message:
+                seed, index = message['seed'], message.get('index', 0)
+                if type(seed) is not int or type(index) is not int:
+                    raise ValueError("seed and index must be integers")
+                count = _count(message)
+                result = await asyncio.get_running_loop().run_in_executor(self._pool, _generate_seeded,
+                                                                          seed, index, count)
+                if 'count' not in message:
+                    result = result[0]
+            elif request_type == 'character':
+                result = await self._batchers['character'].submit(_count(message))
+            elif request_type == 'reaction':
+                count = _count(message)
+                result = await self._batchers['reaction'].submit((int(message.get('dm', 0)), count))
+                if 'count' not in message:
+                    result = result[0]
+            elif request_type == 'roll':
+                if 'formula' not in message:
+                    raise ValueError("roll requests need a formula, e.g. \"2d6\"")
+                formula = str(message['formula'])
+                # Reject oversized dice here so they never reach a shared batch
+                validate_ap(formula)
+                result = await self._batchers['roll'].submit((formula, _count(message)))
+                if 'count' not in message:
+                    result = result[0]
+            else:
+                raise ValueError(f"Unknown request type {request_type}. Expected one of {REQUEST_TYPES}")
+            response['result'] = result
+        except (TypeError, ValueError) as error:
+            response['error'] = str(error)
+        except Exception as error:
+            # Any other failure still gets an answer rather than leaving the client waiting
+            response['error'] = f'{type(error).__name__}: {error}'
+        return response
+
+    async def _respond(self, line, writer):
+        """Decode a request line, answer it and write the response line."""
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError as error:
+            response = {'id': None, 'error': str(error)}
+        else:
+            response = await self.handle(message)
+        writer.write(json.dumps(response, default=_encode).encode() + b'\n')
+
+    async def _connection(self, reader, writer):
+        """Serve one client connection, answering pipelined requests concurrently."""
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def request(host, port, messages):
+    """
+    Send requests over one connection and collect the responses.
+
+    Args:
+        host (str): Server address.
+        port (int): Server port.
+        messages (list): Request dictionaries. Each is given an id if it has none.
+
+    Returns:
+        list: Responses in the order of messages.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    for number, message in enumerate(messages):
+        message.setdefault('id', number)
+        writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    responses = {}
+    while len(responses) < len(messages):
+        response = json.loads(await reader.readline())
+        responses[response['id']] = response
+    writer.close()
+    await writer.wait_closed()
+    return [responses[message['id']] for message in messages]
+
+async def benchmark(host, port, rate=300, seconds=5.0, connections=8, mix=None):
+    """
+    Measure request latency against a running server on localhost.
+
+    Requests are sent at a fixed total rate spread over several connections.
+
+    Args:
+        host (str): Server address.
+        port (int): Server port.
+        rate (float): Requests per second.
+        seconds (float): Length of the run.
+        connections (int): Client connections.
+        mix (list): Request dictionaries to cycle through, defaulting to one
+                    character, one reaction and one roll.
+
+    Returns:
+        dict: Requests, Errors, RequestsPerSecond and latency percentiles P50,
+              P99 and Max in milliseconds.
+    """
+    if mix is None:
+        mix = [{'type': 'character'}, {'type': 'reaction'}, {'type': 'roll', 'formula': '2d6'}]
+    streams = [await asyncio.open_connection(host, port) for connection in range(connections)]
+    sent = {}
+    latencies = []
+    errors = [0]
+
+    async def receive(reader, expected):
+        for response in range(expected):
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - sent.pop(response['id']))
+            if 'error' in response:
+                errors[0] += 1
+
+    total = int(rate * seconds)
+    receivers = [asyncio.ensure_future(receive(reader, len(range(index, total, connections))))
+                 for index, (reader, writer) in enumerate(streams)]
+    start = time.perf_counter()
+    for number in range(total):
+        delay = start + number / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        message = dict(mix[number % len(mix)], id=number)
+        sent[number] = time.perf_counter()
+        streams[number % connections][1].write(json.dumps(message).encode() + b'\n')
+    await asyncio.gather(*receivers)
+    elapsed = time.perf_counter() - start
+    for reader, writer in streams:
+        writer.close()
+        await writer.wait_closed()
+    milliseconds = np.array(latencies) * 1000
+    return {
+        'Requests': total,
+        'Errors': errors[0],
+        'RequestsPerSecond': total / elapsed,
+        'P50': float(np.percentile(milliseconds, 50)),
+        'P99': float(np.percentile(milliseconds, 99)),
+        'Max': float(milliseconds.max())
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local character, reaction and dice generation service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay', type=float, default=0.002, help="Seconds a batch waits to fill")
+    parser.add_argument('--reload-interval', type=float, default=None,
+                        help="Seconds between checks for edited data tables, which are then reloaded")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Start a server on a free port, measure latency against it and exit")
+    parser.add_argument('--rate', type=float, default=300)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    async def main():
+        server = GenerationServer(args.host, 0 if args.benchmark else args.port, args.workers,
+                                  args.max_batch, args.max_delay, reload_interval=args.reload_interval)
+        if not args.benchmark:
+            print(f"Serving on {args.host}:{args.port}")
+            await server.serve_forever()
+            return
+        await server.start()
+        try:
+            summary = await benchmark(args.host, server.port, args.rate, args.seconds)
+        finally:
+            await server.close()
+        print(f"{summary['Requests']} requests at {summary['RequestsPerSecond']:.0f}/s, "
+              f"{summary['Errors']} errors, p50 {summary['P50']:.2f}ms, "
+              f"p99 {summary['P99']:.2f}ms, max {summary['Max']:.2f}ms")
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
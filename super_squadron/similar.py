@@ -0,0 +1,386 @@
+"""
+Super Squadron Similar Module
+
+This module finds the characters most like a given one, e.g. NPCs similar to
+a hero: close statistics and overlapping powers.
+
+Each character is encoded once as a vector of SIMILARITY_STATISTICS and a
+128-bit power bitmask (two uint64 words, one bit per power_details.csv row).
+The distance between two characters is
+
+    Euclidean distance of the statistics / stat_scale + power_weight x (1 - Jaccard)
+
+where Jaccard is the popcount of the bitmasks' AND over the popcount of their OR,
+from np.bitwise_count on numpy 2 and a byte lookup table on older numpy.
+
+SimilarityIndex keeps the encoded roster in a KD-tree whose leaves are blocks of
+up to LEAF_SIZE characters. Blocks are split on their widest statistic at the
+median, and blocks of a few leaves are sorted on it and cut into leaves. Each
+leaf also keeps the OR and the AND of its characters' bitmasks. Every character
+in the leaf has all the AND bits and none outside the OR, so its Jaccard with
+the query is at most popcount(OR & query) / popcount(AND | query). A query
+computes a lower bound for every leaf at once from its bounding box and that
+Jaccard bound, then scores leaves nearest first with numpy in batches that
+double in size, stopping when the next leaf's bound is beyond the k-th best
+distance found. The bounds never exceed a true distance, so the results are
+exact.
+
+benchmark() times building and querying an index of a large roster:
+
+    python -m super_squadron.similar --characters 1000000    # build and query times
+
+Characters added after the tree was built are kept as pending and scanned
+directly, and the tree is rebuilt once enough are pending, so the index can be
+filled as characters are generated.
+"""
+
+import time
+from functools import reduce
+from itertools import chain, islice, repeat
+from operator import itemgetter, or_
+
+import numpy as np
+
+from super_squadron import origins
+from super_squadron.character import generate_character
+from super_squadron.index import MERGE_MINIMUM
+
+__all__ = [
+    'SIMILARITY_STATISTICS',
+    'LEAF_SIZE',
+    'encode',
+    'SimilarityIndex',
+    'benchmark'
+]
+
+SIMILARITY_STATISTICS = ['Strength', 'Agility', 'Charisma', 'Intelligence', 'Stamina', 'Ego', 'Luck']
+_similarity_values = itemgetter(*SIMILARITY_STATISTICS)
+
+# Most characters in a KD-tree leaf. Small leaves have tight boxes and bitmask
+# bounds, and queries score their leaves in batches rather than one at a time
+LEAF_SIZE = 16
+
+# Bits in a power bitmask
+_WORDS = 2
+# Largest block the KD-tree build sorts and cuts into leaves instead of splitting
+_SORTED_BLOCK = 4 * LEAF_SIZE
+# Leaves scored in a query's first batch
+_FIRST_LEAVES = 64
+# Characters encoded at a time by SimilarityIndex.extend()
+_ENCODE_CHUNK = 1 << 16
+
+
+def encode(Character, power_ids=None):
+    """
+    Encode a character for similarity search.
+
+    Args:
+        Character (dict): Character dictionary.
+        power_ids (dict): Power name to bit. Defaults to the power_details.csv rows.
+
+    Returns:
+        tuple: (statistics, bits): a float32 array of SIMILARITY_STATISTICS and
+               a uint64 array of two words with a bit set for each power.
+    """
+    if power_ids is None:
+        power_ids = origins.rules.power_ids
+    statistics, bits = _encode_all([Character], power_ids)
+    return statistics[0], bits[0]
+
+def _encode_all(characters, power_ids):
+    """Encode a list of characters as a float32 statistics array and a uint64 bitmask array, one row each."""
+    power_masks = {power: 1 << bit for power, bit in power_ids.items() if bit < 64 * _WORDS}
+    statistics, masks = [], []
+    for Character in characters:
+        Statistics = Character['Statistics']
+        try:
+            statistics.append(_similarity_values(Statistics))
+        except KeyError:
+            statistics.append([Statistics.get(stat, 0) for stat in SIMILARITY_STATISTICS])
+        masks.append(reduce(or_, map(power_masks.get, Character['Powers']['List'], repeat(0)), 0))
+    count = len(statistics)
+    statistics = np.fromiter(chain.from_iterable(statistics), dtype=np.float32, count=count * len(SIMILARITY_STATISTICS))
+    # Each bitmask as little-endian bytes is its words in order
+    bits = np.frombuffer(b''.join([mask.to_bytes(8 * _WORDS, 'little') for mask in masks]), dtype='<u8')
+    return statistics.reshape(count, -1), bits.astype(np.uint64).reshape(count, _WORDS)
+
+# Bits set in each byte value, for numpy before 2.0, which has no np.bitwise_count
+_BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1, dtype=np.int64)
+
+def _popcount(words):
+    """Bits set in each row of a contiguous uint64 array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return _BYTE_BITS[words.view(np.uint8)].sum(axis=1)
+
+def _jaccard(bits, query):
+    """Jaccard similarity of each row of bits with the query bits; 1 where both are empty."""
+    shared = _popcount(bits & query)
+    either = _popcount(bits | query)
+    return np.where(either > 0, shared / np.maximum(either, 1), 1.0)
+
+def _rows(starts, ends):
+    """Indices of the rows from each start up to its end, in order."""
+    sizes = ends - starts
+    offsets = np.cumsum(sizes) - sizes
+    return np.repeat(starts - offsets, sizes) + np.arange(int(sizes.sum()))
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour index over character statistics and power sets.
+
+    Character IDs are positions in insertion order. Only the encoding is kept,
+    so fetch the characters themselves from the roster they came from.
+    """
+
+    def __init__(self, characters=(), stat_scale=10.0, power_weight=1.0):
+        """
+        Args:
+            characters (iterable): Character dictionaries to index.
+            stat_scale (float): Statistic distance that counts as much as no shared powers.
+            power_weight (float): Weight of the power term.
+        """
+        self.stat_scale = float(stat_scale)
+        self.power_weight = float(power_weight)
+        self._power_ids = dict(origins.rules.power_ids)
+        self._statistics = np.zeros((0, len(SIMILARITY_STATISTICS)), dtype=np.float32)
+        self._bits = np.zeros((0, _WORDS), dtype=np.uint64)
+        self._count = 0
+        self._built = 0
+        self._tree_ids = np.zeros(0, dtype=np.int64)
+        self._tree_statistics = self._statistics
+        self._tree_bits = self._bits
+        self._leaf_starts = np.zeros(0, dtype=np.int64)
+        self._leaf_ends = np.zeros(0, dtype=np.int64)
+        self._leaf_lows = np.zeros((0, len(SIMILARITY_STATISTICS)), dtype=np.float32)
+        self._leaf_highs = np.zeros((0, len(SIMILARITY_STATISTICS)), dtype=np.float32)
+        self._leaf_any = np.zeros((0, _WORDS), dtype=np.uint64)
+        self._leaf_all = np.zeros((0, _WORDS), dtype=np.uint64)
+        self.extend(characters)
+
+    def __repr__(self):
+        return f'SimilarityIndex({self._count} characters, {len(self._leaf_starts)} leaves)'
+
+    def __len__(self):
+        return self._count
+
+    def _grow(self, size):
+        """Make room in the encoded arrays for size characters."""
+        capacity = len(self._statistics)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        statistics = np.zeros((capacity, len(SIMILARITY_STATISTICS)), dtype=np.float32)
+        statistics[:self._count] = self._statistics[:self._count]
+        bits = np.zeros((capacity, _WORDS), dtype=np.uint64)
+        bits[:self._count] = self._bits[:self._count]
+        self._statistics, self._bits = statistics, bits
+
+    def _merge(self, force=False):
+        """Rebuild the KD-tree once enough characters are pending."""
+        pending = self._count - self._built
+        if not pending:
+            return
+        if not force and pending < max(MERGE_MINIMUM, self._count // 16):
+            return
+        statistics = self._statistics[:self._count]
+        order = np.arange(self._count, dtype=np.int64)
+        leaves = []
+        blocks = [(0, self._count)]
+        while blocks:
+            start, end = blocks.pop()
+            block = statistics[order[start:end]]
+            spread = block.max(axis=0) - block.min(axis=0) if end > start else np.zeros(1)
+            if end - start <= LEAF_SIZE or spread.max() == 0:
+                leaves.append((start, end))
+                continue
+            column = block[:, int(np.argmax(spread))]
+            if end - start <= _SORTED_BLOCK:
+                # Sort a small block on its widest statistic and cut it into
+                # leaves, which costs less than splitting it again and again
+                order[start:end] = order[start:end][np.argsort(column, kind='stable')]
+                cuts = np.linspace(start, end, -(-(end - start) // LEAF_SIZE) + 1).astype(np.int64).tolist()
+                leaves.extend(zip(cuts[:-1], cuts[1:]))
+                continue
+            # Split on the widest statistic at its median
+            middle = (end - start) // 2
+            split = np.argpartition(column, middle)
+            order[start:end] = order[start:end][split]
+            blocks.append((start, start + middle))
+            blocks.append((start + middle, end))
+        leaves.sort()
+        self._tree_ids = order
+        self._tree_statistics = np.ascontiguousarray(statistics[order])
+        self._tree_bits = np.ascontiguousarray(self._bits[:self._count][order])
+        self._leaf_starts = np.array([start for start, end in leaves], dtype=np.int64)
+        self._leaf_ends = np.array([end for start, end in leaves], dtype=np.int64)
+        self._leaf_lows = np.minimum.reduceat(self._tree_statistics, self._leaf_starts, axis=0)
+        self._leaf_highs = np.maximum.reduceat(self._tree_statistics, self._leaf_starts, axis=0)
+        self._leaf_any = np.bitwise_or.reduceat(self._tree_bits, self._leaf_starts, axis=0)
+        self._leaf_all = np.bitwise_and.reduceat(self._tree_bits, self._leaf_starts, axis=0)
+        self._built = self._count
+
+    def add(self, Character):
+        """
+        Index a character.
+
+        Args:
+            Character (dict): Character dictionary.
+
+        Returns:
+            int: Assigned character ID.
+        """
+        character_id = self._count
+        self._grow(character_id + 1)
+        self._statistics[character_id], self._bits[character_id] = encode(Character, self._power_ids)
+        self._count += 1
+        self._merge()
+        return character_id
+
+    def extend(self, characters):
+        """
+        Index several characters, building the KD-tree once at the end.
+
+        Args:
+            characters (iterable): Character dictionaries.
+
+        Returns:
+            list: Assigned character IDs.
+        """
+        first_id = self._count
+        characters = iter(characters)
+        while True:
+            chunk = list(islice(characters, _ENCODE_CHUNK))
+            if not chunk:
+                break
+            self._grow(self._count + len(chunk))
+            end = self._count + len(chunk)
+            self._statistics[self._count:end], self._bits[self._count:end] = _encode_all(chunk, self._power_ids)
+            self._count = end
+        self._merge(force=True)
+        return list(range(first_id, self._count))
+
+    def _distances(self, statistics, bits, query_statistics, query_bits):
+        """Distances of encoded characters from the query, and their statistic distances and Jaccards."""
+        stat_distances = np.sqrt(((statistics - query_statistics) ** 2).sum(axis=1))
+        jaccards = _jaccard(bits, query_bits)
+        return stat_distances / self.stat_scale + self.power_weight * (1.0 - jaccards), stat_distances, jaccards
+
+    def _bounds(self, query_statistics, query_bits):
+        """Lower bound of the distance from the query to any character in each leaf."""
+        gaps = np.maximum(np.maximum(self._leaf_lows - query_statistics, query_statistics - self._leaf_highs), 0)
+        stat_bounds = np.sqrt((gaps ** 2).sum(axis=1)) / self.stat_scale
+        shared = _popcount(self._leaf_any & query_bits)
+        either = _popcount(self._leaf_all | query_bits)
+        jaccard_bounds = np.where(either > 0, shared / np.maximum(either, 1), 1.0)
+        return stat_bounds + self.power_weight * (1.0 - jaccard_bounds)
+
+    def query(self, Character, k=10, exclude=()):
+        """
+        Find the characters most similar to one.
+
+        Args:
+            Character (dict): Character to match, indexed or not.
+            k (int): Number of matches.
+            exclude (iterable): Character IDs to leave out, e.g. the character's own.
+
+        Returns:
+            list: Up to k dictionaries with 'Id', 'Distance', 'StatDistance'
+                  and 'Jaccard', nearest first.
+        """
+        query_statistics, query_bits = encode(Character, self._power_ids)
+        exclude = np.array(sorted(set(exclude)), dtype=np.int64)
+        found_ids = [np.zeros(0, dtype=np.int64)]
+        found = [np.zeros((0, 3))]
+        kth = np.inf
+
+        def keep(ids, statistics, bits):
+            """Score a block and keep the best k found so far."""
+            nonlocal kth
+            if len(exclude):
+                kept = ~np.isin(ids, exclude)
+                ids, statistics, bits = ids[kept], statistics[kept], bits[kept]
+            distances, stat_distances, jaccards = self._distances(statistics, bits, query_statistics, query_bits)
+            found_ids.append(ids)
+            found.append(np.column_stack([distances, stat_distances, jaccards]))
+            all_ids, all_found = np.concatenate(found_ids), np.concatenate(found)
+            if len(all_ids) > k:
+                best = np.argpartition(all_found[:, 0], k - 1)[:k]
+                all_ids, all_found = all_ids[best], all_found[best]
+            found_ids[:] = [all_ids]
+            found[:] = [all_found]
+            if len(all_ids) == k:
+                kth = all_found[:, 0].max()
+
+        # Characters added since the tree was built are scanned directly
+        if self._built < self._count:
+            keep(np.arange(self._built, self._count, dtype=np.int64), self._statistics[self._built:self._count],
+                 self._bits[self._built:self._count])
+        bounds = self._bounds(query_statistics, query_bits)
+        leaves = np.argsort(bounds, kind='stable')
+        bounds = bounds[leaves]
+        done, batch = 0, _FIRST_LEAVES
+        while done < len(leaves) and bounds[done] <= kth:
+            # Score the next leaves nearest first, as many as the batch size
+            # that are within the k-th best distance so far
+            stop = max(min(done + batch, int(np.searchsorted(bounds, kth, side='right'))), done + 1)
+            rows = _rows(self._leaf_starts[leaves[done:stop]], self._leaf_ends[leaves[done:stop]])
+            keep(self._tree_ids[rows], self._tree_statistics[rows], self._tree_bits[rows])
+            done, batch = stop, batch * 2
+
+        ids, results = found_ids[0], found[0]
+        order = np.lexsort((ids, results[:, 0]))
+        return [{'Id': int(ids[row]), 'Distance': float(results[row, 0]), 'StatDistance': float(results[row, 1]),
+                 'Jaccard': float(results[row, 2])} for row in order.tolist()]
+
+def benchmark(characters=1000000, queries=200, sample=5000, k=10, seed=0):
+    """
+    Time building a SimilarityIndex over a large roster and querying it.
+
+    Generating a million characters would take minutes, so the roster pairs the
+    statistics of one of sample generated characters with the powers of
+    another, both picked at random. The queries are newly generated characters.
+
+    Args:
+        characters (int): Roster size.
+        queries (int): Queries timed.
+        sample (int): Characters generated for the roster.
+        k (int): Matches per query.
+        seed (int): Seed for the sample, the pairing and the queries.
+
+    Returns:
+        dict: 'Characters', 'Leaves', 'BuildSeconds' and the median and
+              largest query times, 'MedianQuerySeconds' and 'MaxQuerySeconds'.
+    """
+    np.random.seed(seed)
+    generated = [generate_character() for index in range(sample)]
+    pairs = np.random.randint(sample, size=(characters, 2)).tolist()
+    roster = [{'Statistics': generated[first]['Statistics'], 'Powers': generated[second]['Powers']}
+              for first, second in pairs]
+    wanted = [generate_character() for index in range(queries)]
+
+    start = time.perf_counter()
+    index = SimilarityIndex(roster)
+    build = time.perf_counter() - start
+    times = []
+    for Character in wanted:
+        start = time.perf_counter()
+        index.query(Character, k)
+        times.append(time.perf_counter() - start)
+    return {'Characters': characters, 'Leaves': len(index._leaf_starts), 'BuildSeconds': build,
+            'MedianQuerySeconds': float(np.median(times)), 'MaxQuerySeconds': max(times)}
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time building and querying a similarity index")
+    parser.add_argument('--characters', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--sample', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    summary = benchmark(args.characters, args.queries, args.sample, seed=args.seed)
+    print(f"{summary['Characters']} characters in {summary['Leaves']} leaves, built in {summary['BuildSeconds']:.1f} s")
+    print(f"query median {summary['MedianQuerySeconds'] * 1e3:.1f} ms, max {summary['MaxQuerySeconds'] * 1e3:.1f} ms")
@@ -0,0 +1,417 @@
+"""
+Super Squadron Store Module
+
+This module persists rosters of Character dictionaries in SQLite so they can
+be queried without loading and scanning JSON.
+
+Characters are normalized into four tables:
+    characters     one row per character with origin, statistics and derived
+                   values as indexed columns, plus the rest of the character
+    powers         the character's power list, indexed by power name
+    power_details  each power's detail dictionary
+    devices        device details for powers that are devices, indexed by power
+
+The rest of the character, the power details and the device details are
+pickled dictionaries, which take about two fifths of the time to write that
+JSON does. Only dictionaries, lists, tuples, strings, numbers, booleans and None
+are pickled, and they are read back without loading any class, so a stored
+value cannot run code. Stores written before this hold JSON text, which is
+still read.
+
+Inserts are batched with executemany inside transactions, and queries stream
+Character dictionaries back lazily.
+"""
+
+import io
+import json
+import pickle
+import sqlite3
+from itertools import count, repeat
+
+import numpy as np
+
+__all__ = [
+    'RANGE_COLUMNS',
+    'RosterStore'
+]
+
+STATISTIC_COLUMNS = ['Strength', 'Agility', 'Charisma', 'Intelligence', 'Stamina', 'PublicStanding', 'Ego', 'Luck']
+DERIVED_COLUMNS = ['HitPoints', 'ActionPotential', 'DirectDamage']
+# Columns query() can filter by range. Only the derived columns are indexed: Age and
+# the statistics span few values, so their filters scan rather than slow every bulk load
+RANGE_COLUMNS = ['Age'] + STATISTIC_COLUMNS + DERIVED_COLUMNS
+_STATISTICS_SELECT = ', '.join(f'c.{column}' for column in STATISTIC_COLUMNS)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    id INTEGER PRIMARY KEY,
+    Origin TEXT,
+    Age INTEGER,
+    {statistics},
+    {derived},
+    Body BLOB
+);
+CREATE TABLE IF NOT EXISTS powers (
+    character_id INTEGER NOT NULL,
+    Position INTEGER NOT NULL,
+    Power TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS power_details (
+    character_id INTEGER NOT NULL,
+    Power TEXT NOT NULL,
+    Detail BLOB
+);
+CREATE TABLE IF NOT EXISTS devices (
+    character_id INTEGER NOT NULL,
+    Power TEXT NOT NULL,
+    DeviceAP,
+    DeviceRange,
+    Device BLOB
+);
+""".format(
+    statistics=',\n    '.join(f'{column} INTEGER' for column in STATISTIC_COLUMNS),
+    derived=',\n    '.join(f'{column} INTEGER' for column in DERIVED_COLUMNS)
+)
+
+_INDEXES = {
+    'characters_origin': 'characters (Origin)',
+    'powers_power': 'powers (Power, character_id)',
+    'powers_character': 'powers (character_id)',
+    'power_details_character': 'power_details (character_id)',
+    'devices_power': 'devices (Power, character_id)',
+    'devices_character': 'devices (character_id)'
+}
+for column in DERIVED_COLUMNS:
+    _INDEXES['characters_' + column] = f'characters ({column})'
+
+
+def _np_encoder(value):
+    """Encode numpy scalars left in character dictionaries."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+_encoder = json.JSONEncoder(default=_np_encoder, separators=(',', ':'))
+_json = _encoder.encode
+
+_PICKLE_PROTOCOL = 4
+
+class _Pickler(pickle.Pickler):
+    """Pickler that refuses objects of classes, such as numpy scalars, instead of pickling a reference to the class."""
+
+    def reducer_override(self, obj):
+        # Called only for objects pickle has no built-in support for
+        raise TypeError(f"Object of type {type(obj).__name__} is not stored as it is")
+
+class _Unpickler(pickle.Unpickler):
+    """Unpickler that loads no classes or functions."""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Stored values do not refer to {module}.{name}")
+
+def _plain(value):
+    """A copy of a value with numpy scalars and subclasses of str, int and float made the built-in types."""
+    if isinstance(value, dict):
+        return {_plain(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return tuple(map(_plain, value))
+    if isinstance(value, list):
+        return list(map(_plain, value))
+    if isinstance(value, np.generic):
+        return value.item()
+    for kind in (str, bool, int, float):
+        if isinstance(value, kind):
+            return kind(value)
+    if value is None:
+        return value
+    raise TypeError(f"Object of type {type(value).__name__} cannot be stored")
+
+def _loads(data):
+    """Read a dictionary pickled by RosterStore._dumps(), or written as JSON text by older stores."""
+    if isinstance(data, bytes):
+        return _Unpickler(io.BytesIO(data)).load()
+    return json.loads(data)
+
+_EMPTY = pickle.dumps({}, _PICKLE_PROTOCOL)
+
+def _scalar(value):
+    """Column value for a device AP or range: numbers and strings are stored as they are."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return _json(value)
+
+# Column values _integer() would return unchanged
+_INTEGER_TYPES = {int, type(None)}
+
+def _integer(value):
+    """Integer column value, or None when the value is missing or not a number."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RosterStore:
+    """
+    SQLite store for rosters of characters.
+
+    Attributes:
+        path (str): Database path, ':memory:' for an in-memory store.
+        connection (sqlite3.Connection): Open database connection.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute('PRAGMA cache_size = -65536')
+        self.connection.execute('PRAGMA temp_store = MEMORY')
+        self.connection.executescript(_SCHEMA)
+        self._create_indexes()
+        # One pickler reused for every stored dictionary, which saves creating one each time
+        self._buffer = io.BytesIO()
+        self._pickler = _Pickler(self._buffer, _PICKLE_PROTOCOL)
+
+    def __repr__(self):
+        return f'RosterStore({self.path})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM characters').fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def _create_indexes(self):
+        """Create any missing indexes."""
+        with self.connection:
+            for name, target in _INDEXES.items():
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+    def _drop_indexes(self):
+        """Drop the secondary indexes ahead of a bulk load."""
+        with self.connection:
+            for name in _INDEXES:
+                self.connection.execute(f'DROP INDEX IF EXISTS {name}')
+
+    def add(self, characters, batch_size=50000):
+        """
+        Insert characters in batched transactions.
+
+        Loading into an empty store drops the secondary indexes and rebuilds
+        them once at the end, which is much faster than maintaining them row by row,
+        and runs without a journal or syncing to disk, so an interrupted bulk load
+        leaves a store that should be discarded.
+
+        Args:
+            characters (iterable): Character dictionaries.
+            batch_size (int): Characters per transaction.
+
+        Returns:
+            list: Assigned character IDs, in insertion order.
+        """
+        next_id = self.connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM characters').fetchone()[0]
+        bulk = next_id == 1
+        if bulk:
+            self._drop_indexes()
+            journal_mode = self.connection.execute('PRAGMA journal_mode').fetchone()[0]
+            self.connection.execute('PRAGMA journal_mode = OFF')
+            self.connection.execute('PRAGMA synchronous = OFF')
+        character_ids = []
+        batch = []
+        try:
+            for Character in characters:
+                batch.append(Character)
+                if len(batch) >= batch_size:
+                    character_ids.extend(self._insert(batch, next_id + len(character_ids)))
+                    batch = []
+            if batch:
+                character_ids.extend(self._insert(batch, next_id + len(character_ids)))
+        finally:
+            if bulk:
+                self._create_indexes()
+                self.connection.execute('PRAGMA synchronous = NORMAL')
+                self.connection.execute(f'PRAGMA journal_mode = {journal_mode}')
+        return character_ids
+
+    def _dumps(self, value):
+        """Pickle a dictionary, made plain by _plain() first if it holds objects of other classes."""
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._pickler.clear_memo()
+        try:
+            self._pickler.dump(value)
+        except TypeError:
+            return self._dumps(_plain(value))
+        return self._buffer.getvalue()
+
+    def _insert(self, batch, first_id):
+        """Insert one batch of characters inside a single transaction."""
+        character_rows = []
+        power_rows = []
+        detail_rows = []
+        device_rows = []
+        character_ids = list(range(first_id, first_id + len(batch)))
+        dumps = self._dumps
+        for character_id, Character in zip(character_ids, batch):
+            # Statistics and Powers are rebuilt from their own columns and tables
+            body = Character.copy()
+            statistics = body.pop('Statistics', {})
+            powers = body.pop('Powers', {})
+            origin = Character.get('Origin', {})
+            body['PowersNumber'] = powers.get('Number', len(powers.get('List', [])))
+            numbers = [origin.get('Age'), *map(statistics.get, STATISTIC_COLUMNS), *map(Character.get, DERIVED_COLUMNS)]
+            if not _INTEGER_TYPES.issuperset(map(type, numbers)):
+                numbers = list(map(_integer, numbers))
+            character_rows.append((character_id, origin.get('Origin'), *numbers, dumps(body)))
+            power_rows.extend(zip(repeat(character_id), count(), powers.get('List', [])))
+            for power, detail in powers.get('Detail', {}).items():
+                if not detail:
+                    detail_rows.append((character_id, power, _EMPTY))
+                    continue
+                device = detail.get('Device')
+                if device is not None:
+                    detail = {key: value for key, value in detail.items() if key != 'Device'}
+                detail_rows.append((character_id, power, dumps(detail)))
+                if device is not None:
+                    device_rows.append((character_id, power, _scalar(device.get('DeviceAP')),
+                                        _scalar(device.get('DeviceRange')), dumps(device)))
+
+        placeholders = ', '.join('?' * (3 + len(STATISTIC_COLUMNS) + len(DERIVED_COLUMNS) + 1))
+        with self.connection:
+            self.connection.executemany(f'INSERT INTO characters VALUES ({placeholders})', character_rows)
+            self.connection.executemany('INSERT INTO powers VALUES (?, ?, ?)', power_rows)
+            self.connection.executemany('INSERT INTO power_details VALUES (?, ?, ?)', detail_rows)
+            self.connection.executemany('INSERT INTO devices VALUES (?, ?, ?, ?, ?)', device_rows)
+        return character_ids
+
+    def _where(self, origin=None, powers=None, devices=None, ranges=None):
+        """Build the WHERE clause and parameters for a query."""
+        clauses = []
+        parameters = []
+        if origin is not None:
+            origins = [origin] if isinstance(origin, str) else list(origin)
+            clauses.append(f"c.Origin IN ({', '.join('?' * len(origins))})")
+            parameters.extend(origins)
+        for power in powers or []:
+            clauses.append('EXISTS (SELECT 1 FROM powers p WHERE p.Power = ? AND p.character_id = c.id)')
+            parameters.append(power)
+        for power in devices or []:
+            clauses.append('EXISTS (SELECT 1 FROM devices d WHERE d.Power = ? AND d.character_id = c.id)')
+            parameters.append(power)
+        for column, (minimum, maximum) in (ranges or {}).items():
+            if column not in RANGE_COLUMNS:
+                raise ValueError(f"Cannot filter on {column}. Expected one of {RANGE_COLUMNS}")
+            if minimum is not None:
+                clauses.append(f'c.{column} >= ?')
+                parameters.append(minimum)
+            if maximum is not None:
+                clauses.append(f'c.{column} <= ?')
+                parameters.append(maximum)
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return where, parameters
+
+    def count(self, origin=None, powers=None, devices=None, ranges=None):
+        """
+        Count characters matching a query. Arguments are as for query().
+
+        Returns:
+            int: Number of matching characters.
+        """
+        where, parameters = self._where(origin, powers, devices, ranges)
+        return self.connection.execute(f'SELECT COUNT(*) FROM characters c{where}', parameters).fetchone()[0]
+
+    def ids(self, origin=None, powers=None, devices=None, ranges=None):
+        """
+        Get the IDs of characters matching a query. Arguments are as for query().
+
+        Returns:
+            list: Matching character IDs in ascending order.
+        """
+        where, parameters = self._where(origin, powers, devices, ranges)
+        rows = self.connection.execute(f'SELECT c.id FROM characters c{where} ORDER BY c.id', parameters)
+        return [row[0] for row in rows]
+
+    def query(self, origin=None, powers=None, devices=None, ranges=None, limit=None, fetch_size=500):
+        """
+        Stream characters matching a query.
+
+        Example: Aliens with Force Beam and ActionPotential over 50 is
+        query(origin='Alien', powers=['Force Beam'], ranges={'ActionPotential': (51, None)}).
+
+        Args:
+            origin (str or list): Origin name or names.
+            powers (list): Powers the character must have.
+            devices (list): Powers the character must have as devices.
+            ranges (dict): Column name to an inclusive (minimum, maximum) pair, either may be None.
+            limit (int): Maximum number of characters.
+            fetch_size (int): Characters fetched and rebuilt per round trip.
+
+        Yields:
+            dict: Character dictionaries with the 'id' they were stored under.
+        """
+        where, parameters = self._where(origin, powers, devices, ranges)
+        sql = f'SELECT c.id, {_STATISTICS_SELECT}, c.Body FROM characters c{where} ORDER BY c.id'
+        if limit is not None:
+            sql = sql + ' LIMIT ?'
+            parameters.append(int(limit))
+        cursor = self.connection.execute(sql, parameters)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from self._rebuild(rows)
+
+    def get(self, character_id):
+        """
+        Get a single character.
+
+        Args:
+            character_id (int): ID returned by add().
+
+        Returns:
+            dict: Character dictionary, or None if there is no such character.
+        """
+        rows = self.connection.execute(f'SELECT c.id, {_STATISTICS_SELECT}, c.Body FROM characters c WHERE c.id = ?',
+                                       (character_id,)).fetchall()
+        for Character in self._rebuild(rows):
+            return Character
+        return None
+
+    def _rebuild(self, rows):
+        """Rebuild Character dictionaries for a batch of (id, statistics..., Body) rows."""
+        characters = {}
+        for row in rows:
+            character_id = row[0]
+            body = _loads(row[-1])
+            Character = {'Statistics': dict(zip(STATISTIC_COLUMNS, row[1:-1]))}
+            Character.update(body)
+            number = Character.pop('PowersNumber')
+            Character['Powers'] = {'Number': number, 'List': [], 'Detail': {}}
+            Character['id'] = character_id
+            characters[character_id] = Character
+
+        placeholders = ', '.join('?' * len(characters))
+        character_ids = list(characters)
+        for character_id, power in self.connection.execute(
+                f'SELECT character_id, Power FROM powers WHERE character_id IN ({placeholders}) '
+                f'ORDER BY character_id, Position', character_ids):
+            characters[character_id]['Powers']['List'].append(power)
+        for character_id, power, detail in self.connection.execute(
+                f'SELECT character_id, Power, Detail FROM power_details WHERE character_id IN ({placeholders}) '
+                f'ORDER BY rowid', character_ids):
+            characters[character_id]['Powers']['Detail'][power] = _loads(detail)
+        for character_id, power, device in self.connection.execute(
+                f'SELECT character_id, Power, Device FROM devices WHERE character_id IN ({placeholders})',
+                character_ids):
+            characters[character_id]['Powers']['Detail'][power]['Device'] = _loads(device)
+        return list(characters.values())
@@ -0,0 +1,237 @@
+"""
+Super Squadron Sweep Module
+
+This module runs round-robin combat sweeps across a roster using several
+processes. Every character is fought against every other character with the
+battle kernel from combat.py and the outcomes are collected in a win matrix.
+
+The roster's columnar arrays are placed in multiprocessing.shared_memory once.
+Workers attach to that segment, pull pairing blocks from a queue and write
+their results straight into a shared output matrix, so characters are never
+pickled. Completed blocks are checkpointed to disk and a sweep can be resumed
+from its checkpoint.
+
+Requires Python 3.8+ for multiprocessing.shared_memory.
+"""
+
+import hashlib
+import multiprocessing as mp
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from super_squadron.combat import battle_block
+from super_squadron.roster import stack_columns, to_columns
+
+__all__ = [
+    'block_pairs',
+    'run_sweep',
+    'print_progress'
+]
+
+
+def block_pairs(count, block_size):
+    """
+    Split the upper triangle of a count x count matrix into pairing blocks.
+
+    Args:
+        count (int): Number of characters in the roster.
+        block_size (int): Number of characters per block edge.
+
+    Returns:
+        list: (row_start, row_stop, col_start, col_stop) tuples.
+    """
+    starts = list(range(0, count, block_size))
+    blocks = []
+    for row_index, row_start in enumerate(starts):
+        row_stop = min(row_start + block_size, count)
+        for col_start in starts[row_index:]:
+            col_stop = min(col_start + block_size, count)
+            blocks.append((row_start, row_stop, col_start, col_stop))
+    return blocks
+
+def _block_pairings(block):
+    """Return the number of distinct pairings resolved by a block."""
+    row_start, row_stop, col_start, col_stop = block
+    if row_start == col_start:
+        size = row_stop - row_start
+        return size * (size - 1) // 2
+    return (row_stop - row_start) * (col_stop - col_start)
+
+def _fingerprint(stacked, block_size):
+    """Hash the roster and block layout so a checkpoint cannot be applied to another roster."""
+    digest = hashlib.sha256(stacked.tobytes())
+    digest.update(str((stacked.shape, block_size)).encode())
+    return digest.hexdigest()
+
+def _load_checkpoint(checkpoint, fingerprint, output, done_mask):
+    """Restore a previous sweep's results into output and done_mask."""
+    with np.load(checkpoint) as saved:
+        if str(saved['fingerprint']) != fingerprint:
+            raise ValueError(f"Checkpoint {checkpoint} was written for a different roster or block size")
+        output[:] = saved['output']
+        done_mask[:] = saved['done']
+
+def _save_checkpoint(checkpoint, fingerprint, output, done_mask):
+    """Write the sweep state atomically so an interrupted save never corrupts the checkpoint."""
+    temp_file = checkpoint + '.tmp'
+    with open(temp_file, 'wb') as f:
+        np.savez(f, output=output, done=done_mask, fingerprint=np.array(fingerprint))
+    os.replace(temp_file, checkpoint)
+
+def _sweep_worker(roster_name, roster_shape, output_name, count, blocks, tasks, done):
+    """Attach to the shared roster and output, then resolve blocks until a None task arrives."""
+    roster_shm = shared_memory.SharedMemory(name=roster_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    stacked = np.ndarray(roster_shape, dtype=np.int32, buffer=roster_shm.buf)
+    output = np.ndarray((count, count), dtype=np.int8, buffer=output_shm.buf)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            row_start, row_stop, col_start, col_stop = blocks[task]
+            result = battle_block(stacked, slice(row_start, row_stop), slice(col_start, col_stop))
+            output[row_start:row_stop, col_start:col_stop] = result
+            output[col_start:col_stop, row_start:row_stop] = -result.T
+            done.put(task)
+    finally:
+        del stacked, output
+        roster_shm.close()
+        output_shm.close()
+
+def print_progress(pairings_done, pairings_total, pairings_per_second):
+    """Print sweep progress and throughput."""
+    percent = 100.0 * pairings_done / max(pairings_total, 1)
+    print(f"{pairings_done}/{pairings_total} pairings ({percent:.1f}%), {pairings_per_second:,.0f} pairings/s")
+
+def run_sweep(roster, workers=None, block_size=512, checkpoint=None, checkpoint_every=30.0,
+              progress=None, report_every=1.0):
+    """
+    Fight every character in a roster against every other character.
+
+    Args:
+        roster (list or dict): Character dictionaries or a columnar roster from roster.to_columns().
+        workers (int): Number of worker processes, defaults to the CPU count.
+        block_size (int): Characters per block edge. Each block is one queue task.
+        checkpoint (str): Optional .npz path. If it exists the sweep resumes from it,
+                          and it is rewritten every checkpoint_every seconds and at the end.
+        checkpoint_every (float): Seconds between checkpoint writes.
+        progress (callable): Optional callback taking (pairings_done, pairings_total,
+                             pairings_per_second), e.g. print_progress.
+        report_every (float): Seconds between progress callbacks.
+
+    Returns:
+        dict: 'Matrix' (int8 win matrix, WIN/DRAW/LOSS from the row character's view),
+              'Wins' (wins per character), 'Pairings', 'Seconds' and 'PairingsPerSecond'
+              for the work done in this run.
+    """
+    columns = roster if isinstance(roster, dict) else to_columns(roster)
+    stacked = stack_columns(columns)
+    count = stacked.shape[1]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(int(workers), 1)
+
+    blocks = block_pairs(count, block_size)
+    pairings_total = sum(_block_pairings(block) for block in blocks)
+    fingerprint = _fingerprint(stacked, block_size)
+    done_mask = np.zeros(len(blocks), dtype=bool)
+
+    roster_shm = shared_memory.SharedMemory(create=True, size=max(stacked.nbytes, 1))
+    output_shm = shared_memory.SharedMemory(create=True, size=max(count * count, 1))
+    processes = []
+    shared_roster = output = None
+    try:
+        shared_roster = np.ndarray(stacked.shape, dtype=np.int32, buffer=roster_shm.buf)
+        shared_roster[:] = stacked
+        output = np.ndarray((count, count), dtype=np.int8, buffer=output_shm.buf)
+        output[:] = 0
+        if checkpoint is not None and os.path.exists(checkpoint):
+            _load_checkpoint(checkpoint, fingerprint, output, done_mask)
+
+        pending = [task for task in range(len(blocks)) if not done_mask[task]]
+        pairings_done = pairings_total - sum(_block_pairings(blocks[task]) for task in pending)
+        tasks = mp.Queue()
+        done = mp.Queue()
+        for task in pending:
+            tasks.put(task)
+        for worker in range(workers):
+            tasks.put(None)
+        for worker in range(min(workers, max(len(pending), 1))):
+            process = mp.Process(target=_sweep_worker,
+                                 args=(roster_shm.name, stacked.shape, output_shm.name, count, blocks, tasks, done))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+
+        start = time.perf_counter()
+        last_report = start
+        last_checkpoint = start
+        pairings_run = 0
+        remaining = len(pending)
+        while remaining:
+            try:
+                task = done.get(timeout=1.0)
+            except queue.Empty:
+                failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"Sweep worker exited with code {failed[0]}")
+                continue
+            done_mask[task] = True
+            remaining = remaining - 1
+            pairings_run = pairings_run + _block_pairings(blocks[task])
+            now = time.perf_counter()
+            if progress is not None and (now - last_report >= report_every or not remaining):
+                progress(pairings_done + pairings_run, pairings_total, pairings_run / max(now - start, 1e-9))
+                last_report = now
+            if checkpoint is not None and now - last_checkpoint >= checkpoint_every and remaining:
+                _save_checkpoint(checkpoint, fingerprint, output, done_mask)
+                last_checkpoint = now
+
+        for process in processes:
+            process.join()
+        seconds = time.perf_counter() - start
+        if checkpoint is not None:
+            _save_checkpoint(checkpoint, fingerprint, output, done_mask)
+
+        matrix = np.array(output)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        # Views must be released before the segments can be closed
+        shared_roster = output = None
+        roster_shm.close()
+        roster_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
+
+    return {
+        'Matrix': matrix,
+        'Wins': (matrix == 1).sum(axis=1),
+        'Pairings': pairings_run,
+        'Seconds': seconds,
+        'PairingsPerSecond': pairings_run / max(seconds, 1e-9)
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Round-robin combat sweep over a JSON roster")
+    parser.add_argument('roster', help="JSON file holding a list of characters")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--checkpoint', default=None)
+    args = parser.parse_args()
+
+    with open(args.roster) as f:
+        characters = json.load(f)
+    summary = run_sweep(characters, workers=args.workers, block_size=args.block_size,
+                        checkpoint=args.checkpoint, progress=print_progress)
+    print(f"{summary['Pairings']} pairings in {summary['Seconds']:.2f}s")
@@ -0,0 +1,559 @@
+"""
+Super Squadron Tables Module
+
+This module loads the data tables (power_details.csv, powers.csv,
+characteristics.csv, gm.csv, Gimmicks.csv and origins.csv) from a compiled
+binary snapshot, data/tables.npz, instead of parsing the CSVs with pandas.
+
+The CSVs stay the editable source. The snapshot holds each column as a typed
+array, with text cells stored as codes into one table of interned strings, and a
+manifest with the SHA-256 of every CSV it was built from. When a CSV's hash no
+longer matches, the snapshot is rebuilt on the next open. The npz is written
+uncompressed, so its arrays are memory-mapped in place rather than read:
+
+    python -m super_squadron.tables     # build or rebuild data/tables.npz
+
+    gm_table = load_table('gm')
+
+Tables are served by a TableRegistry so long-running workers can pick up CSV
+edits without a restart. Modules that build globals from the tables subscribe
+to the registry, and each reload parses the new tables and rebuilds those
+globals in a background thread before swapping them all in at once. Work
+wrapped in registry.reading() finishes on the tables it started with, because
+the swap waits for it:
+
+    registry.start(interval=1.0)
+    with registry.reading():
+        Character = generate_character()
+"""
+
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+__all__ = [
+    'TABLES',
+    'SNAPSHOT_VERSION',
+    'data_path',
+    'read_table',
+    'file_hash',
+    'build_snapshot',
+    'Snapshot',
+    'open_snapshot',
+    'TableVersion',
+    'TableRegistry',
+    'registry',
+    'load_table'
+]
+
+# Table name to (CSV file, pandas.read_csv keyword arguments)
+TABLES = {
+    'power_details': ('power_details.csv', {'low_memory': False}),
+    'powers': ('powers.csv', {}),
+    'characteristics': ('characteristics.csv', {'low_memory': False}),
+    'gm': ('gm.csv', {'encoding': 'utf-8-sig'}),
+    'gimmicks': ('Gimmicks.csv', {}),
+    'origins': ('origins.csv', {})
+}
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILE = 'tables.npz'
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(current_dir, '..', 'data')
+if not os.path.isdir(data_dir):
+    # Try alternative path (when running from different directory)
+    data_dir = 'data'
+
+# Zip local file header: signature, version, flags, method, time, date, crc,
+# sizes, name length, extra length
+_LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+
+
+def data_path(name):
+    """
+    Get the path of a table's CSV file.
+
+    Args:
+        name (str): Table name, a key of TABLES.
+
+    Returns:
+        str: Path to the CSV.
+    """
+    path = os.path.join(data_dir, TABLES[name][0])
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Could not find {TABLES[name][0]}. Tried: {path}")
+    return path
+
+def read_table(name):
+    """
+    Parse a table's CSV with pandas.
+
+    Args:
+        name (str): Table name, a key of TABLES.
+
+    Returns:
+        pandas.DataFrame: The table as read_csv returns it, with its strings interned.
+    """
+    table = pd.read_csv(data_path(name), **TABLES[name][1])
+    for column in table.columns:
+        if not pd.api.types.is_numeric_dtype(table[column].dtype):
+            table[column] = table[column].map(lambda value: sys.intern(value) if isinstance(value, str) else value)
+    return table
+
+def file_hash(path):
+    """SHA-256 hex digest of a file's contents."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _source(name):
+    """Manifest entry identifying the CSV a table was built from."""
+    path = data_path(name)
+    stat = os.stat(path)
+    return {'File': TABLES[name][0], 'SHA256': file_hash(path), 'Size': stat.st_size, 'MTime': stat.st_mtime_ns}
+
+def _sources_current(sources):
+    """Whether every table's CSV still matches its manifest entry, hashing only CSVs whose size or mtime changed."""
+    if set(sources) != set(TABLES):
+        return False
+    for name, source in sources.items():
+        path = data_path(name)
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) == (source['Size'], source['MTime']):
+            continue
+        if file_hash(path) != source['SHA256']:
+            return False
+    return True
+
+def build_snapshot(path=None):
+    """
+    Compile every table's CSV into one snapshot file.
+
+    Numeric columns are stored with their pandas dtype. Other columns are stored
+    as int32 codes into a shared string table, with -1 for missing cells.
+
+    Args:
+        path (str): Snapshot file to write. Defaults to data/tables.npz.
+
+    Returns:
+        str: Path of the written snapshot.
+    """
+    if path is None:
+        path = os.path.join(data_dir, SNAPSHOT_FILE)
+    strings = {}
+    arrays = {}
+    manifest = {'Version': SNAPSHOT_VERSION, 'Sources': {}, 'Tables': {}}
+    for name in TABLES:
+        manifest['Sources'][name] = _source(name)
+        table = read_table(name)
+        columns = []
+        for number, column in enumerate(table.columns):
+            values = table[column]
+            dtype = str(values.dtype)
+            if pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+                arrays[f'{name}.{number}'] = values.to_numpy()
+                columns.append([column, dtype, 'Values'])
+            else:
+                arrays[f'{name}.{number}'] = np.array(
+                    [-1 if pd.isna(value) else strings.setdefault(str(value), len(strings)) for value in values],
+                    dtype=np.int32)
+                columns.append([column, dtype, 'Strings'])
+        manifest['Tables'][name] = {'Rows': len(table), 'Columns': columns}
+    encoded = [string.encode() for string in strings]
+    arrays['strings'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    arrays['string_offsets'] = np.cumsum([0] + [len(string) for string in encoded], dtype=np.int64)
+    # Array layouts are kept in the manifest so opening does not parse npy headers
+    manifest['Arrays'] = {key: [array.dtype.str, list(array.shape)] for key, array in arrays.items()}
+    arrays['manifest'] = np.frombuffer(json.dumps(manifest).encode(), dtype=np.uint8)
+    # Write beside the target and rename so readers never see a partial file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return path
+
+
+class Snapshot:
+    """
+    A memory-mapped table snapshot.
+
+    Columns are numpy views into the mapped file. DataFrames and the string
+    table are built on first use and cached. A DataFrame's numeric columns are
+    read-only views into the file as well; its text columns are built from the
+    string table.
+
+    Attributes:
+        path (str): Snapshot file.
+        manifest (dict): Version, source CSV hashes and table columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = {}
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"{path} has compressed arrays and cannot be memory-mapped")
+                header = _LOCAL_HEADER.unpack_from(self._map, info.header_offset)
+                start = info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+                self._offsets[info.filename[:-len('.npy')]] = (start, start + info.file_size)
+        self._layouts = {}
+        self.manifest = json.loads(self._array('manifest').tobytes())
+        self._layouts = self.manifest.get('Arrays', {})
+        self._strings = None
+        self._tables = {}
+
+    def __repr__(self):
+        return f"Snapshot({self.path}, version {self.manifest.get('Version')})"
+
+    def _array(self, key):
+        """Map one stored array without copying it, as bytes if its layout is not in the manifest."""
+        start, end = self._offsets[key]
+        # npy header: magic, version, header length (2 bytes in version 1, 4 after)
+        if self._map[start + 6] == 1:
+            start += 10 + struct.unpack_from('<H', self._map, start + 8)[0]
+        else:
+            start += 12 + struct.unpack_from('<I', self._map, start + 8)[0]
+        if key in self._layouts:
+            dtype, shape = self._layouts[key]
+            return np.frombuffer(self._map, dtype=dtype, count=int(np.prod(shape)), offset=start).reshape(shape)
+        return np.frombuffer(self._map, dtype=np.uint8, count=end - start, offset=start)
+
+    def is_current(self):
+        """
+        Check the snapshot against its source CSVs.
+
+        A CSV whose size and modification time match the manifest is not hashed.
+
+        Returns:
+            bool: True if the version matches and every CSV has the recorded hash.
+        """
+        if self.manifest.get('Version') != SNAPSHOT_VERSION:
+            return False
+        return _sources_current(self.manifest['Sources'])
+
+    @property
+    def strings(self):
+        """The interned string table as an object array, decoded on first use."""
+        if self._strings is None:
+            data = self._array('strings').tobytes()
+            offsets = self._array('string_offsets').tolist()
+            # A trailing NaN makes the missing code -1 index to NaN
+            self._strings = np.array([sys.intern(data[start:end].decode()) for start, end in zip(offsets, offsets[1:])]
+                                     + [np.nan], dtype=object)
+        return self._strings
+
+    def column(self, name, column):
+        """
+        Get one column's stored array.
+
+        Args:
+            name (str): Table name.
+            column (str): Column name.
+
+        Returns:
+            numpy.ndarray: Read-only values, or string codes (-1 for missing) for text columns.
+        """
+        for number, (stored, dtype, kind) in enumerate(self.manifest['Tables'][name]['Columns']):
+            if stored == column:
+                return self._array(f'{name}.{number}')
+        raise KeyError(f"{name} has no column {column}")
+
+    def table(self, name):
+        """
+        Get a table as a DataFrame equal to what read_csv returns.
+
+        Args:
+            name (str): Table name, a key of TABLES.
+
+        Returns:
+            pandas.DataFrame: The table. Callers share it, so do not modify it.
+        """
+        if name not in self._tables:
+            data = {}
+            for number, (column, dtype, kind) in enumerate(self.manifest['Tables'][name]['Columns']):
+                values = self._array(f'{name}.{number}')
+                if kind == 'Strings':
+                    values = self.strings[values]
+                if values.dtype != _dtype(dtype):
+                    values = pd.array(values, dtype=_dtype(dtype), copy=False)
+                data[column] = values
+            self._tables[name] = pd.DataFrame(data, copy=False)
+        return self._tables[name]
+
+
+_dtypes = {}
+
+def _dtype(name):
+    """pandas dtype for a stored dtype name, cached because the lookup is slow."""
+    if name not in _dtypes:
+        _dtypes[name] = pd.api.types.pandas_dtype(name)
+    return _dtypes[name]
+
+def open_snapshot(path=None, rebuild=True):
+    """
+    Open the table snapshot, rebuilding it first if it is missing or stale.
+
+    Args:
+        path (str): Snapshot file. Defaults to data/tables.npz.
+        rebuild (bool): Rebuild a missing or stale snapshot. If False, return None instead.
+
+    Returns:
+        Snapshot: The open snapshot, or None if it is stale and could not be rebuilt.
+    """
+    if path is None:
+        path = os.path.join(data_dir, SNAPSHOT_FILE)
+    try:
+        snapshot = Snapshot(path)
+        if snapshot.is_current():
+            return snapshot
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        pass
+    if not rebuild:
+        return None
+    try:
+        return Snapshot(build_snapshot(path))
+    except OSError:
+        # Read-only installs, full disks and the like parse the CSVs instead
+        return None
+
+
+class TableVersion:
+    """
+    One consistent set of tables, loaded together and never modified.
+
+    Attributes:
+        number (int): Version number, starting at 1 and increasing with each reload.
+        tables (dict): Table name to DataFrame.
+        sources (dict): Table name to the File, SHA256, Size and MTime of its CSV.
+        snapshot (Snapshot): Snapshot the tables were read from, or None if the CSVs were parsed.
+    """
+
+    def __init__(self, number, tables, sources, snapshot=None):
+        self.number = number
+        self.tables = tables
+        self.sources = sources
+        self.snapshot = snapshot
+
+    def __repr__(self):
+        return f'TableVersion({self.number})'
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def is_current(self):
+        """
+        Check the tables against their CSVs.
+
+        Returns:
+            bool: True if no CSV has changed since these tables were loaded.
+        """
+        return _sources_current(self.sources)
+
+    @classmethod
+    def load(cls, number, path=None):
+        """
+        Load every table, from the snapshot if possible or else from the CSVs.
+
+        Args:
+            number (int): Version number.
+            path (str): Snapshot file. Defaults to data/tables.npz.
+
+        Returns:
+            TableVersion: The loaded tables.
+        """
+        snapshot = open_snapshot(path)
+        if snapshot is not None:
+            return cls(number, {name: snapshot.table(name) for name in TABLES}, snapshot.manifest['Sources'], snapshot)
+        sources = {name: _source(name) for name in TABLES}
+        return cls(number, {name: read_table(name) for name in TABLES}, sources)
+
+
+class TableRegistry:
+    """
+    Serve the current TableVersion and swap in a new one when the CSVs change.
+
+    Reloads parse the tables and run subscribers' load functions off the hot
+    path, then the swap waits for readers to finish and rebinds every
+    subscriber's globals at once.
+
+    Attributes:
+        path (str): Snapshot file, or None for data/tables.npz.
+        interval (float): Seconds between checks while the watcher thread runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.interval = None
+        self._version = None
+        self._subscribers = []
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._swapping = False
+        self._local = threading.local()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def __repr__(self):
+        return f'TableRegistry({self._version}, {len(self._subscribers)} subscribers)'
+
+    @property
+    def current(self):
+        """The TableVersion in use, loaded on first access."""
+        if self._version is None:
+            with self._condition:
+                if self._version is None:
+                    self._version = TableVersion.load(1, self.path)
+        return self._version
+
+    def subscribe(self, namespace, load):
+        """
+        Bind globals built from the tables now and after every reload.
+
+        Args:
+            namespace (dict): A module's globals().
+            load (callable): Takes a TableVersion and returns a dictionary of
+                             global names to values. It runs in the reloading
+                             thread, so it must not modify shared state itself.
+        """
+        with self._condition:
+            version = self.current
+            namespace.update(load(version))
+            self._subscribers.append((namespace, load))
+
+    @contextlib.contextmanager
+    def reading(self):
+        """
+        Keep the current tables in place for the duration of a with block.
+
+        Reading blocks may nest. A pending swap waits for open blocks to close,
+        and new blocks wait for the swap.
+
+        Yields:
+            TableVersion: The tables in use.
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            with self._condition:
+                while self._swapping:
+                    self._condition.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield self.current
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                with self._condition:
+                    self._readers -= 1
+                    if self._readers == 0:
+                        self._condition.notify_all()
+
+    def reload(self, force=False):
+        """
+        Load the tables again if a CSV has changed, and swap them in.
+
+        Args:
+            force (bool): Reload even if no CSV has changed.
+
+        Returns:
+            bool: True if a new version was swapped in.
+        """
+        if getattr(self._local, 'depth', 0):
+            raise RuntimeError("Cannot reload tables inside registry.reading()")
+        current = self.current
+        if not force and current.is_current():
+            return False
+        version = TableVersion.load(current.number + 1, self.path)
+        with self._condition:
+            subscribers = list(self._subscribers)
+        bindings = [(namespace, load(version)) for namespace, load in subscribers]
+        with self._condition:
+            self._swapping = True
+            try:
+                while self._readers:
+                    self._condition.wait()
+                for namespace, values in bindings:
+                    namespace.update(values)
+                # Modules imported during the reload subscribed after the bindings were built
+                for namespace, load in self._subscribers[len(subscribers):]:
+                    namespace.update(load(version))
+                self._version = version
+            finally:
+                self._swapping = False
+                self._condition.notify_all()
+        return True
+
+    def start(self, interval=1.0):
+        """
+        Start a daemon thread that calls reload() every interval seconds.
+
+        Args:
+            interval (float): Seconds between checks of the CSVs.
+        """
+        self.interval = interval
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._watch, name='TableRegistry', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the watcher thread and wait for it to finish."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        """Watcher thread loop."""
+        while not self._stopping.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as error:
+                # A half-edited CSV fails to parse, so keep the current tables and try again
+                print(f"Table reload failed: {error}", file=sys.stderr)
+
+
+# Registry used by the generator modules
+registry = TableRegistry()
+
+def load_table(name):
+    """
+    Get a table from the registry's current version.
+
+    Args:
+        name (str): Table name, a key of TABLES, e.g. 'gm'.
+
+    Returns:
+        pandas.DataFrame: The table. Callers share it, so do not modify it.
+    """
+    return registry.current[name]
+
+
+if __name__ == '__main__':
+    import time
+
+    start = time.perf_counter()
+    path = build_snapshot()
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    snapshot = open_snapshot(path, rebuild=False)
+    opened = time.perf_counter() - start
+    print(f"Built {path} ({os.path.getsize(path)} bytes, {len(snapshot.strings) - 1} strings) in {built * 1000:.1f}ms, "
+          f"opened in {opened * 1e6:.0f}us")
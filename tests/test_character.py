@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from super_squadron.character import generate_character
+
+
+@pytest.mark.parametrize('seed', [0, 12345])
+def test_lazy_matches_eager(seed):
+    for index in range(500):
+        eager = generate_character(seed, index)
+        lazy = generate_character(seed, index, lazy=True)
+        assert lazy == eager
+        assert json.dumps(lazy, sort_keys=True, default=str) == json.dumps(eager, sort_keys=True, default=str)
+
+
+def test_lazy_matches_eager_read_in_any_order():
+    for index in range(200):
+        eager = generate_character(7, index)
+        lazy = generate_character(7, index, lazy=True)
+        for power in reversed(eager['Powers']['List']):
+            assert lazy['Powers']['Detail'][power] == eager['Powers']['Detail'][power]
+        assert lazy == eager
+
+
+def test_seeded_is_repeatable():
+    for index in range(100):
+        assert generate_character(3, index) == generate_character(3, index)
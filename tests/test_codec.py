@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from super_squadron import codec
+from super_squadron.character import generate_character
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_round_trip(lazy):
+    for index in range(300):
+        Character = generate_character(12345, index, lazy=lazy)
+        assert codec.decode(codec.encode(Character)) == Character
+
+
+def test_round_trip_global_state():
+    np.random.seed(0)
+    for index in range(300):
+        Character = generate_character()
+        assert codec.decode(codec.encode(Character)) == Character
+
+
+def test_round_trip_off_layout():
+    Character = generate_character(12345, 0)
+    cases = []
+    for change in [lambda C: C['Origin'].update(Origin='Unknown'),
+                   lambda C: C['Statistics'].update(Strength=40000),
+                   lambda C: C['Statistics'].update(Strength=np.int64(12)),
+                   lambda C: C.update(Height=np.float64(170.5)),
+                   lambda C: C['Powers']['List'].append('Not A Power'),
+                   lambda C: C['Powers']['Detail'].update({'Not A Power': {'Odd Field': (1, 2)}}),
+                   lambda C: C['Strength_Effects'].update(Extra=1),
+                   lambda C: C.update(Extra=None)]:
+        Copy = codec.decode(codec.encode(Character))
+        change(Copy)
+        cases.append(Copy)
+    for Copy in cases:
+        assert codec.decode(codec.encode(Copy)) == Copy
+
+
+def test_detail_value_types_are_kept():
+    details = [{'Flight': {'Speed': value}} for value in (1, True, 1.0)]
+    for detail in details + details:
+        Character = generate_character(12345, 0)
+        Character['Powers']['Detail'] = detail
+        decoded = codec.decode(codec.encode(Character))['Powers']['Detail']['Flight']['Speed']
+        assert type(decoded) is type(detail['Flight']['Speed'])
+
+
+def test_rejects_other_tables(monkeypatch):
+    data = codec.encode(generate_character(12345, 0))
+    monkeypatch.setattr(codec, '_fingerprint', codec._fingerprint ^ 1)
+    with pytest.raises(ValueError):
+        codec.decode(data)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from super_squadron import roll
+from super_squadron.character import generate_character
+from super_squadron.dicelog import DiceLog, DiceRecorder, ReplayError, recording, replaying
+
+
+def test_replay_matches_recording(tmp_path):
+    np.random.seed(4)
+    with recording() as recorder:
+        start = recorder.position
+        characters = [generate_character() for index in range(50)]
+    path = tmp_path / 'characters.dice'
+    recorder.log(start).save(path)
+    with replaying(DiceLog.load(path)) as replayer:
+        assert [generate_character() for index in range(50)] == characters
+    assert replayer.remaining == 0
+
+
+def test_replay_fills_in_sites():
+    with recording() as recorder:
+        roll.roll_effects(2, 6)
+        roll.roll_effects_batch(1, 20, 3)
+    log = recorder.log()
+    assert log.entries() == [(None, None, result) for result in log.results]
+    with replaying(log) as replayer:
+        roll.roll_effects(2, 6)
+        roll.roll_effects_batch(1, 20, 3)
+    entries = replayer.annotated().entries()
+    assert [entry[1:] for entry in entries] == [('2d6', log.results[0])] + [('1d20', result) for result in log.results[1:]]
+    assert entries[0][0].startswith('test_dicelog.py:')
+    assert entries[0][0].endswith(' test_replay_fills_in_sites')
+    assert entries[1][0] != entries[0][0]
+
+
+def test_replay_rejects_totals_the_formula_cannot_roll():
+    np.random.seed(0)
+    with recording() as recorder:
+        [roll.roll_effects(1, 20) for index in range(100)]
+    with pytest.raises(ReplayError):
+        with replaying(recorder.log()):
+            [roll.roll_effects(1, 6) for index in range(100)]
+    with replaying(recorder.log()) as replayer:
+        [roll.roll_effects(1, 20) for index in range(100)]
+    with pytest.raises(ReplayError):
+        with replaying(replayer.annotated()):
+            [roll.roll_effects(5, 4) for index in range(100)]
+
+
+def test_ring_buffer_keeps_the_newest_draws():
+    recorder = DiceRecorder(capacity=8192)
+    with recording(recorder):
+        small = [roll.roll_effects(1, 6) for index in range(5000)]
+        large = roll.roll_effects_batch(1, 6, 10000).tolist()
+        last = [roll.roll_effects(1, 6) for index in range(100)]
+    assert recorder.position == 15100
+    assert recorder.log(recorder.position - 8192).results.tolist() == (small + large + last)[-8192:]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from super_squadron.character import generate_character
+from super_squadron.encounter import ThreatTable
+
+
+@pytest.fixture(scope='module')
+def table():
+    np.random.seed(0)
+    return ThreatTable([generate_character() for index in range(500)])
+
+
+@pytest.mark.parametrize('size', range(1, 9))
+def test_teams_above_strongest(table, size):
+    teams = table.teams(float(table.scores[-size:].sum() * 1.05), size=size)
+    assert teams
+    for team in teams:
+        assert len(set(team['Ids'])) == size
+    assert teams[0]['Threat'] == pytest.approx(table.scores[-size:].sum())
+
+
+@pytest.mark.parametrize('size', range(1, 9))
+def test_teams_below_weakest(table, size):
+    teams = table.teams(float(table.scores[:size].sum() * 0.95), size=size)
+    assert teams
+    for team in teams:
+        assert len(set(team['Ids'])) == size
+    assert teams[0]['Threat'] == pytest.approx(table.scores[:size].sum())
+
+
+def test_teams_within_tolerance(table):
+    target = float(np.median(table.scores) * 4)
+    for team in table.teams(target, size=4):
+        assert len(set(team['Ids'])) == 4
+        assert abs(team['Error']) <= target * 0.05
@@ -0,0 +1,19 @@
+import numpy as np
+
+from super_squadron.character import generate_character
+from super_squadron.similar import SimilarityIndex
+
+
+def test_query_matches_brute_force():
+    np.random.seed(6)
+    characters = [generate_character() for index in range(3000)]
+    index = SimilarityIndex(characters[:2500])
+    index.extend(characters[2500:2900])
+    for Character in characters[2900:2905]:
+        index.add(Character)
+    scan = SimilarityIndex()
+    scan._statistics, scan._bits, scan._count = index._statistics, index._bits, index._count
+    for Character in characters[2950:]:
+        results = index.query(Character, k=7, exclude=[3, 4])
+        expected = scan.query(Character, k=7, exclude=[3, 4])
+        assert [result['Distance'] for result in results] == [result['Distance'] for result in expected]
@@ -0,0 +1,44 @@
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+from super_squadron.character import generate_character
+from super_squadron.store import RosterStore
+
+
+def test_round_trip():
+    np.random.seed(8)
+    characters = [generate_character() for index in range(200)]
+    characters[0]['Height'] = np.float64(5.5)
+    characters[0]['Strength_Effects'] = {np.str_('HT'): np.int64(1)}
+    with RosterStore() as store:
+        ids = store.add(characters)
+        stored = list(store.query())
+    assert [Character.pop('id') for Character in stored] == ids
+    assert stored == characters
+    assert type(stored[0]['Height']) is float
+    assert type(next(iter(stored[0]['Strength_Effects']))) is str
+
+
+def test_reads_json_bodies():
+    np.random.seed(9)
+    Character = generate_character()
+    with RosterStore() as store:
+        character_id = store.add([Character])[0]
+        body = pickle.loads(store.connection.execute('SELECT Body FROM characters').fetchone()[0])
+        store.connection.execute('UPDATE characters SET Body = ?', (json.dumps(body),))
+        details = store.connection.execute('SELECT rowid, Detail FROM power_details').fetchall()
+        store.connection.executemany('UPDATE power_details SET Detail = ? WHERE rowid = ?',
+                                     [(json.dumps(pickle.loads(detail)), rowid) for rowid, detail in details])
+        assert store.get(character_id) == dict(Character, id=character_id)
+
+
+def test_refuses_stored_classes():
+    np.random.seed(10)
+    with RosterStore() as store:
+        character_id = store.add([generate_character()])[0]
+        store.connection.execute('UPDATE characters SET Body = ?', (pickle.dumps({'Height': np.float64(5.5)}),))
+        with pytest.raises(pickle.UnpicklingError):
+            store.get(character_id)